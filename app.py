@@ -1,41 +1,178 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import pydeck as pdk
 
-from src.data_loader import load_csv
-from src.filters import apply_date_filter, apply_vehicle_filter
-from src.metrics import compute_basic_stats, compute_vehicle_ranking
+from src.data_loader import DASHBOARD_COLUMNS
+from src.ingest import load_csv_files
+from src.filters import apply_filters
+from src.fleet_index import FleetIndex, sort_fleet_frame
+from src.metrics import (
+    build_sorted_nox,
+    compute_basic_stats,
+    compute_time_weighted_metrics,
+    compute_vehicle_ranking,
+)
 from src.plots import make_nox_histogram, make_nox_boxplot, make_nox_timeseries, make_mean_nox_by_vehicle_bar, make_mean_nox_by_hour_line
+from src.registry import Dataset, DatasetRegistry, dataset_key
+from src.rollups import ROLLUP_THRESHOLDS, compute_rollups, rollup_aggregate
+from src.store import read_journal, read_journal_rows
+from src.maps import (
+    GRID_CELL_SIZES,
+    CompactDeck,
+    grid_points,
+    grid_reference_latitude,
+    layer_records,
+    map_points,
+    nox_grid,
+)
+from src.tracks import VehicleTrack
+from src.view_cache import ViewCache, filter_fingerprint
 
 
 st.set_page_config(page_title="Fleet NOx EDA", layout="wide")
 st.title("Fleet NOx EDA Dashboard")
 st.write("Ferramenta simples para explorar dados de NOx da frota.")
 
+# Armazenamento Parquet alimentado por src/watcher.py (opcional): com a
+# variável definida, o dashboard pode acompanhá-lo em vez de receber uploads.
+STORE_ROOT = os.environ.get("FLEET_NOX_STORE")
+STORE_REFRESH_SECONDS = 5
+
 st.sidebar.header("Configuração de dados")
-uploaded_files = st.sidebar.file_uploader(
-    "Suba um ou mais arquivos CSV",
-    type=["csv"],
-    accept_multiple_files=True,
-)
+source_mode = "Upload de CSV"
+if STORE_ROOT:
+    source_mode = st.sidebar.radio("Fonte dos dados", ["Upload de CSV", "Armazenamento"], index=1)
+
+uploaded_files = None
+if source_mode == "Upload de CSV":
+    uploaded_files = st.sidebar.file_uploader(
+        "Suba um ou mais arquivos CSV",
+        type=["csv"],
+        accept_multiple_files=True,
+    )
 
-if not uploaded_files:
-    st.info("Suba ao menos um CSV para começar.")
-    st.stop()
+    if not uploaded_files:
+        st.info("Suba ao menos um CSV para começar.")
+        st.stop()
+
+
+@st.cache_resource
+def get_dataset_registry():
+    # um registro por processo, compartilhado por todas as sessões
+    return DatasetRegistry()
 
-dfs = []
-for f in uploaded_files:
-    try:
-        df_tmp = load_csv(f)
-        dfs.append(df_tmp)
-    except Exception as e:
-        st.error(f"Erro ao carregar {f.name}: {e}")
 
-if not dfs:
+def load_dataset(sources):
+    df, load_errors = load_csv_files(
+        sources,
+        use_cache=True,
+        compact=True,
+        columns=DASHBOARD_COLUMNS,
+        deduplicate=True,
+    )
+    fleet_index, rollups = None, None
+    if df is not None:
+        # a junção já deixa df na ordem (vehicle_id, timestamp), sem repetidas
+        fleet_index = FleetIndex.from_sorted_frame(df)
+        rollups = compute_rollups(df)
+    return Dataset(df, fleet_index, load_errors, rollups)
+
+
+def load_store_dataset(root, entries, previous=None):
+    """
+    Conjunto com as linhas das entradas do diário. Com `previous` (o
+    conjunto que a sessão já tinha), só as entradas novas são lidas e
+    acrescentadas; o histórico não é relido.
+    """
+    df, _ = read_journal_rows(root, entries)
+    if previous is not None and previous.frame is not None:
+        return previous.extended(df)
+    if df is None:
+        return Dataset(None)
+    df, fleet_index = sort_fleet_frame(df)
+    return Dataset(df, fleet_index, rollups=compute_rollups(df))
+
+
+def replace_dataset(key, load):
+    previous = st.session_state.pop("dataset_handle", None)
+    st.session_state["dataset_handle"] = registry.open(key, load)
+    if previous is not None:
+        previous.release()
+
+
+# Carrega, ordena por (vehicle_id, timestamp) e indexa só quando o conjunto
+# de arquivos muda; nos reruns seguintes (widgets) reaproveita o resultado.
+# Sessões que sobem os mesmos arquivos compartilham o mesmo DataFrame
+# (somente leitura) pelo registro do processo.
+registry = get_dataset_registry()
+if source_mode == "Upload de CSV":
+    upload_key = tuple((f.file_id, f.name, f.size) for f in uploaded_files)
+    if st.session_state.get("upload_key") != upload_key:
+        key, sources = dataset_key(uploaded_files, compact=True, columns=DASHBOARD_COLUMNS)
+        replace_dataset(key, lambda: load_dataset(sources))
+        st.session_state["upload_key"] = upload_key
+else:
+    # No armazenamento, a chave é o número da última entrada do diário lida:
+    # a cada entrada nova, o conjunto da sessão ganha só as linhas dela.
+    previous_key = st.session_state.get("upload_key")
+    following = previous_key is not None and previous_key[:2] == ("store", STORE_ROOT)
+    new_entries = read_journal(STORE_ROOT, after_seq=previous_key[2] if following else 0)
+    if new_entries or not following:
+        previous_dataset = st.session_state["dataset_handle"].dataset if following else None
+        upload_key = ("store", STORE_ROOT, new_entries[-1]["seq"] if new_entries else 0)
+        replace_dataset(
+            upload_key,
+            lambda: load_store_dataset(STORE_ROOT, new_entries, previous_dataset),
+        )
+        st.session_state["upload_key"] = upload_key
+        if new_entries:
+            latest = new_entries[-1]
+            st.session_state["store_update"] = (
+                f"Última gravação: {sum(e['n_rows'] for e in new_entries):,} linhas de "
+                f"{os.path.basename(latest['source'] or '')} às "
+                f"{pd.Timestamp(latest['written_at'], unit='s').strftime('%H:%M:%S')} (UTC)."
+            )
+    upload_key = st.session_state["upload_key"]
+
+    @st.fragment(run_every=STORE_REFRESH_SECONDS)
+    def watch_store():
+        # confere o diário de tempos em tempos e recarrega a página se chegou algo
+        if read_journal(STORE_ROOT, after_seq=upload_key[2]):
+            st.rerun()
+
+    watch_store()
+    st.sidebar.caption(st.session_state.get("store_update", f"Acompanhando {STORE_ROOT}."))
+
+dataset = st.session_state["dataset_handle"].dataset
+df, fleet_index, load_errors = dataset.frame, dataset.index, dataset.errors
+for file_name, message in load_errors:
+    st.error(f"Erro ao carregar {file_name}: {message}")
+if df is not None:
+    for file_name, diagnostics in df.attrs.get("timestamp_diagnostics_by_file", {}).items():
+        if diagnostics and diagnostics["collapsed"]:
+            st.warning(
+                f"{file_name}: os timestamps perderam precisão (resolução de "
+                f"{diagnostics['resolution_seconds']:,.0f} s, {diagnostics['duplicate_fraction']:.0%} das leituras "
+                "repetem o horário de outra do mesmo veículo). O arquivo provavelmente foi exportado com "
+                "timestamps em notação científica (ex.: 1.70883E+12); exporte de novo como número inteiro."
+            )
+    combine_report = df.attrs.get("combine")
+    if combine_report and combine_report["n_duplicates"]:
+        st.sidebar.info(
+            f"{combine_report['n_duplicates']:,} leituras repetidas entre os arquivos foram descartadas "
+            f"({combine_report['n_rows']:,} de {combine_report['n_input_rows']:,} mantidas)."
+        )
+
+if df is None:
     st.error("Nenhum arquivo pôde ser carregado.")
     st.stop()
 
-df = pd.concat(dfs, ignore_index=True)
+st.sidebar.caption(
+    f"Conjuntos em memória no servidor: {len(registry)} "
+    f"({registry.total_bytes() / 2**20:.0f} MiB, compartilhados entre sessões)."
+)
 
 st.sidebar.subheader("Filtros")
 
@@ -47,7 +184,7 @@ start_date, end_date = st.sidebar.date_input(
     value=(min_ts.date(), max_ts.date()),
 )
 
-vehicle_ids = sorted(df["vehicle_id"].unique())
+vehicle_ids = list(fleet_index.vehicle_ids)
 selected_vehicles = st.sidebar.multiselect(
     "Veículos",
     options=vehicle_ids,
@@ -61,48 +198,171 @@ threshold = st.sidebar.number_input(
     step=1.0,
 )
 
-df_filtered = apply_date_filter(df, start_date, end_date)
-df_filtered = apply_vehicle_filter(df_filtered, selected_vehicles)
+# Intervalos a partir de tantos dias: resumo, médias por veículo e ranking
+# saem dos rollups por dia/semana (sem percorrer as leituras); a mediana
+# passa a ter erro relativo de até 1%.
+ROLLUP_MIN_DAYS = 31
+use_rollups = dataset.rollups is not None and (end_date - start_date).days + 1 >= ROLLUP_MIN_DAYS
+
+# Tudo que depende só dos filtros fica guardado por essa chave; o
+# threshold e os controles de cada visualização entram nos parâmetros.
+fingerprint = filter_fingerprint(upload_key, start_date, end_date, selected_vehicles)
+if "view_cache" not in st.session_state or st.session_state.get("view_cache_upload") != upload_key:
+    st.session_state["view_cache"] = ViewCache()
+    st.session_state["view_cache_upload"] = upload_key
+view_cache = st.session_state["view_cache"]
+
+
+def filtered_data():
+    """
+    Recorte filtrado, seu índice e o NOx ordenado por veículo, montados uma
+    vez por estado de filtro e só quando alguma visualização precisa.
+    """
+    if st.session_state.get("filtered_key") != fingerprint:
+        df_f, index_f = apply_filters(df, fleet_index, start_date, end_date, selected_vehicles)
+        st.session_state["filtered"] = (df_f, index_f, build_sorted_nox(df_f, index=index_f))
+        st.session_state["filtered_key"] = fingerprint
+    return st.session_state["filtered"]
+
+
+def show_timing(elapsed, cached):
+    if cached:
+        st.caption(f"Do cache (calculado em {elapsed * 1e3:.0f} ms).")
+    else:
+        st.caption(f"Calculado em {elapsed * 1e3:.0f} ms.")
 
-if df_filtered.empty:
+
+def rollup_summary():
+    """
+    NOxAggregate do estado de filtro montado a partir dos rollups.
+    """
+    agg, _, _ = view_cache.get_or_compute(
+        "agregados",
+        fingerprint,
+        lambda: rollup_aggregate(dataset.rollups, start_date, end_date, selected_vehicles),
+    )
+    return agg
+
+
+def _basic_stats():
+    if use_rollups:
+        return rollup_summary().basic_stats()
+    df_f, index_f, _ = filtered_data()
+    return compute_basic_stats(df_f, index=index_f)
+
+
+def _rollup_vehicle_means():
+    means = rollup_summary().vehicle_stats()["mean_nox"]
+    return pd.DataFrame({"vehicle_id": means.index.to_numpy(dtype=object), "NOx": means.to_numpy()})
+
+
+def _vehicle_ranking():
+    # fração acima do threshold exata só para os thresholds guardados nos rollups
+    if use_rollups and float(threshold) in ROLLUP_THRESHOLDS:
+        return rollup_summary().vehicle_ranking(threshold)
+    return compute_vehicle_ranking(filtered_data()[0], threshold, sorted_nox=filtered_data()[2])
+
+
+stats, _, _ = view_cache.get_or_compute("resumo", fingerprint, _basic_stats)
+
+if stats["n_records"] == 0:
     st.warning("Nenhum dado após aplicar filtros.")
     st.stop()
 
-stats = compute_basic_stats(df_filtered)
-
 st.subheader("Resumo geral")
 col1, col2, col3, col4 = st.columns(4)
 col1.metric("Média NOx", f"{stats['global_mean_nox']:.2f}")
 col2.metric("Mediana NOx", f"{stats['global_median_nox']:.2f}")
 col3.metric("Nº veículos", stats["n_vehicles"])
 col4.metric("Nº registros", stats["n_records"])
+if use_rollups:
+    st.caption(
+        f"Intervalo de {ROLLUP_MIN_DAYS} dias ou mais: resumo, médias por veículo e ranking vêm dos "
+        "agregados por dia/semana (mediana com erro de até 1%)."
+    )
 
-tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["Histograma", "Boxplot", "Série temporal", "Média por veículo", "Média por hora", "Ranking", "Mapa temporal",])
-
-with tab1:
-    fig_hist = make_nox_histogram(df_filtered)
+# Só a visualização escolhida é montada a cada rerun (st.tabs montaria todas).
+VIEWS = [
+    "Histograma",
+    "Boxplot",
+    "Série temporal",
+    "Média por veículo",
+    "Média por hora",
+    "Ranking",
+    "Mapa temporal",
+    "Mapa da frota",
+]
+view = st.radio("Visualização", VIEWS, horizontal=True, key="view")
+
+if view == "Histograma":
+    col_bins, col_log, col_overlay = st.columns(3)
+    n_bins = col_bins.slider("Número de faixas", min_value=5, max_value=100, value=10)
+    hist_log_y = col_log.checkbox("Contagem em escala log", value=False)
+    hist_by_vehicle = col_overlay.checkbox("Separar por veículo", value=False)
+    fig_hist, elapsed, cached = view_cache.get_or_compute(
+        view,
+        fingerprint,
+        lambda: make_nox_histogram(filtered_data()[0], bins=n_bins, log_y=hist_log_y, by_vehicle=hist_by_vehicle),
+        params=(n_bins, hist_log_y, hist_by_vehicle),
+    )
     st.plotly_chart(fig_hist, use_container_width=True)
+    show_timing(elapsed, cached)
 
-with tab2:
-    fig_box = make_nox_boxplot(df_filtered)
+elif view == "Boxplot":
+    fig_box, elapsed, cached = view_cache.get_or_compute(
+        view,
+        fingerprint,
+        lambda: make_nox_boxplot(filtered_data()[0], precomputed=True, sorted_nox=filtered_data()[2]),
+    )
     st.plotly_chart(fig_box, use_container_width=True)
-
-with tab3:
-    fig_ts = make_nox_timeseries(df_filtered)
+    show_timing(elapsed, cached)
+
+elif view == "Série temporal":
+    ts_max_points = st.select_slider(
+        "Pontos por veículo",
+        options=[500, 1000, 2000, 5000, 10000],
+        value=2000,
+        help="A série de cada veículo é reduzida (mínimo e máximo por faixa de tempo) antes do gráfico.",
+    )
+    fig_ts, elapsed, cached = view_cache.get_or_compute(
+        view,
+        fingerprint,
+        lambda: make_nox_timeseries(filtered_data()[0], index=filtered_data()[1], max_points=ts_max_points),
+        params=(ts_max_points,),
+    )
     st.plotly_chart(fig_ts, use_container_width=True)
-
-with tab4:
-    fig_mean_vehicle = make_mean_nox_by_vehicle_bar(df_filtered)
+    show_timing(elapsed, cached)
+
+elif view == "Média por veículo":
+    fig_mean_vehicle, elapsed, cached = view_cache.get_or_compute(
+        view,
+        fingerprint,
+        lambda: make_mean_nox_by_vehicle_bar(None, grouped=_rollup_vehicle_means())
+        if use_rollups
+        else make_mean_nox_by_vehicle_bar(filtered_data()[0]),
+    )
     st.plotly_chart(fig_mean_vehicle, use_container_width=True)
+    show_timing(elapsed, cached)
 
-with tab5:
-    fig_mean_hour = make_mean_nox_by_hour_line(df_filtered)
+elif view == "Média por hora":
+    fig_mean_hour, elapsed, cached = view_cache.get_or_compute(
+        view,
+        fingerprint,
+        lambda: make_mean_nox_by_hour_line(filtered_data()[0]),
+    )
     st.plotly_chart(fig_mean_hour, use_container_width=True)
-
-with tab6:  
-    ranking_df = compute_vehicle_ranking(df_filtered, threshold)
+    show_timing(elapsed, cached)
+
+elif view == "Ranking":
+    ranking_df, elapsed, cached = view_cache.get_or_compute(
+        view,
+        fingerprint,
+        _vehicle_ranking,
+        params=(threshold,),
+    )
     st.subheader("Ranking por veículo")
     st.dataframe(ranking_df)
+    show_timing(elapsed, cached)
 
     csv_ranking = ranking_df.to_csv(index=False).encode("utf-8")
     st.download_button(
@@ -112,6 +372,39 @@ with tab6:
         mime="text/csv",
     )
 
+    st.subheader("Métricas ponderadas pelo tempo")
+    st.caption(
+        "Cada leitura conta o tempo até a próxima leitura do mesmo veículo; "
+        "intervalos maiores que o limite abaixo (veículo parado ou sem sinal) não contam."
+    )
+    max_gap_minutes = st.number_input(
+        "Intervalo máximo entre leituras (min)",
+        min_value=1,
+        value=15,
+        step=1,
+    )
+    time_weighted_df, elapsed, cached = view_cache.get_or_compute(
+        "Métricas ponderadas pelo tempo",
+        fingerprint,
+        lambda: compute_time_weighted_metrics(
+            filtered_data()[0],
+            threshold,
+            max_gap_seconds=int(max_gap_minutes) * 60,
+            index=filtered_data()[1],
+        ),
+        params=(threshold, int(max_gap_minutes)),
+    )
+    st.dataframe(time_weighted_df)
+    show_timing(elapsed, cached)
+
+    csv_time_weighted = time_weighted_df.to_csv(index=False).encode("utf-8")
+    st.download_button(
+        "Baixar métricas ponderadas pelo tempo como CSV",
+        data=csv_time_weighted,
+        file_name="vehicle_time_weighted_metrics.csv",
+        mime="text/csv",
+    )
+
     st.subheader("Métricas globais")
 
     stats_df = pd.DataFrame(
@@ -135,7 +428,9 @@ with tab6:
         file_name="global_metrics.csv",
         mime="text/csv",
     )
-with tab7:
+
+elif view == "Mapa temporal":
+    df_filtered, filtered_index, _ = filtered_data()
     st.subheader("Mapa temporal (leituras com GPS)")
 
     required_cols = {"timestamp", "latitude", "longitude", "vehicle_id"}
@@ -144,21 +439,27 @@ with tab7:
             "O conjunto filtrado não contém colunas de timestamp, vehicle_id e latitude/longitude suficientes para o mapa temporal."
         )
     else:
-        vehicle_ids_map = sorted(df_filtered["vehicle_id"].unique())
+        vehicle_ids_map = list(filtered_index.vehicle_ids)
         vehicle_for_map = st.selectbox(
             "Veículo para o mapa",
             options=vehicle_ids_map,
         )
 
-        df_time = df_filtered[df_filtered["vehicle_id"] == vehicle_for_map].copy()
-        df_time["timestamp"] = pd.to_datetime(df_time["timestamp"], errors="coerce")
-        df_time = df_time.dropna(subset=["timestamp", "latitude", "longitude"])
+        # trajeto montado uma vez por (estado de filtro, veículo); cada passo
+        # do mapa é só uma busca binária nele
+        map_start, map_stop = filtered_index.vehicle_range(vehicle_for_map)
+        track, _, _ = view_cache.get_or_compute(
+            "trajeto",
+            fingerprint,
+            lambda: VehicleTrack.from_frame(df_filtered, vehicle_for_map, map_start, map_stop),
+            params=(str(vehicle_for_map),),
+        )
 
-        if df_time.empty:
+        if len(track) == 0:
             st.info("Não há leituras válidas com timestamp e coordenadas GPS para o veículo selecionado.")
         else:
-            min_ts_full = df_time["timestamp"].min()
-            max_ts_full = df_time["timestamp"].max()
+            min_ts_full = track.start
+            max_ts_full = track.end
 
             total_minutes = max(
                 1, int((max_ts_full - min_ts_full).total_seconds() // 60)
@@ -225,48 +526,42 @@ with tab7:
             t_end = min_ts_full + pd.Timedelta(minutes=int(minute_index))
             t_start = t_end - pd.Timedelta(minutes=int(window_minutes))
 
-            df_window = df_time[
-                (df_time["timestamp"] >= t_start)
-                & (df_time["timestamp"] <= t_end)
-            ].copy()
+            # o mapa recebe só os campos das camadas (map_points) num JSON
+            # compacto, então a janela pode levar dezenas de milhares de pontos
+            MAX_POINTS = 20_000
+            window_lo, window_hi = track.window(t_start, t_end, max_points=MAX_POINTS)
 
-            if df_window.empty:
+            if window_hi == window_lo:
                 st.info("Não há leituras na janela de tempo selecionada para esse veículo.")
             else:
-                df_window = df_window.sort_values("timestamp")
-
-                MAX_POINTS = 500
-                df_plot = df_window.tail(MAX_POINTS).copy()
-
-                df_plot["lat"] = df_plot["latitude"]
-                df_plot["lon"] = df_plot["longitude"]
-                df_plot["timestamp_str"] = df_plot["timestamp"].astype(str)
+                df_plot = map_points(track.slice(window_lo, window_hi))
 
                 trail_data = df_plot
                 latest_point = df_plot.tail(1)
 
-                center_lat = trail_data["lat"].mean()
-                center_lon = trail_data["lon"].mean()
+                center_lat = float(trail_data["lat"].mean())
+                center_lon = float(trail_data["lon"].mean())
+                # pontos mais antigos da janela ficam mais transparentes
+                span_seconds = max(1, int(df_plot["t"].iloc[-1]))
 
                 trail_layer = pdk.Layer(
                     "ScatterplotLayer",
-                    data=trail_data,
+                    data=layer_records(trail_data),
                     get_position="[lon, lat]",
                     get_radius=int(point_radius),
-                    get_fill_color=[255, 0, 0, 80],
+                    get_fill_color=f"[255, 0, 0, 30 + 120 * t / {span_seconds}]",
                     pickable=True,
                 )
 
                 latest_layer = pdk.Layer(
                     "ScatterplotLayer",
-                    data=latest_point,
+                    data=layer_records(latest_point),
                     get_position="[lon, lat]",
                     get_radius=int(point_radius) * 2,
                     get_fill_color=[0, 255, 0, 255],
                     pickable=True,
                 )
 
-
                 view_state = pdk.ViewState(
                     latitude=center_lat,
                     longitude=center_lon,
@@ -274,14 +569,14 @@ with tab7:
                     pitch=0,
                 )
 
-                parts = ["<b>Veículo:</b> {vehicle_id}"]
+                parts = [f"<b>Veículo:</b> {vehicle_for_map}"]
                 if "order" in df_plot.columns:
                     parts.append("<b>Order:</b> {order}")
                 if "NOx_dp" in df_plot.columns:
                     parts.append("<b>NOx dp:</b> {NOx_dp}")
                 if "NOx" in df_plot.columns:
                     parts.append("<b>NOx:</b> {NOx}")
-                parts.append("<b>Tempo:</b> {timestamp_str}")
+                parts.append("<b>Tempo:</b> {hora}")
                 tooltip_html = "<br/>".join(parts)
 
                 tooltip = {
@@ -290,7 +585,7 @@ with tab7:
                 }
 
                 st.pydeck_chart(
-                    pdk.Deck(
+                    CompactDeck(
                         layers=[trail_layer, latest_layer],
                         initial_view_state=view_state,
                         tooltip=tooltip,
@@ -300,5 +595,69 @@ with tab7:
                 st.caption(
                     f"{len(df_plot)} pontos exibidos entre {t_start} e {t_end} "
                     f"para o veículo {vehicle_for_map} "
-                    f"(limitado a {MAX_POINTS} pontos mais recentes da janela)."
+                    f"(limitado a {MAX_POINTS:,} pontos mais recentes da janela)."
+                )
+
+elif view == "Mapa da frota":
+    st.subheader("Mapa da frota (NOx por célula)")
+
+    if not {"latitude", "longitude"}.issubset(df.columns):
+        st.info("O conjunto não contém latitude/longitude para o mapa da frota.")
+    else:
+        col_cell, col_color = st.columns(2)
+        cell_size = col_cell.select_slider(
+            "Tamanho da célula",
+            options=list(GRID_CELL_SIZES),
+            value=500,
+            format_func=lambda size: f"{size / 1000:g} km" if size >= 1000 else f"{size} m",
+        )
+        color_by = col_color.radio("Cor pela", ["Média de NOx", "P95 de NOx"], horizontal=True)
+
+        # a grade de cada tamanho é calculada uma vez por estado de filtro;
+        # trocar a cor ou voltar a um tamanho já visto não relê as leituras.
+        # A latitude de referência vem do conjunto inteiro: as células ficam
+        # no mesmo lugar em qualquer filtro.
+        def _fleet_grid():
+            df_f = filtered_data()[0]
+            reference_latitude = grid_reference_latitude(df["latitude"])
+            return nox_grid(df_f["latitude"], df_f["longitude"], df_f["NOx"], cell_size, reference_latitude)
+
+        grid, elapsed, cached = view_cache.get_or_compute("grade", fingerprint, _fleet_grid, params=(cell_size,))
+
+        if grid.empty:
+            st.info("Não há leituras com coordenadas GPS no filtro atual.")
+        else:
+            cells = grid_points(grid, "mean_nox" if color_by == "Média de NOx" else "p95_nox")
+            # zoom inicial de acordo com o tamanho da célula
+            zoom = {2000: 10, 500: 12, 100: 14}.get(cell_size, 11)
+            busiest = grid["n"].idxmax()
+
+            grid_layer = pdk.Layer(
+                "GridCellLayer",
+                data=layer_records(cells),
+                get_position="[lon, lat]",
+                cell_size=int(cell_size),
+                get_fill_color="[255, 255 - c, 0, 170]",
+                extruded=False,
+                pickable=True,
+            )
+            st.pydeck_chart(
+                CompactDeck(
+                    layers=[grid_layer],
+                    initial_view_state=pdk.ViewState(
+                        latitude=float(grid.at[busiest, "lat"]),
+                        longitude=float(grid.at[busiest, "lon"]),
+                        zoom=zoom,
+                        pitch=0,
+                    ),
+                    tooltip={
+                        "html": "<b>Leituras:</b> {n}<br/><b>NOx médio:</b> {media}<br/><b>NOx p95:</b> {p95}",
+                        "style": {"backgroundColor": "steelblue", "color": "white"},
+                    },
                 )
+            )
+            st.caption(
+                f"{len(cells):,} células com {int(grid['n'].sum()):,} leituras; a cor vai do amarelo ao "
+                "vermelho até o percentil 95 das células."
+            )
+            show_timing(elapsed, cached)
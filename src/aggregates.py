@@ -0,0 +1,396 @@
+import numpy as np
+import pandas as pd
+
+# Deslocamento dos índices de bucket do sketch: valores positivos ficam em
+# (k + _KEY_OFFSET), negativos em -(k + _KEY_OFFSET) e zero em 0. Assim a
+# ordem dos ids de bucket é a mesma ordem dos valores.
+_KEY_OFFSET = 2**32
+
+# |x| abaixo disso conta como zero no sketch
+_MIN_INDEXABLE = 1e-9
+
+
+def _bucket_ids(values, log_gamma):
+    """
+    Bucket de cada valor no sketch logarítmico (estilo DDSketch).
+    """
+    magnitude = np.abs(values)
+    nonzero = magnitude > _MIN_INDEXABLE
+    keys = np.zeros(len(values), dtype="int64")
+    keys[nonzero] = np.ceil(np.log(magnitude[nonzero]) / log_gamma).astype("int64") + _KEY_OFFSET
+    return np.sign(values).astype("int64") * keys
+
+
+def _bucket_values(bucket_ids, gamma):
+    """
+    Valor representativo de cada bucket: erro relativo <= relative_accuracy.
+    """
+    bucket_ids = np.asarray(bucket_ids, dtype="int64")
+    keys = np.abs(bucket_ids) - _KEY_OFFSET
+    values = 2.0 * np.power(gamma, keys.astype("float64")) / (gamma + 1.0)
+    return np.where(bucket_ids == 0, 0.0, np.sign(bucket_ids) * values)
+
+
+def _sketch_quantile(bucket_ids, counts, q, gamma):
+    # bucket_ids já ordenados; mesmo critério de posição do DDSketch
+    total = counts.sum()
+    if total == 0:
+        return np.nan
+    rank = q * (total - 1)
+    position = np.searchsorted(np.cumsum(counts), rank, side="right")
+    return float(_bucket_values(bucket_ids[min(position, len(bucket_ids) - 1)], gamma))
+
+
+def _vehicle_moments(codes, nox, n_groups):
+    """
+    count, média e m2 (soma dos quadrados dos desvios até a média) do NOx de
+    cada grupo, em duas passadas: primeiro a média, depois os desvios. NaN
+    fica de fora; grupo sem leituras tem média NaN e m2 0.
+    """
+    has_nox = ~np.isnan(nox)
+    clean = np.where(has_nox, nox, 0.0)
+    count = np.bincount(codes, weights=has_nox, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(codes, weights=clean, minlength=n_groups) / count
+    deviation = np.where(has_nox, nox - mean[codes], 0.0)
+    m2 = np.bincount(codes, weights=deviation**2, minlength=n_groups)
+    return count.astype("int64"), mean, m2
+
+
+def _merge_stats(stats, level, agg):
+    """
+    Junta as linhas de `stats` com o mesmo `level` (veículo, ou veículo e
+    período): as colunas de `agg` com a agregação dada e count/mean/m2 pela
+    atualização paralela de Chan et al., generalizada para várias partes:
+    média ponderada pelas contagens e m2 = soma dos m2 + soma de
+    count * (média da parte - média do grupo)². Ao contrário da soma dos
+    quadrados, não perde precisão quando a média é grande perto do desvio.
+    """
+    grouped = stats.groupby(level=level, sort=True)
+    merged = grouped.agg(agg)
+    codes = grouped.ngroup().to_numpy()
+    count = stats["count"].to_numpy(dtype="float64")
+    mean = stats["mean"].to_numpy(dtype="float64")
+    has_nox = count > 0
+    weighted = np.where(has_nox, mean * count, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        group_mean = np.bincount(codes, weights=weighted, minlength=len(merged)) / np.bincount(
+            codes, weights=count, minlength=len(merged)
+        )
+    deviation = np.where(has_nox, count * (mean - group_mean[codes]) ** 2, 0.0)
+    moments = {
+        "mean": group_mean,
+        "m2": np.bincount(codes, weights=stats["m2"].to_numpy(dtype="float64") + deviation, minlength=len(merged)),
+    }
+    columns = [c for c in stats.columns if c in agg or c in moments]
+    return merged.assign(**moments)[columns]
+
+
+class NOxAggregate:
+    """
+    Agregado parcial de NOx, por veículo, que pode ser somado (merge) com
+    outros agregados em qualquer ordem.
+
+    Guarda por veículo: número de registros, contagem/média/m2 (soma dos
+    quadrados dos desvios até a média)/mín/máx de NOx, número de registros acima de cada threshold
+    escolhido e um sketch de quantis com erro relativo <= relative_accuracy
+    (buckets logarítmicos, como no DDSketch). Os números da frota inteira
+    saem da soma dos veículos.
+
+    Serve para calcular métricas bloco a bloco (iter_csv_chunks) ou arquivo
+    a arquivo (em processos separados) e juntar tudo no final.
+    """
+
+    def __init__(self, thresholds=(), relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy deve estar entre 0 e 1.")
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.relative_accuracy = float(relative_accuracy)
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+
+        self.per_vehicle = pd.DataFrame(
+            {
+                "n_rows": pd.Series(dtype="int64"),
+                "count": pd.Series(dtype="int64"),
+                "mean": pd.Series(dtype="float64"),
+                "m2": pd.Series(dtype="float64"),
+                "min": pd.Series(dtype="float64"),
+                "max": pd.Series(dtype="float64"),
+            },
+            index=pd.Index([], name="vehicle_id", dtype=object),
+        )
+        self.exceedances = pd.DataFrame(
+            {t: pd.Series(dtype="int64") for t in self.thresholds},
+            index=self.per_vehicle.index,
+        )
+        # contagem por (vehicle_id, bucket)
+        self.sketch = pd.Series(
+            dtype="int64",
+            index=pd.MultiIndex.from_arrays([[], []], names=["vehicle_id", "bucket"]),
+        )
+
+    @classmethod
+    def from_frame(cls, df, thresholds=(), relative_accuracy=0.01):
+        """
+        Agregado de um DataFrame (arquivo inteiro, bloco ou recorte filtrado).
+        """
+        agg = cls(thresholds, relative_accuracy)
+        if df.empty:
+            return agg
+
+        codes, uniques = pd.factorize(df["vehicle_id"], sort=True)
+        vehicle_ids = pd.Index(np.asarray(uniques, dtype=object).astype(str), name="vehicle_id")
+        nox = df["NOx"].to_numpy(dtype="float64")
+        valid_vehicle = codes >= 0
+        codes, nox = codes[valid_vehicle], nox[valid_vehicle]
+        n_vehicles = len(vehicle_ids)
+
+        has_nox = ~np.isnan(nox)
+        count, mean, m2 = _vehicle_moments(codes, nox, n_vehicles)
+        nox_grouped = pd.Series(nox).groupby(codes)
+
+        agg.per_vehicle = pd.DataFrame(
+            {
+                "n_rows": np.bincount(codes, minlength=n_vehicles),
+                "count": count,
+                "mean": mean,
+                "m2": m2,
+                "min": nox_grouped.min().reindex(range(n_vehicles)).to_numpy(),
+                "max": nox_grouped.max().reindex(range(n_vehicles)).to_numpy(),
+            },
+            index=vehicle_ids,
+        )
+        agg.exceedances = pd.DataFrame(
+            {
+                t: np.bincount(codes, weights=nox > t, minlength=n_vehicles).astype("int64")
+                for t in agg.thresholds
+            },
+            index=vehicle_ids,
+        )
+
+        buckets = _bucket_ids(nox[has_nox], np.log(agg.gamma))
+        pairs = pd.DataFrame({"code": codes[has_nox], "bucket": buckets})
+        counts = pairs.groupby(["code", "bucket"]).size()
+        agg.sketch = pd.Series(
+            counts.to_numpy(dtype="int64"),
+            index=pd.MultiIndex.from_arrays(
+                [
+                    vehicle_ids[counts.index.get_level_values("code")],
+                    counts.index.get_level_values("bucket"),
+                ],
+                names=["vehicle_id", "bucket"],
+            ),
+        )
+        return agg
+
+    def merge(self, other):
+        """
+        Novo agregado com a soma deste e de `other` (operação associativa e
+        comutativa: a ordem dos blocos não muda o resultado).
+        """
+        if self.thresholds != other.thresholds or self.relative_accuracy != other.relative_accuracy:
+            raise ValueError("Só é possível juntar agregados com os mesmos thresholds e relative_accuracy.")
+
+        merged = NOxAggregate(self.thresholds, self.relative_accuracy)
+        both = pd.concat([self.per_vehicle, other.per_vehicle])
+        merged.per_vehicle = _merge_stats(
+            both, "vehicle_id", {"n_rows": "sum", "count": "sum", "min": "min", "max": "max"}
+        )
+        merged.exceedances = (
+            pd.concat([self.exceedances, other.exceedances])
+            .groupby(level="vehicle_id", sort=True)
+            .sum()
+            .reindex(merged.per_vehicle.index, fill_value=0)
+        )
+        merged.sketch = (
+            pd.concat([self.sketch, other.sketch])
+            .groupby(level=["vehicle_id", "bucket"], sort=True)
+            .sum()
+        )
+        return merged
+
+    def vehicle_quantile(self, q):
+        """
+        Percentil q (0–1) de NOx por veículo, com erro relativo <= relative_accuracy.
+        """
+        result = {}
+        for vid, counts in self.sketch.groupby(level="vehicle_id", sort=True):
+            buckets = counts.index.get_level_values("bucket").to_numpy()
+            result[vid] = _sketch_quantile(buckets, counts.to_numpy(), q, self.gamma)
+        return pd.Series(result, dtype="float64").reindex(self.per_vehicle.index)
+
+    def quantile(self, q):
+        """
+        Percentil q (0–1) de NOx da frota inteira.
+        """
+        fleet = self.sketch.groupby(level="bucket", sort=True).sum()
+        return _sketch_quantile(fleet.index.to_numpy(), fleet.to_numpy(), q, self.gamma)
+
+    def _count_above(self, threshold):
+        # exato se o threshold foi pedido na construção; senão, pelo sketch
+        threshold = float(threshold)
+        if threshold in self.thresholds:
+            return self.exceedances[threshold].reindex(self.per_vehicle.index, fill_value=0)
+        buckets = self.sketch.index.get_level_values("bucket").to_numpy()
+        above = self.sketch.where(_bucket_values(buckets, self.gamma) > threshold, 0)
+        return above.groupby(level="vehicle_id").sum().reindex(self.per_vehicle.index, fill_value=0)
+
+    def basic_stats(self):
+        """
+        Mesmo dicionário de compute_basic_stats; a mediana vem do sketch.
+        """
+        pv = self.per_vehicle
+        count = int(pv["count"].sum())
+        total = float((pv["mean"] * pv["count"])[pv["count"] > 0].sum())
+        return {
+            "global_mean_nox": total / count if count else float("nan"),
+            "global_median_nox": self.quantile(0.5),
+            "n_vehicles": int(len(self.per_vehicle)),
+            "n_records": int(pv["n_rows"].sum()),
+        }
+
+    def vehicle_stats(self):
+        """
+        Média, desvio padrão, mín/máx e contagens por veículo.
+        """
+        pv = self.per_vehicle
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = pv["m2"] / (pv["count"] - 1)
+        return pd.DataFrame({
+            "n_records": pv["n_rows"],
+            "mean_nox": pv["mean"],
+            "std_nox": np.sqrt(var.where(pv["count"] > 1)),
+            "min_nox": pv["min"],
+            "max_nox": pv["max"],
+        })
+
+    def vehicle_ranking(self, threshold):
+        """
+        Mesmas colunas e ordem de compute_vehicle_ranking; a mediana vem do
+        sketch e a fração é exata quando o threshold está em `thresholds`.
+        """
+        pv = self.per_vehicle
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ranking_df = pd.DataFrame({
+                "vehicle_id": pv.index.to_numpy(dtype=object),
+                "mean_nox": pv["mean"].to_numpy(),
+                "median_nox": self.vehicle_quantile(0.5).to_numpy(),
+                "fraction_time_above_threshold": (self._count_above(threshold) / pv["n_rows"]).to_numpy(),
+            })
+        return ranking_df.sort_values(
+            by="fraction_time_above_threshold",
+            ascending=False
+        )
+
+
+def nox_bin_edges(nox_min, nox_max, bins=10, log=False):
+    """
+    Limites de `bins` faixas iguais entre nox_min e nox_max (ou faixas com
+    razão constante, se log=True; só valores positivos entram nesse caso).
+    """
+    if bins < 1:
+        raise ValueError("bins deve ser pelo menos 1.")
+    nox_min, nox_max = float(nox_min), float(nox_max)
+    if log:
+        if nox_max <= 0:
+            raise ValueError("Escala log precisa de valores de NOx positivos.")
+        nox_min = max(nox_min, _MIN_INDEXABLE)
+        if nox_min == nox_max:
+            nox_min, nox_max = nox_min / 2, nox_max * 2
+        return np.geomspace(nox_min, nox_max, bins + 1)
+    if nox_min == nox_max:
+        # mesma convenção do np.histogram para intervalo vazio
+        nox_min, nox_max = nox_min - 0.5, nox_max + 0.5
+    return np.linspace(nox_min, nox_max, bins + 1)
+
+
+class NOxHistogram:
+    """
+    Contagem de NOx por faixa (bin) e por veículo, com limites fixos.
+
+    Segue a convenção do np.histogram: faixas [a, b), a última fechada;
+    valores fora dos limites ficam de fora e são contados em n_outside.
+    Histogramas com os mesmos limites podem ser somados (merge), então dá
+    para montar o histograma bloco a bloco a partir de iter_csv_chunks.
+    """
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype="float64")
+        if self.edges.ndim != 1 or len(self.edges) < 2 or (np.diff(self.edges) <= 0).any():
+            raise ValueError("edges deve ser crescente e ter pelo menos dois valores.")
+        self.counts = pd.DataFrame(
+            np.zeros((0, self.n_bins), dtype="int64"),
+            index=pd.Index([], name="vehicle_id", dtype=object),
+        )
+        self.n_outside = 0
+
+    @property
+    def n_bins(self):
+        return len(self.edges) - 1
+
+    @classmethod
+    def from_frame(cls, df, edges):
+        """
+        Histograma de um DataFrame (arquivo inteiro, bloco ou recorte filtrado).
+        """
+        hist = cls(edges)
+        if df.empty:
+            return hist
+
+        codes, uniques = pd.factorize(df["vehicle_id"], sort=True)
+        vehicle_ids = pd.Index(np.asarray(uniques, dtype=object).astype(str), name="vehicle_id")
+        nox = df["NOx"].to_numpy(dtype="float64")
+        keep = (codes >= 0) & ~np.isnan(nox)
+        codes, nox = codes[keep], nox[keep]
+
+        bins = np.searchsorted(hist.edges, nox, side="right") - 1
+        bins[nox == hist.edges[-1]] = hist.n_bins - 1
+        inside = (bins >= 0) & (bins < hist.n_bins)
+        hist.n_outside = int((~inside).sum())
+
+        flat = codes[inside] * hist.n_bins + bins[inside]
+        counts = np.bincount(flat, minlength=len(vehicle_ids) * hist.n_bins)
+        hist.counts = pd.DataFrame(counts.reshape(len(vehicle_ids), hist.n_bins), index=vehicle_ids)
+        return hist
+
+    def merge(self, other):
+        """
+        Novo histograma com a soma deste e de `other` (mesmos limites).
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Só é possível juntar histogramas com os mesmos limites (edges).")
+        merged = NOxHistogram(self.edges)
+        merged.counts = (
+            pd.concat([self.counts, other.counts])
+            .groupby(level="vehicle_id", sort=True)
+            .sum()
+        )
+        merged.n_outside = self.n_outside + other.n_outside
+        return merged
+
+    def total(self):
+        """
+        Contagem por faixa da frota inteira.
+        """
+        return self.counts.to_numpy().sum(axis=0)
+
+
+def histogram_frames(frames, edges):
+    """
+    Histograma de uma sequência de DataFrames, bloco a bloco.
+    """
+    total = NOxHistogram(edges)
+    for frame in frames:
+        total = total.merge(NOxHistogram.from_frame(frame, edges))
+    return total
+
+
+def aggregate_frames(frames, thresholds=(), relative_accuracy=0.01):
+    """
+    Agrega uma sequência de DataFrames (ex.: iter_csv_chunks(path)) bloco a
+    bloco, sem juntar as linhas na memória.
+    """
+    total = NOxAggregate(thresholds, relative_accuracy)
+    for frame in frames:
+        total = total.merge(NOxAggregate.from_frame(frame, thresholds, relative_accuracy))
+    return total
@@ -0,0 +1,174 @@
+import hashlib
+import io
+import os
+import uuid
+
+import pandas as pd
+
+from src.data_loader import LOADER_SCHEMA_VERSION, load_csv
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "FLEET_NOX_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fleet-nox-eda"),
+)
+
+# Tamanho máximo do cache em disco (bytes). Acima disso, os arquivos usados
+# há mais tempo são removidos (LRU).
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _hash_source(path_or_buffer):
+    """
+    Calcula o SHA-256 do conteúdo do CSV.
+
+    Retorna (digest, fonte) onde fonte é algo que load_csv consegue ler:
+    o próprio caminho (lido em blocos, sem carregar tudo na memória) ou um
+    BytesIO com o conteúdo de um file-like (ex.: UploadedFile do Streamlit).
+    """
+    digest = hashlib.sha256()
+
+    if isinstance(path_or_buffer, (str, os.PathLike)):
+        with open(path_or_buffer, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest(), path_or_buffer
+
+    if hasattr(path_or_buffer, "getvalue"):
+        data = path_or_buffer.getvalue()
+    else:
+        if hasattr(path_or_buffer, "seek"):
+            path_or_buffer.seek(0)
+        data = path_or_buffer.read()
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    digest.update(data)
+    return digest.hexdigest(), io.BytesIO(data)
+
+
+def cache_key(content_digest, schema_version=None, compact=False, columns=None):
+    """
+    Chave de uma entrada do cache: versão do loader + hash do conteúdo.
+
+    As opções de load_csv (compact, columns) entram na chave, já que geram
+    DataFrames diferentes a partir do mesmo arquivo.
+    """
+    if schema_version is None:
+        schema_version = LOADER_SCHEMA_VERSION
+    key = f"v{schema_version}-{content_digest}"
+    if compact or columns is not None:
+        options = repr((bool(compact), None if columns is None else list(columns)))
+        key += "-" + hashlib.sha256(options.encode("utf-8")).hexdigest()[:12]
+    return key
+
+
+def _entry_version(file_name):
+    # "v3-abc123.parquet" -> 3 (None se o nome não seguir o padrão)
+    prefix = file_name.split("-", 1)[0]
+    if not prefix.startswith("v") or not prefix[1:].isdigit():
+        return None
+    return int(prefix[1:])
+
+
+def _list_entries(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".parquet"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _evict(cache_dir, max_bytes, keep_path=None):
+    """
+    Remove as entradas usadas há mais tempo até o cache caber em max_bytes.
+    """
+    entries = sorted(_list_entries(cache_dir))
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep_path:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def load_csv_cached(path_or_buffer, cache_dir=None, max_bytes=None, compact=False, columns=None):
+    """
+    Igual a load_csv, mas guarda o DataFrame normalizado em Parquet.
+
+    A chave é o hash do conteúdo do arquivo mais LOADER_SCHEMA_VERSION,
+    então o mesmo CSV (mesmo com outro nome) só é processado uma vez. Nas
+    cargas seguintes as colunas são lidas direto do Parquet.
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+
+    digest, source = _hash_source(path_or_buffer)
+    key = cache_key(digest, compact=compact, columns=columns)
+    cache_path = os.path.join(cache_dir, key + ".parquet")
+
+    if os.path.exists(cache_path):
+        try:
+            df = pd.read_parquet(cache_path)
+            # marca como usado agora (o LRU ordena pelo mtime)
+            os.utime(cache_path)
+            return df
+        except Exception:
+            # arquivo corrompido ou incompleto: descarta e recalcula
+            try:
+                os.remove(cache_path)
+            except FileNotFoundError:
+                pass
+
+    df = load_csv(source, compact=compact, columns=columns)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # escreve em arquivo temporário e renomeia, para nunca deixar um Parquet
+    # pela metade caso duas sessões carreguem o mesmo arquivo ao mesmo tempo
+    tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _evict(cache_dir, max_bytes, keep_path=cache_path)
+    return df
+
+
+def invalidate_cache(cache_dir=None, all_versions=False):
+    """
+    Remove entradas do cache.
+
+    Por padrão remove só as entradas geradas por versões antigas do loader
+    (LOADER_SCHEMA_VERSION diferente da atual). Com all_versions=True,
+    limpa o cache inteiro. Retorna o número de arquivos removidos.
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    removed = 0
+    for _, _, path in _list_entries(cache_dir):
+        version = _entry_version(os.path.basename(path))
+        if all_versions or version != LOADER_SCHEMA_VERSION:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
@@ -0,0 +1,164 @@
+"""
+Junta arquivos da frota que se sobrepõem no tempo sem contar a mesma leitura
+duas vezes.
+
+Cada arquivo é ordenado por (vehicle_id, timestamp, order), ou só conferido
+quando já vem ordenado. As sequências ordenadas são intercaladas (merge de
+k vias) e as leituras repetidas caem numa passada só, comparando cada linha
+com a anterior. Nada de drop_duplicates com hash sobre o conjunto inteiro.
+"""
+import numpy as np
+import pandas as pd
+
+from src.data_loader import concat_fleet_frames
+
+# Chave de uma leitura: linhas com a mesma chave são a mesma leitura.
+DEDUP_KEY = ("vehicle_id", "timestamp", "order")
+
+
+def _vehicle_codes(frames):
+    # códigos de veículo comuns a todos os arquivos, na ordem alfabética
+    # (a mesma das categorias do modo compacto e do FleetIndex)
+    labels = set()
+    for df in frames:
+        col = df["vehicle_id"]
+        values = col.cat.categories if isinstance(col.dtype, pd.CategoricalDtype) else pd.unique(col)
+        labels.update(str(v) for v in values)
+    labels = pd.Index(sorted(labels), dtype=object)
+
+    codes = []
+    for df in frames:
+        col = df["vehicle_id"]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            remap = labels.get_indexer(col.cat.categories.astype(str))
+            codes.append(remap[col.cat.codes.to_numpy()].astype("int64"))
+        else:
+            codes.append(labels.get_indexer(col.astype(str)).astype("int64"))
+    return labels, codes
+
+
+def _sort_key(codes, offsets, n_vehicles):
+    """
+    Veículo e timestamp numa chave int64 só (veículo nos bits altos), ou None
+    se o intervalo de tempo não couber junto com o veículo.
+    """
+    vehicle_bits = max(1, int(n_vehicles).bit_length())
+    if int(offsets.max(initial=0)).bit_length() + vehicle_bits > 62:
+        return None
+    return (codes << (62 - vehicle_bits)) | offsets
+
+
+def _is_sorted(key, order):
+    # ordem (chave, order) sem decrescer
+    if len(key) < 2:
+        return True
+    d_key = np.diff(key)
+    if order is None:
+        return bool((d_key >= 0).all())
+    return bool(((d_key > 0) | ((d_key == 0) & (order[1:] >= order[:-1]))).all())
+
+
+def _sort_order(key, order, kind="stable"):
+    """
+    Permutação que ordena por (chave, order, posição). O argsort estável
+    (timsort) aproveita as sequências já ordenadas: para k arquivos
+    ordenados e concatenados, é um merge de k vias, O(n log k); um arquivo
+    embaralhado vai melhor com kind="quicksort". Depois só os empates de
+    chave fora de ordem são reordenados.
+    """
+    perm = np.argsort(key, kind=kind)
+    if order is None and kind == "stable":
+        return perm
+    sorted_key = key[perm]
+    tie = sorted_key[1:] == sorted_key[:-1]
+    unordered = tie & (perm[1:] < perm[:-1])
+    if order is not None:
+        sorted_order = order[perm]
+        unordered = tie & (
+            (sorted_order[1:] < sorted_order[:-1])
+            | ((sorted_order[1:] == sorted_order[:-1]) & (perm[1:] < perm[:-1]))
+        )
+    if unordered.any():
+        group = np.cumsum(np.concatenate([[True], ~tie])) - 1
+        positions = np.flatnonzero(np.isin(group, group[1:][unordered]))
+        tie_keys = (perm[positions], group[positions])
+        if order is not None:
+            tie_keys = (perm[positions], order[perm[positions]], group[positions])
+        perm[positions] = perm[positions][np.lexsort(tie_keys)]
+    return perm
+
+
+def combine_fleet_frames(frames, key=DEDUP_KEY):
+    """
+    Junta DataFrames normalizados por load_csv (ex.: um por arquivo) numa
+    sequência ordenada por (vehicle_id, timestamp, order), sem leituras
+    repetidas pela chave `key` (fica a primeira, na ordem dos arquivos).
+
+    A saída tem RangeIndex e já está na ordem do FleetIndex
+    (FleetIndex.from_sorted_frame, sem ordenar de novo); vehicle_id é
+    categórico se algum arquivo já era.
+
+    Retorna (df, relatório) com n_input_rows, n_rows, n_duplicates,
+    presorted (um bool por arquivo) e merge ("merge" ou "lexsort").
+    """
+    frames = [df for df in frames if df is not None]
+    use_order = "order" in key and all("order" in df.columns for df in frames)
+    labels, codes = _vehicle_codes(frames)
+    timestamps = [df["timestamp"].to_numpy(dtype="datetime64[ns]").view("int64") for df in frames]
+    orders = [df["order"].to_numpy().astype("float64") if use_order else None for df in frames]
+
+    combined = concat_fleet_frames(frames)
+    report = {"n_input_rows": len(combined), "presorted": [], "merge": "merge"}
+    if len(combined) == 0:
+        report.update(n_rows=0, n_duplicates=0, presorted=[True] * len(frames))
+        return combined, report
+
+    # timestamps como deslocamento desde o primeiro, na resolução comum dos
+    # arquivos (ex.: ms), para caber na chave junto com o veículo
+    ts_min = min(ts.min() for ts in timestamps if len(ts))
+    offsets = [ts - ts_min for ts in timestamps]
+    step = int(np.gcd.reduce(np.concatenate(offsets))) or 1
+    keys = [_sort_key(c, o // step, len(labels)) for c, o in zip(codes, offsets)]
+
+    all_codes = np.concatenate(codes)
+    all_timestamps = np.concatenate(timestamps)
+    all_orders = np.concatenate(orders) if use_order else None
+
+    if any(k is None for k in keys):
+        # intervalo longo demais para a chave única: lexsort de tudo
+        sort_keys = (all_timestamps, all_codes) if not use_order else (all_orders, all_timestamps, all_codes)
+        rows = np.lexsort(sort_keys)
+        report["merge"] = "lexsort"
+        report["presorted"] = [None] * len(frames)
+    else:
+        # cada arquivo fora de ordem é ordenado sozinho; depois, merge de todos
+        rows_per_frame = []
+        offset = 0
+        for i, (frame_key, order) in enumerate(zip(keys, orders)):
+            row_ids = np.arange(offset, offset + len(frame_key), dtype="int64")
+            presorted = _is_sorted(frame_key, order)
+            if not presorted:
+                perm = _sort_order(frame_key, order, kind="quicksort")
+                keys[i], row_ids = frame_key[perm], row_ids[perm]
+                orders[i] = None if order is None else order[perm]
+            report["presorted"].append(presorted)
+            rows_per_frame.append(row_ids)
+            offset += len(frame_key)
+        perm = _sort_order(np.concatenate(keys), np.concatenate(orders) if use_order else None)
+        rows = np.concatenate(rows_per_frame)[perm]
+
+    # repetida = mesma chave da linha anterior (as iguais ficaram vizinhas)
+    sorted_codes = all_codes[rows]
+    sorted_timestamps = all_timestamps[rows]
+    same = (sorted_codes[1:] == sorted_codes[:-1]) & (sorted_timestamps[1:] == sorted_timestamps[:-1])
+    if use_order:
+        sorted_orders = all_orders[rows]
+        same &= sorted_orders[1:] == sorted_orders[:-1]
+    keep = np.concatenate([[True], ~same])
+
+    df = combined.take(rows[keep]).reset_index(drop=True)
+    if any(isinstance(f["vehicle_id"].dtype, pd.CategoricalDtype) for f in frames):
+        df["vehicle_id"] = pd.Categorical.from_codes(sorted_codes[keep], categories=labels)
+
+    report.update(n_rows=len(df), n_duplicates=int(len(combined) - len(df)))
+    return df, report
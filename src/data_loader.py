@@ -1,4 +1,219 @@
+import time
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# Versão da lógica de normalização de load_csv. Incrementar sempre que a
+# saída mudar (colunas, tipos, regras de limpeza), para invalidar o cache
+# em Parquet (src/cache.py) gerado por versões anteriores.
+LOADER_SCHEMA_VERSION = 2
+
+# Colunas que o dashboard (app.py) realmente usa. Serve como projeção
+# padrão para load_csv(..., columns=DASHBOARD_COLUMNS).
+DASHBOARD_COLUMNS = [
+    "timestamp",
+    "vehicle_id",
+    "NOx",
+    "O2",
+    "latitude",
+    "longitude",
+    "order",
+    "NOx_dp",
+]
+
+# Colunas de origem que load_csv precisa ler para montar a saída padrão,
+# mesmo quando o usuário pede só um subconjunto de colunas.
+_SOURCE_COLUMNS = {
+    "vehicle_id",
+    "vehicle_name",
+    "vehicle_number",
+    "timestamp",
+    "NOx",
+    "O2",
+    "latitude",
+    "longitude",
+    "position",
+}
+
+# Modo compacto: poluentes e coordenadas em float32, ids como category.
+_FLOAT32_COLUMNS = [
+    "NOx_max",
+    "NOx_min",
+    "NOx_dp",
+    "O2",
+    "latitude",
+    "longitude",
+]
+_CATEGORY_COLUMNS = ["vehicle_id", "vehicle_name"]
+
+# Aceita variações vistas em campo: 'point' minúsculo, espaços extras e
+# prefixo 'SRID=4326;'. Os grupos capturam os dois números de dentro do POINT.
+_POSITION_REGEX = (
+    r"(?i)^\s*(?:SRID=\d+\s*;\s*)?POINT\s*\(\s*"
+    r"(?P<lon>[-+.\deE]+)\s+(?P<lat>[-+.\deE]+)\s*\)"
+)
+
+
+# Formato do timestamp: detectado numa amostra do começo de cada arquivo e
+# depois aplicado ao arquivo inteiro. Formatos de texto testados, em ordem.
+_TIMESTAMP_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%d %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%Y-%m-%d",
+]
+_TIMESTAMP_SAMPLE_SIZE = 1_000
+
+# Formatos fora do ISO: o pandas converte linha a linha (~0,2 M linhas/s) e o
+# strptime do Arrow, ~15x mais rápido. Os ISO ficam no parser do pandas,
+# que já é vetorizado.
+_ARROW_STRPTIME_FORMATS = {"%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M"}
+
+# Epoch numérico: a unidade sai da ordem de grandeza (|mediana| abaixo de
+# 1e11 = segundos, de 1e14 = ms, de 1e17 = µs; acima, ns). Vale para datas
+# entre ~1973 e ~5000.
+_EPOCH_UNITS = [(1e11, "s"), (1e14, "ms"), (1e17, "us"), (np.inf, "ns")]
+_UNITS_PER_SECOND = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}
+
+# Timestamps "colapsados": resolução de um minuto ou mais e a maioria das
+# leituras de um veículo repetindo o timestamp de outra (ex.: 1.70883E+12,
+# que só guarda 6 dígitos e junta ~3 h de leituras no mesmo valor).
+_COLLAPSED_RESOLUTION_SECONDS = 60
+_COLLAPSED_DUPLICATE_FRACTION = 0.5
+
+
+def detect_timestamp_format(sample):
+    """
+    Formato dos timestamps a partir de uma amostra (Series): "epoch_s",
+    "epoch_ms", "epoch_us" ou "epoch_ns" para números; um formato de
+    strptime (ex.: "%Y-%m-%d %H:%M:%S") ou "ISO8601" para texto; None se
+    nenhum servir (o pandas infere, como antes).
+    """
+    sample = sample.dropna()
+    if pd.api.types.is_numeric_dtype(sample):
+        magnitude = np.abs(np.median(sample.to_numpy(dtype="float64"))) if len(sample) else 0.0
+        unit = next(u for limit, u in _EPOCH_UNITS if magnitude < limit)
+        return f"epoch_{unit}"
+
+    sample = sample.astype(str).str.strip()
+    for fmt in _TIMESTAMP_FORMATS + ["ISO8601"]:
+        try:
+            pd.to_datetime(sample, format=fmt, errors="raise")
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def _epoch_to_datetime(ints, unit):
+    # epoch inteiro -> datetime64[ns] só com multiplicação de int64
+    factor = 10**9 // _UNITS_PER_SECOND[unit]
+    limit = np.iinfo("int64").max // factor
+    if len(ints) and (ints.max() > limit or ints.min() < -limit):
+        raise ValueError(f"Timestamp fora do intervalo suportado para epoch em {unit}.")
+    return (ints * factor).view("datetime64[ns]")
+
+
+def _epoch_resolution(ints, unit):
+    # maior potência de 10 que divide todos os valores, em segundos
+    nonzero = ints[ints != 0]
+    if len(nonzero) == 0:
+        return None
+    divisor = int(np.gcd.reduce(np.abs(nonzero)))
+    power = 1
+    while divisor % (power * 10) == 0:
+        power *= 10
+    return power / _UNITS_PER_SECOND[unit]
+
+
+def _duplicate_fraction(vehicle_ids, timestamps):
+    # fração de leituras da amostra com o mesmo (veículo, timestamp) de outra
+    pairs = pd.DataFrame({"vehicle_id": np.asarray(vehicle_ids), "timestamp": np.asarray(timestamps)})
+    return float(pairs.duplicated().mean()) if len(pairs) else 0.0
+
+
+def parse_timestamp_column(values, timestamp_format=None, vehicle_ids=None):
+    """
+    Converte a coluna de timestamp do CSV para datetime64[ns] com um formato
+    explícito (detectado numa amostra se não for dado).
+
+    Epoch numérico vira int64 e é convertido só com inteiros (sem passar
+    por float, que perde precisão em µs/ns); colunas float com valores
+    inteiros (ex.: com células vazias) também. Valores ausentes viram NaT.
+
+    Retorna (timestamps, diagnóstico), onde o diagnóstico é um dict com
+    format, n_rows, parse_seconds, rows_per_second, resolution_seconds
+    (maior potência de 10 que divide os epochs, ou None), duplicate_fraction
+    (na amostra, por veículo, se vehicle_ids for dado) e collapsed (True
+    quando a resolução e as repetições indicam timestamps colapsados, como
+    os exportados em notação científica).
+    """
+    t0 = time.perf_counter()
+    if timestamp_format is None:
+        timestamp_format = detect_timestamp_format(values.head(_TIMESTAMP_SAMPLE_SIZE))
+
+    resolution = None
+    if timestamp_format is not None and timestamp_format.startswith("epoch_"):
+        unit = timestamp_format[len("epoch_"):]
+        raw = pd.to_numeric(values, errors="raise").to_numpy()
+        if pd.api.types.is_integer_dtype(raw.dtype):
+            ints = raw.astype("int64", copy=False)
+            parsed = _epoch_to_datetime(ints, unit)
+            resolution = _epoch_resolution(ints[:_TIMESTAMP_SAMPLE_SIZE], unit)
+        else:
+            valid = ~np.isnan(raw)
+            parsed = np.full(len(raw), np.datetime64("NaT"), dtype="datetime64[ns]")
+            floats = raw[valid]
+            if np.array_equal(floats, np.round(floats)):
+                # float só por causa de células vazias: volta para int64
+                ints = floats.astype("int64")
+                parsed[valid] = _epoch_to_datetime(ints, unit)
+                resolution = _epoch_resolution(ints[:_TIMESTAMP_SAMPLE_SIZE], unit)
+            else:
+                # frações da unidade (ex.: segundos com casas decimais)
+                parsed[valid] = pd.to_datetime(floats, unit=unit, errors="raise").to_numpy()
+        timestamps = pd.Series(parsed, index=values.index)
+    elif timestamp_format in _ARROW_STRPTIME_FORMATS:
+        strings = pc.utf8_trim_whitespace(pa.array(values.astype(object), type=pa.string(), from_pandas=True))
+        try:
+            parsed = pc.strptime(strings, format=timestamp_format, unit="ns")
+        except pa.ArrowInvalid as exc:
+            raise ValueError(str(exc)) from exc
+        timestamps = pd.Series(parsed.to_numpy(zero_copy_only=False), index=values.index)
+    elif timestamp_format is not None:
+        timestamps = pd.to_datetime(values, format=timestamp_format, errors="raise")
+    else:
+        timestamps = pd.to_datetime(values, errors="raise")
+    elapsed = time.perf_counter() - t0
+
+    duplicates = None
+    if vehicle_ids is not None:
+        duplicates = _duplicate_fraction(
+            vehicle_ids[:_TIMESTAMP_SAMPLE_SIZE], timestamps.to_numpy()[:_TIMESTAMP_SAMPLE_SIZE]
+        )
+    collapsed = (
+        resolution is not None
+        and duplicates is not None
+        and resolution >= _COLLAPSED_RESOLUTION_SECONDS
+        and duplicates >= _COLLAPSED_DUPLICATE_FRACTION
+    )
+    diagnostics = {
+        "format": timestamp_format or "inferred",
+        "n_rows": len(values),
+        "parse_seconds": elapsed,
+        "rows_per_second": len(values) / elapsed if elapsed > 0 else float("inf"),
+        "resolution_seconds": resolution,
+        "duplicate_fraction": duplicates,
+        "collapsed": bool(collapsed),
+    }
+    return timestamps, diagnostics
 
 
 def _parse_position_to_lat_lon(position_str):
@@ -25,32 +240,121 @@ def _parse_position_to_lat_lon(position_str):
         return None, None
 
 
-def load_csv(path_or_buffer):
+def _to_float_array(arrow_strings):
     """
-    Carrega um CSV de telemetria de frota no formato que você recebeu da empresa
-    e o converte para um formato interno padrão usado pelo restante da aplicação.
+    Converte um array de strings do pyarrow em float64 (NaN onde não der).
+    """
+    try:
+        values = pc.cast(arrow_strings, pa.float64())
+        return values.to_numpy(zero_copy_only=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # algum token passou pelo regex mas não é número (ex.: '1-2')
+        return pd.to_numeric(
+            arrow_strings.to_pandas(), errors="coerce"
+        ).to_numpy(dtype="float64")
 
-    Entrada esperada (como no demo_fleet.csv real):
-      - vehicle_number
-      - vehicle_name
-      - timestamp  (em milissegundos desde epoch)
-      - NOx
-      - O2
-      - position   (string 'POINT(lon lat)')
-      - outras colunas são mantidas, mas não são obrigatórias
 
-    Saída (DataFrame) garantida:
-      - timestamp  (datetime)
-      - vehicle_id (string, derivado de vehicle_name ou vehicle_number)
-      - NOx        (float)
-      - O2         (float)
-      - latitude   (float, pode ser NaN se não houver posição válida)
-      - longitude  (float, pode ser NaN se não houver posição válida)
-      + todas as colunas originais do CSV
+def parse_position_column(positions):
+    """
+    Versão vetorizada de _parse_position_to_lat_lon para uma coluna inteira.
+
+    Recebe uma Series com strings 'POINT(lon lat)' e retorna dois arrays
+    float64 (lat, lon), com NaN para valores ausentes ou mal formados.
+    O parsing roda em C++ (regex do pyarrow), sem loop Python por linha.
     """
-    # Lê o CSV
-    df = pd.read_csv(path_or_buffer)
+    positions = pd.Series(positions)
+    if len(positions) == 0:
+        empty = np.array([], dtype="float64")
+        return empty, empty.copy()
+
+    values = positions.to_numpy(dtype=object)
+    try:
+        arrow_strings = pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # coluna com tipos misturados (ex.: números soltos): força string
+        values = positions.astype(str).where(positions.notna()).to_numpy(dtype=object)
+        arrow_strings = pa.array(values, type=pa.string(), from_pandas=True)
+
+    extracted = pc.extract_regex(arrow_strings, _POSITION_REGEX)
+    lat = _to_float_array(pc.struct_field(extracted, "lat"))
+    lon = _to_float_array(pc.struct_field(extracted, "lon"))
+
+    # como no parser linha a linha: se um dos dois falhar, ambos viram NaN
+    invalid = np.isnan(lat) | np.isnan(lon)
+    lat = np.where(invalid, np.nan, lat)
+    lon = np.where(invalid, np.nan, lon)
+    return lat, lon
 
+
+def compact_fleet_frame(df):
+    """
+    Reduz o uso de memória de um DataFrame já normalizado por load_csv.
+
+    - vehicle_id (e vehicle_name) viram category;
+    - poluentes (NOx_max, NOx_min, NOx_dp, O2) e coordenadas viram float32;
+      NOx vira float64, mesmo se o CSV só tiver inteiros;
+    - colunas inteiras (order, samples, contadores...) são reduzidas ao
+      menor tipo inteiro que comporta os valores;
+    - a coluna bruta 'position' é descartada (latitude/longitude já existem).
+    """
+    df = df.drop(columns=["position"], errors="ignore")
+
+    for col in _CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    for col in _FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+
+    # NOx fica em float64 (nem float32, nem inteiro reduzido): médias,
+    # medianas e thresholds devem dar o mesmo resultado com e sem compact
+    if "NOx" in df.columns:
+        df["NOx"] = pd.to_numeric(df["NOx"], errors="coerce").astype("float64")
+
+    for col in df.columns:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    return df
+
+
+def concat_fleet_frames(frames):
+    """
+    pd.concat de arquivos (ou blocos) compactados um a um, com os tipos que
+    o conjunto inteiro teria se fosse compactado de uma vez: cada arquivo
+    tem as suas categorias, e o concat voltaria para object. As colunas
+    category ficam com a união ordenada das categorias. Inteiros já saem
+    iguais: o menor tipo do conjunto é o maior entre os dos arquivos.
+    """
+    frames = list(frames)
+    df = pd.concat(frames, ignore_index=True)
+    for col in df.columns:
+        categorical = [isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames if col in f.columns]
+        if not any(categorical):
+            continue
+        if len(categorical) == len(frames) and all(categorical):
+            df[col] = pd.api.types.union_categoricals([f[col] for f in frames], sort_categories=True)
+        else:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _usecols_for(columns):
+    # Projeção na leitura: além das colunas pedidas, lê as de origem
+    # necessárias para montar vehicle_id, timestamp, NOx, O2 e posição.
+    if columns is None:
+        return None
+    wanted = set(columns) | _SOURCE_COLUMNS
+    return lambda c: c.strip() in wanted
+
+
+def _normalize_frame(df, timestamp_format=None):
+    """
+    Aplica as regras de normalização de load_csv a um DataFrame lido do CSV
+    (arquivo inteiro ou um bloco dele). timestamp_format, se dado, pula a
+    detecção (ex.: blocos seguintes do mesmo arquivo).
+    """
     # Normaliza nomes de colunas (tira espaços nas bordas, etc.)
     df.columns = [c.strip() for c in df.columns]
 
@@ -71,12 +375,11 @@ def load_csv(path_or_buffer):
     if "timestamp" not in df.columns:
         raise ValueError("Coluna 'timestamp' não encontrada no CSV.")
 
-    # Se for numérico, assumimos que está em milissegundos desde epoch
-    if pd.api.types.is_numeric_dtype(df["timestamp"]):
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", errors="raise")
-    else:
-        # Se já vier como string legível (ISO etc.), apenas converte
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="raise")
+    # Epoch numérico (unidade pela ordem de grandeza) ou texto com formato
+    # detectado numa amostra; o diagnóstico fica em df.attrs.
+    df["timestamp"], diagnostics = parse_timestamp_column(
+        df["timestamp"], timestamp_format, vehicle_ids=df["vehicle_id"].to_numpy()
+    )
 
     # --- NOx ----------------------------------------------------------------
     if "NOx" not in df.columns:
@@ -94,12 +397,7 @@ def load_csv(path_or_buffer):
         df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
         df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
     elif "position" in df.columns:
-        lats = []
-        lons = []
-        for pos in df["position"]:
-            lat, lon = _parse_position_to_lat_lon(pos)
-            lats.append(lat)
-            lons.append(lon)
+        lats, lons = parse_position_column(df["position"])
         df["latitude"] = lats
         df["longitude"] = lons
     else:
@@ -109,5 +407,81 @@ def load_csv(path_or_buffer):
 
     # Remove linhas sem timestamp ou NOx válido, para evitar erros nos gráficos
     df = df.dropna(subset=["timestamp", "NOx"])
+    df.attrs["timestamp_diagnostics"] = diagnostics
 
     return df
+
+
+def _finish_frame(df, compact, columns):
+    if compact:
+        df = compact_fleet_frame(df)
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+
+    return df
+
+
+def load_csv(path_or_buffer, compact=False, columns=None):
+    """
+    Carrega um CSV de telemetria de frota no formato que você recebeu da empresa
+    e o converte para um formato interno padrão usado pelo restante da aplicação.
+
+    Entrada esperada (como no demo_fleet.csv real):
+      - vehicle_number
+      - vehicle_name
+      - timestamp  (epoch em s/ms/µs/ns, detectado pela ordem de grandeza,
+                    ou texto em formato de data; ver parse_timestamp_column)
+      - NOx
+      - O2
+      - position   (string 'POINT(lon lat)'; aceita também 'point(...)' e
+                    'SRID=4326;POINT(...)')
+      - outras colunas são mantidas, mas não são obrigatórias
+
+    Saída (DataFrame) garantida:
+      - timestamp  (datetime)
+      - vehicle_id (string, derivado de vehicle_name ou vehicle_number)
+      - NOx        (float)
+      - O2         (float)
+      - latitude   (float, pode ser NaN se não houver posição válida)
+      - longitude  (float, pode ser NaN se não houver posição válida)
+      + todas as colunas originais do CSV
+
+    Opções:
+      - compact=True aplica compact_fleet_frame (tipos menores, sem 'position');
+      - columns=[...] mantém só essas colunas na saída (ex.: DASHBOARD_COLUMNS).
+        As demais colunas do CSV nem chegam a ser lidas.
+
+    O diagnóstico dos timestamps (formato, velocidade de conversão,
+    resolução, timestamps colapsados) fica em df.attrs["timestamp_diagnostics"].
+    """
+    df = pd.read_csv(path_or_buffer, usecols=_usecols_for(columns))
+    return _finish_frame(_normalize_frame(df), compact, columns)
+
+
+def iter_csv_chunks(path_or_buffer, chunksize=500_000, compact=False, columns=None):
+    """
+    Versão em streaming de load_csv: lê o CSV em blocos de `chunksize`
+    linhas e devolve (gerador) cada bloco já normalizado, com as mesmas
+    regras de load_csv (vehicle_id, timestamp, NOx/O2, posição, dropna).
+
+    A memória usada fica limitada ao tamanho de um bloco, então serve para
+    arquivos maiores que a RAM. Blocos que ficam vazios depois do dropna
+    são pulados. O formato do timestamp é detectado no primeiro bloco.
+    """
+    reader = pd.read_csv(
+        path_or_buffer,
+        usecols=_usecols_for(columns),
+        chunksize=chunksize,
+    )
+    timestamp_format = None
+    with reader:
+        for chunk in reader:
+            chunk = _normalize_frame(chunk, timestamp_format)
+            # formato detectado no primeiro bloco vale para o arquivo todo
+            timestamp_format = chunk.attrs["timestamp_diagnostics"]["format"]
+            if timestamp_format == "inferred":
+                timestamp_format = None
+            chunk = _finish_frame(chunk, compact, columns)
+            if not chunk.empty:
+                yield chunk
@@ -0,0 +1,116 @@
+import numpy as np
+
+from src.fleet_index import sort_fleet_frame
+
+DOWNSAMPLE_METHODS = ("minmax", "lttb")
+
+
+def minmax_indices(x, y, n_buckets, x_min=None, x_max=None):
+    """
+    Posições dos pontos mantidos ao reduzir (x, y) a no máximo 2 pontos por
+    faixa de x: o mínimo e o máximo de y em cada faixa, mais o primeiro e o
+    último ponto. Picos nunca somem, porque o máximo de cada faixa fica.
+
+    x precisa estar em ordem crescente. As faixas têm a mesma largura e vão
+    de x_min a x_max (por padrão, o primeiro e o último x), então séries
+    diferentes reduzidas com os mesmos limites ficam na mesma grade.
+    """
+    n = len(x)
+    valid = ~np.isnan(y)
+    if n <= 2 * n_buckets:
+        return np.flatnonzero(valid)
+
+    x_min = x[0] if x_min is None else x_min
+    x_max = x[-1] if x_max is None else x_max
+    width = max((x_max - x_min) / n_buckets, 1)
+    edges = x_min + width * np.arange(1, n_buckets)
+
+    # x já está em ordem: cada faixa é um trecho contíguo
+    bounds = np.r_[0, np.searchsorted(x, edges, side="left"), n]
+    starts = bounds[:-1][bounds[:-1] < bounds[1:]]
+    sizes = np.diff(np.r_[starts, n])
+
+    # fmin/fmax ignoram NaN; fica a primeira posição com o mínimo/máximo da faixa
+    keep = []
+    for extreme in (np.fmin.reduceat(y, starts), np.fmax.reduceat(y, starts)):
+        hits = np.flatnonzero(y == np.repeat(extreme, sizes))
+        bucket = np.searchsorted(starts, hits, side="right")
+        keep.append(hits[np.r_[True, bucket[1:] != bucket[:-1]]])
+
+    valid_positions = np.flatnonzero(valid)
+    if len(valid_positions):
+        keep.append(valid_positions[[0, -1]])
+    return np.unique(np.concatenate(keep))
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Posições dos pontos mantidos pelo Largest-Triangle-Three-Buckets: em cada
+    faixa (mesmo número de pontos) fica o ponto que forma o maior triângulo
+    com o ponto escolhido na faixa anterior e a média da faixa seguinte.
+    Preserva a forma da curva e os picos com n_out pontos.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+
+    x = np.asarray(x, dtype="float64")[valid]
+    y = np.asarray(y, dtype="float64")[valid]
+    edges = np.linspace(1, n - 1, n_out - 1).astype("int64")
+
+    kept = np.empty(n_out, dtype="int64")
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        next_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[i + 1] = previous
+    return valid[kept]
+
+
+def downsample_fleet_series(df, index=None, max_points=2000, method="minmax"):
+    """
+    Reduz a série de NOx de cada veículo a no máximo ~max_points pontos.
+
+    Com "minmax", o intervalo de tempo do recorte (o período selecionado) é
+    dividido em max_points / 2 faixas iguais, comuns a todos os veículos:
+    períodos curtos ficam com faixas curtas (até mostrar todos os pontos) e
+    períodos longos, com faixas longas. Com "lttb", cada veículo é reduzido a
+    max_points pontos pelo LTTB.
+
+    Devolve as linhas mantidas (timestamp, vehicle_id, NOx), ordenadas por
+    veículo e tempo.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Método de redução desconhecido: {method!r}. Use um de {DOWNSAMPLE_METHODS}.")
+
+    columns = ["timestamp", "vehicle_id", "NOx"]
+    if index is None:
+        df, index = sort_fleet_frame(df[columns])
+    if len(index.timestamps) == 0:
+        return df[columns].iloc[:0]
+
+    t_min, t_max = index.timestamps.min(), index.timestamps.max()
+    nox = df["NOx"].to_numpy(dtype="float64")
+
+    positions = []
+    for start, stop in zip(index.starts, index.stops):
+        t = index.timestamps[start:stop]
+        y = nox[start:stop]
+        if method == "minmax":
+            kept = minmax_indices(t, y, max(max_points // 2, 1), t_min, t_max)
+        else:
+            kept = lttb_indices(t, y, max_points)
+        positions.append(start + kept)
+
+    positions = np.concatenate(positions) if positions else np.array([], dtype="int64")
+    return df[columns].iloc[positions]
@@ -1,8 +1,69 @@
-def apply_date_filter(df, start_date, end_date):
+import pyarrow.dataset as ds
+
+
+def apply_date_filter(df, start_date, end_date, index=None):
+    """
+    Mantém as linhas com data entre start_date e end_date (inclusive).
+
+    Se `index` (FleetIndex de df, ver src/fleet_index.py) for informado, o
+    filtro usa busca binária nos timestamps já ordenados em vez de comparar
+    a data de cada linha.
+    """
+    if index is not None:
+        starts, stops = index.date_ranges(start_date, end_date)
+        return index.take(df, starts, stops)[0]
+
     mask = (df["timestamp"].dt.date >= start_date) & (df["timestamp"].dt.date <= end_date)
     return df.loc[mask]
 
-def apply_vehicle_filter(df, vehicle_ids):
+def apply_vehicle_filter(df, vehicle_ids, index=None):
+    """
+    Mantém só as linhas dos veículos escolhidos (lista vazia = todos).
+
+    Com `index`, junta as faixas contíguas de cada veículo em vez de rodar
+    isin sobre o DataFrame inteiro.
+    """
     if not vehicle_ids:
         return df
+    if index is not None:
+        starts, stops = index.vehicle_ranges(vehicle_ids)
+        return index.take(df, starts, stops)[0]
     return df[df["vehicle_id"].isin(vehicle_ids)]
+
+def apply_filters(df, index, start_date, end_date, vehicle_ids):
+    """
+    Aplica os filtros de veículo e de data usando o FleetIndex de df.
+
+    Retorna (df_filtrado, índice_filtrado). O índice devolvido continua
+    válido para o DataFrame filtrado, então métricas e mapa podem usá-lo
+    sem reconstruí-lo.
+    """
+    if vehicle_ids:
+        starts, stops = index.vehicle_ranges(vehicle_ids)
+        # todos os veículos escolhidos: nada a recortar
+        if len(starts) < len(index.starts):
+            df, index = index.take(df, starts, stops)
+    starts, stops = index.date_ranges(start_date, end_date)
+    return index.take(df, starts, stops)
+
+def dataset_filter(start_date=None, end_date=None, vehicle_ids=None):
+    """
+    Os mesmos filtros de apply_filters como expressão do pyarrow.dataset,
+    para consultas no armazenamento em Parquet (src/store.py).
+
+    Datas e veículos caem nas colunas de partição (date, vehicle_id), então
+    o pyarrow nem abre os arquivos fora do recorte. Retorna None se não há
+    filtro.
+    """
+    conditions = []
+    if start_date is not None:
+        conditions.append(ds.field("date") >= start_date)
+    if end_date is not None:
+        conditions.append(ds.field("date") <= end_date)
+    if vehicle_ids:
+        conditions.append(ds.field("vehicle_id").isin([str(v) for v in vehicle_ids]))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
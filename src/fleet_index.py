@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+
+from src.data_loader import concat_fleet_frames
+
+
+def _ranges_to_positions(starts, stops):
+    """
+    Concatena np.arange(start, stop) de cada faixa sem loop Python.
+    """
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.array([], dtype="int64")
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    # posição de cada linha = início da faixa + deslocamento dentro dela
+    offsets = np.arange(total, dtype="int64") - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def _segment_searchsorted(values, starts, stops, target, side="left"):
+    """
+    np.searchsorted(values[start:stop], target, side=side) + start de cada
+    faixa, com a busca binária feita em todas as faixas ao mesmo tempo: cada
+    passo do loop é uma operação vetorizada sobre os veículos, e o número de
+    passos é o log2 da maior faixa. `target` pode ser um valor só ou um por
+    faixa.
+    """
+    lo = np.asarray(starts, dtype="int64").copy()
+    hi = np.asarray(stops, dtype="int64").copy()
+    target = np.broadcast_to(target, lo.shape)
+    active = np.flatnonzero(lo < hi)
+    while len(active):
+        mid = (lo[active] + hi[active]) // 2
+        if side == "left":
+            below = values[mid] < target[active]
+        else:
+            below = values[mid] <= target[active]
+        lo[active[below]] = mid[below] + 1
+        hi[active[~below]] = mid[~below]
+        active = active[lo[active] < hi[active]]
+    return lo
+
+
+def _timestamp_values(ts):
+    """
+    Timestamps como array datetime64 sem fuso. Colunas com fuso são
+    convertidas para UTC antes (o array de objetos Timestamp que o pandas
+    devolveria não tem visão int64).
+    """
+    if getattr(ts.dtype, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    return ts.to_numpy()
+
+
+def _day_bound(date, dtype, days_after=0, tz=None):
+    # meia-noite do dia, na mesma unidade (ns, ms, ...) da coluna timestamp;
+    # com fuso, a meia-noite local convertida para UTC (como os timestamps)
+    day = np.datetime64(pd.Timestamp(date).date(), "D") + days_after
+    if tz is not None:
+        local = pd.Timestamp(day).tz_localize(tz, ambiguous=True, nonexistent="shift_forward")
+        day = np.datetime64(local.tz_convert("UTC").tz_localize(None))
+    return day.astype(dtype).view("int64")
+
+
+class FleetIndex:
+    """
+    Índice de um DataFrame ordenado por (vehicle_id, timestamp).
+
+    Guarda, para cada veículo, a faixa contígua de linhas [start, stop) que
+    ele ocupa e os timestamps como int64. Com isso o filtro de datas vira
+    duas buscas binárias por veículo, em vez de comparar todas as linhas.
+
+    Também serve de índice por veículo: a faixa de um veículo sai de um
+    dicionário (O(1)) e um conjunto de veículos é a concatenação das faixas.
+
+    O índice vale só para o DataFrame a partir do qual foi construído
+    (mesma ordem de linhas); use sort_fleet_frame para obter os dois juntos.
+    Timestamps com fuso horário são guardados em UTC; o fuso fica em tz e os
+    filtros de data usam as datas locais, como apply_date_filter.
+    """
+
+    def __init__(self, vehicle_ids, starts, stops, timestamps, timestamp_dtype, tz=None):
+        self.vehicle_ids = vehicle_ids
+        self.starts = starts
+        self.stops = stops
+        self.timestamps = timestamps
+        self.timestamp_dtype = timestamp_dtype
+        self.tz = tz
+        self._positions = None
+
+    @classmethod
+    def from_sorted_frame(cls, df):
+        """
+        Constrói o índice de um DataFrame já ordenado por (vehicle_id, timestamp).
+        """
+        ts = _timestamp_values(df["timestamp"])
+        n_rows = len(df)
+        if n_rows:
+            codes, _ = pd.factorize(df["vehicle_id"])
+            # um novo veículo começa onde o código muda
+            boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+            starts = np.concatenate([[0], boundaries]).astype("int64")
+            stops = np.concatenate([boundaries, [n_rows]]).astype("int64")
+        else:
+            starts = np.array([], dtype="int64")
+            stops = np.array([], dtype="int64")
+        vehicle_ids = np.asarray(df["vehicle_id"].to_numpy()[starts], dtype=object)
+        tz = getattr(df["timestamp"].dtype, "tz", None)
+        return cls(vehicle_ids, starts, stops, ts.view("int64"), ts.dtype, tz)
+
+    def __len__(self):
+        return int(self.stops[-1]) if len(self.stops) else 0
+
+    def _vehicle_position(self, vehicle_id):
+        # posição do veículo em vehicle_ids/starts/stops (None se não existir)
+        if self._positions is None:
+            self._positions = {str(vid): i for i, vid in enumerate(self.vehicle_ids)}
+        return self._positions.get(str(vehicle_id))
+
+    def vehicle_range(self, vehicle_id):
+        """
+        Faixa de linhas [start, stop) de um veículo; (0, 0) se ele não existir.
+        """
+        i = self._vehicle_position(vehicle_id)
+        if i is None:
+            return 0, 0
+        return int(self.starts[i]), int(self.stops[i])
+
+    def vehicle_ranges(self, vehicle_ids):
+        """
+        Faixas (starts, stops) dos veículos pedidos, na ordem do DataFrame.
+        """
+        positions = [self._vehicle_position(v) for v in vehicle_ids]
+        positions = np.array(sorted({i for i in positions if i is not None}), dtype="int64")
+        return self.starts[positions], self.stops[positions]
+
+    def row_codes(self):
+        """
+        Código inteiro (posição em vehicle_ids) de cada linha do DataFrame,
+        para agrupar por veículo sem refazer o hash dos ids.
+        """
+        lengths = self.stops - self.starts
+        return np.repeat(np.arange(len(lengths), dtype="int64"), lengths)
+
+    def date_ranges(self, start_date, end_date):
+        """
+        Faixas de linhas (starts, stops) de cada veículo com data entre
+        start_date e end_date, inclusive (mesma regra de apply_date_filter).
+        """
+        lo = _day_bound(start_date, self.timestamp_dtype, tz=self.tz)
+        hi = _day_bound(end_date, self.timestamp_dtype, days_after=1, tz=self.tz)
+
+        new_starts = _segment_searchsorted(self.timestamps, self.starts, self.stops, lo)
+        new_stops = _segment_searchsorted(self.timestamps, new_starts, self.stops, hi)
+        return new_starts, new_stops
+
+    def take(self, df, starts, stops):
+        """
+        Recorta df nas faixas (starts, stops) e devolve (df_recortado, índice_novo).
+        Cada faixa deve estar dentro da faixa de um único veículo.
+
+        Faixas encostadas (a de um veículo termina onde começa a do
+        seguinte) são juntas antes do recorte; se sobrar uma faixa só, o
+        recorte é um slice (sem cópia de linhas). Num conjunto registrado
+        (src/registry.py) o slice herda o bloqueio de escrita do original.
+        """
+        keep = stops > starts
+        starts, stops = starts[keep], stops[keep]
+        # veículos que continuam no recorte (faixas são de veículos distintos)
+        vehicle_ids = self.vehicle_ids[np.searchsorted(self.starts, starts, side="right") - 1]
+
+        # só para escolher as linhas: o índice novo mantém uma faixa por veículo
+        opens = np.ones(len(starts), dtype=bool)
+        opens[1:] = stops[:-1] != starts[1:]
+        closes = np.ones(len(starts), dtype=bool)
+        closes[:-1] = opens[1:]
+        row_starts, row_stops = starts[opens], stops[closes]
+        if len(row_starts) == 1:
+            rows = slice(int(row_starts[0]), int(row_stops[0]))
+        else:
+            rows = _ranges_to_positions(row_starts, row_stops)
+        sub = df.iloc[rows]
+        timestamps = self.timestamps[rows]
+
+        lengths = stops - starts
+        new_stops = np.cumsum(lengths).astype("int64")
+        new_starts = new_stops - lengths
+        index = FleetIndex(
+            vehicle_ids,
+            new_starts,
+            new_stops,
+            timestamps,
+            self.timestamp_dtype,
+            self.tz,
+        )
+        return sub, index
+
+
+def sort_fleet_frame(df):
+    """
+    Ordena o DataFrame por (vehicle_id, timestamp) e constrói o FleetIndex.
+
+    Linhas sem timestamp são descartadas (load_csv já faz isso). Deve ser
+    chamado uma vez, logo depois da carga; os filtros reaproveitam o índice.
+    Retorna (df_ordenado, índice).
+    """
+    df = df.dropna(subset=["timestamp"])
+    df = df.sort_values(["vehicle_id", "timestamp"], kind="stable").reset_index(drop=True)
+    return df, FleetIndex.from_sorted_frame(df)
+
+
+def merge_sorted_frames(df, index, new):
+    """
+    Junta a `df` (ordenado, com seu FleetIndex) as linhas de `new`, sem
+    reordenar o conjunto todo: só `new` é ordenado, e cada linha nova entra
+    na faixa do seu veículo por busca binária. Empates de timestamp ficam
+    com as linhas de df primeiro, como em sort_fleet_frame(concat([df, new])).
+    Retorna (df_junto, índice).
+    """
+    new, new_index = sort_fleet_frame(new)
+    lengths = new_index.stops - new_index.starts
+    old_ids = np.asarray(index.vehicle_ids).astype(str)
+
+    # faixa de cada veículo novo em df; veículo que ainda não existe tem
+    # faixa vazia no ponto em que entraria na ordem dos ids
+    seg_starts = np.empty(len(new_index.vehicle_ids), dtype="int64")
+    seg_stops = np.empty(len(new_index.vehicle_ids), dtype="int64")
+    for i, vid in enumerate(new_index.vehicle_ids):
+        position = index._vehicle_position(vid)
+        if position is None:
+            at = np.searchsorted(old_ids, str(vid))
+            seg_starts[i] = seg_stops[i] = index.starts[at] if at < len(old_ids) else len(index)
+        else:
+            seg_starts[i], seg_stops[i] = index.starts[position], index.stops[position]
+
+    new_ts = _timestamp_values(new["timestamp"]).astype(index.timestamp_dtype).view("int64")
+    # linhas de df antes de cada linha nova (não decresce: new está ordenado)
+    before = _segment_searchsorted(
+        index.timestamps,
+        np.repeat(seg_starts, lengths),
+        np.repeat(seg_stops, lengths),
+        new_ts,
+        side="right",
+    )
+    n_old, n_new = len(df), len(new)
+    order = np.empty(n_old + n_new, dtype="int64")
+    order[before + np.arange(n_new)] = n_old + np.arange(n_new)
+    old_rows = np.arange(n_old)
+    order[old_rows + np.searchsorted(before, old_rows, side="right")] = old_rows
+
+    combined = concat_fleet_frames([df, new])
+    if not isinstance(combined["vehicle_id"].dtype, pd.CategoricalDtype):
+        combined["vehicle_id"] = combined["vehicle_id"].astype("category")
+    combined = combined.take(order).reset_index(drop=True)
+    return combined, FleetIndex.from_sorted_frame(combined)
@@ -0,0 +1,114 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.cache import load_csv_cached
+from src.combine import combine_fleet_frames
+from src.data_loader import concat_fleet_frames, load_csv
+
+
+def _source_name(source):
+    # UploadedFile do Streamlit e arquivos abertos têm .name; caminhos não
+    name = getattr(source, "name", source)
+    return os.path.basename(str(name))
+
+
+def _picklable_source(source):
+    """
+    Caminhos vão direto para o worker; file-likes (ex.: UploadedFile) são
+    convertidos em bytes, já que não podem ser enviados para outro processo.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source.read()
+
+
+def _load_one(source, use_cache, cache_dir, compact, columns):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if use_cache:
+        return load_csv_cached(source, cache_dir=cache_dir, compact=compact, columns=columns)
+    return load_csv(source, compact=compact, columns=columns)
+
+
+def load_csv_files(
+    sources,
+    max_workers=None,
+    use_cache=False,
+    cache_dir=None,
+    compact=False,
+    columns=None,
+    deduplicate=False,
+):
+    """
+    Carrega vários CSVs de telemetria em paralelo (um processo por arquivo).
+
+    Retorna (df, errors):
+      - df: concatenação dos arquivos carregados, na mesma ordem de `sources`
+        (igual ao loop serial + pd.concat(ignore_index=True)); None se nenhum
+        arquivo pôde ser carregado;
+      - errors: lista de (nome_do_arquivo, mensagem), um item por arquivo com erro.
+
+    O diagnóstico dos timestamps de cada arquivo carregado fica em
+    df.attrs["timestamp_diagnostics_by_file"] (nome -> dict).
+
+    Com deduplicate=True os arquivos são juntos por combine_fleet_frames:
+    df sai ordenado por (vehicle_id, timestamp, order), sem as leituras
+    repetidas entre arquivos (ex.: exportações que se sobrepõem), e o
+    relatório da junção fica em df.attrs["combine"].
+
+    max_workers=1 (ou um único arquivo) carrega tudo no processo atual.
+    Com use_cache=True cada arquivo passa por load_csv_cached.
+    """
+    sources = list(sources)
+    names = [_source_name(s) for s in sources]
+    options = (use_cache, cache_dir, compact, columns)
+
+    if max_workers is None:
+        max_workers = min(len(sources), os.cpu_count() or 1)
+
+    results = []
+    if max_workers <= 1 or len(sources) <= 1:
+        for source in sources:
+            try:
+                results.append(_load_one(source, *options))
+            except Exception as e:
+                results.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_load_one, _picklable_source(s), *options)
+                for s in sources
+            ]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+
+    dfs = []
+    errors = []
+    diagnostics = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            errors.append((name, str(result)))
+        else:
+            dfs.append(result)
+            diagnostics[name] = result.attrs.get("timestamp_diagnostics")
+
+    if not dfs:
+        return None, errors
+
+    if deduplicate:
+        df, report = combine_fleet_frames(dfs)
+        df.attrs = {"timestamp_diagnostics_by_file": diagnostics, "combine": report}
+        return df, errors
+
+    # cada arquivo foi compactado sozinho: categorias unidas no conjunto
+    df = concat_fleet_frames(dfs)
+    df.attrs = {"timestamp_diagnostics_by_file": diagnostics}
+    return df, errors
@@ -0,0 +1,169 @@
+"""
+Dados e serialização dos mapas (pydeck).
+
+O st.pydeck_chart manda as camadas como JSON a cada rerun; o transporte
+binário do pydeck (use_binary_transport) só funciona no widget do Jupyter.
+Para o envio encolher, cada camada recebe só os campos que usa, com números
+curtos (map_points), e o Deck é serializado sem indentação (CompactDeck).
+
+O mapa da frota manda só células agregadas: nox_grid conta as leituras e
+calcula o NOx médio e o p95 em cada quadrado de uma grade fixa. A largura
+das células em longitude vem de uma latitude de referência do conjunto
+inteiro (grid_reference_latitude), não do recorte filtrado: assim a grade
+não muda de lugar quando os filtros mudam.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+from src.tracks import TRACK_TOOLTIP_COLUMNS
+
+# Casas decimais mandadas ao mapa: 5 nas coordenadas (~1 m), 1 no NOx.
+MAP_COORD_DECIMALS = 5
+MAP_VALUE_DECIMALS = 1
+
+# Lados das células da grade da frota, em metros (um por nível de zoom).
+GRID_CELL_SIZES = (2000, 500, 100)
+_METERS_PER_DEGREE = 111_320.0
+
+
+class CompactDeck(pdk.Deck):
+    """
+    pdk.Deck com o mesmo JSON, mas sem indentação. O pydeck serializa com
+    indent=2, o que faz o json usar o codificador em Python puro; sem indent
+    vale o codificador em C, bem mais rápido em camadas com muitos pontos.
+    """
+
+    def to_json(self):
+        return json.dumps(self, sort_keys=True, default=default_serialize, separators=(",", ":"))
+
+
+def map_points(window):
+    """
+    DataFrame com os pontos de uma janela (VehicleTrack.slice) só com os
+    campos das camadas do mapa temporal: lon, lat, NOx, t (segundos desde o
+    primeiro ponto, para o esmaecimento da trilha) e os da dica (hora e os
+    TRACK_TOOLTIP_COLUMNS presentes), com coordenadas e valores
+    arredondados. O veículo é o mesmo em todos os pontos e vai no texto da
+    dica, não em cada ponto.
+    """
+    seconds = window["timestamp"].astype("datetime64[s]")
+    points = {
+        "lon": np.round(window["longitude"], MAP_COORD_DECIMALS),
+        "lat": np.round(window["latitude"], MAP_COORD_DECIMALS),
+    }
+    if "NOx" in window:
+        points["NOx"] = np.round(window["NOx"].astype("float64"), MAP_VALUE_DECIMALS)
+    points["t"] = (seconds - seconds[0]).astype("int64") if len(seconds) else np.array([], dtype="int64")
+    # formatação do NumPy: bem mais rápida que o strftime do pandas
+    points["hora"] = np.strings.replace(np.datetime_as_string(seconds), "T", " ")
+    for name in TRACK_TOOLTIP_COLUMNS:
+        if name in window:
+            values = window[name]
+            if values.dtype.kind == "f":
+                values = np.round(values.astype("float64"), MAP_VALUE_DECIMALS)
+            points[name] = values
+    return pd.DataFrame(points)
+
+
+def layer_records(df):
+    """
+    Linhas de df como lista de dicionários, para o data de um pdk.Layer.
+    Igual a df.to_dict(orient="records") (que o pydeck chamaria), mas montada
+    a partir das colunas em listas, o que é mais rápido.
+    """
+    columns = [str(c) for c in df.columns]
+    return [dict(zip(columns, row)) for row in zip(*(df[c].tolist() for c in df.columns))]
+
+
+def grid_reference_latitude(latitude):
+    """
+    Latitude de referência da grade: a média de `latitude` (sem NaN)
+    arredondada para o grau inteiro, ou 0 se não houver nenhuma. Calculada
+    sobre o conjunto inteiro, é a mesma para qualquer filtro.
+    """
+    latitude = np.asarray(latitude, dtype="float64")
+    latitude = latitude[~np.isnan(latitude)]
+    return float(np.round(latitude.mean())) if len(latitude) else 0.0
+
+
+def nox_grid(latitude, longitude, nox, cell_size, reference_latitude, quantile=0.95):
+    """
+    Agrega leituras numa grade de quadrados de `cell_size` metros: para cada
+    célula com leituras, o canto sudoeste (lon, lat), o número de leituras,
+    o NOx médio e o quantil `quantile` (interpolação linear, como
+    np.quantile). Tudo vetorizado: as leituras são ordenadas por (célula,
+    NOx) e cada célula vira um trecho contíguo.
+
+    A largura das células em graus de longitude vem de reference_latitude
+    (grid_reference_latitude do conjunto inteiro), fixa para que a mesma
+    leitura caia na mesma célula em qualquer recorte. As células ficam
+    alinhadas em múltiplos do tamanho desde (0, 0), então as de 2000 m
+    contêm exatamente as de 500 m e 100 m.
+    """
+    latitude = np.asarray(latitude, dtype="float64")
+    longitude = np.asarray(longitude, dtype="float64")
+    nox = np.asarray(nox, dtype="float64")
+    valid = ~(np.isnan(latitude) | np.isnan(longitude) | np.isnan(nox))
+    latitude, longitude, nox = latitude[valid], longitude[valid], nox[valid]
+    if len(nox) == 0:
+        return pd.DataFrame({name: [] for name in ("lon", "lat", "n", "mean_nox", "p95_nox")})
+
+    dlat = cell_size / _METERS_PER_DEGREE
+    dlon = dlat / np.cos(np.radians(reference_latitude))
+    row = np.floor(latitude / dlat).astype("int64")
+    col = np.floor(longitude / dlon).astype("int64")
+    row_min, col_min = row.min(), col.min()
+    cell = (row - row_min) * (col.max() - col_min + 1) + (col - col_min)
+
+    # ordem por (célula, NOx) com um argsort só: a posição do NOx entre
+    # todas as leituras vai nos bits baixos da chave
+    rank = np.empty(len(nox), dtype="int64")
+    rank[np.argsort(nox)] = np.arange(len(nox))
+    rank_bits = max(1, int(len(nox)).bit_length())
+    if int(cell.max()).bit_length() + rank_bits <= 62:
+        order = np.argsort((cell << rank_bits) | rank)
+    else:
+        order = np.lexsort((nox, cell))
+    cell, nox = cell[order], nox[order]
+    starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+    counts = np.diff(np.r_[starts, len(cell)])
+
+    # quantil por célula no trecho já ordenado por NOx
+    position = quantile * (counts - 1)
+    below = np.floor(position).astype("int64")
+    above = np.minimum(below + 1, counts - 1)
+    fraction = position - below
+    p95 = nox[starts + below] + fraction * (nox[starts + above] - nox[starts + below])
+
+    first = order[starts]
+    return pd.DataFrame({
+        "lon": col[first] * dlon,
+        "lat": row[first] * dlat,
+        "n": counts,
+        "mean_nox": np.add.reduceat(nox, starts) / counts,
+        "p95_nox": p95,
+    })
+
+
+def grid_points(grid, value_column):
+    """
+    Células de nox_grid com os campos da camada do mapa: canto (lon, lat),
+    dica (n, média e p95 arredondados) e c, a cor de 0 a 255 pelo
+    `value_column`, com o topo da escala no percentil 95 das células (uma
+    célula extrema não apaga as outras).
+    """
+    values = grid[value_column].to_numpy()
+    top = float(np.percentile(values, 95)) if len(values) else 0.0
+    color = np.clip(values / top, 0.0, 1.0) * 255 if top > 0 else np.zeros(len(values))
+    return pd.DataFrame({
+        "lon": np.round(grid["lon"].to_numpy(), MAP_COORD_DECIMALS),
+        "lat": np.round(grid["lat"].to_numpy(), MAP_COORD_DECIMALS),
+        "n": grid["n"].to_numpy(),
+        "media": np.round(grid["mean_nox"].to_numpy(), MAP_VALUE_DECIMALS),
+        "p95": np.round(grid["p95_nox"].to_numpy(), MAP_VALUE_DECIMALS),
+        "c": color.astype("int64"),
+    })
@@ -1,21 +1,50 @@
 import numpy as np
+import pandas as pd
 
-def compute_basic_stats(df):
+from src.fleet_index import _timestamp_values
+
+# Estatísticas extras aceitas por compute_vehicle_ranking(extra_stats=...)
+# e o nome da coluna correspondente no ranking.
+EXTRA_RANKING_STATS = {
+    "p90": "p90_nox",
+    "p95": "p95_nox",
+    "max": "max_nox",
+    "count": "n_records",
+    "std": "std_nox",
+}
+
+def compute_basic_stats(df, index=None):
+    if index is not None:
+        # o FleetIndex já sabe quantos veículos há no recorte
+        n_vehicles = len(index.vehicle_ids)
+    else:
+        n_vehicles = int(df["vehicle_id"].nunique())
     return {
         "global_mean_nox": float(df["NOx"].mean()),
         "global_median_nox": float(df["NOx"].median()),
-        "n_vehicles": int(df["vehicle_id"].nunique()),
+        "n_vehicles": n_vehicles,
         "n_records": int(len(df)),
     }
 
-def compute_vehicle_ranking(df, threshold):
-    grouped = df.groupby("vehicle_id")
+def _iter_vehicle_nox(df, index=None):
+    # (vehicle_id, Series de NOx) por veículo; com FleetIndex cada grupo é
+    # só um slice da faixa contígua do veículo, sem groupby
+    if index is not None:
+        nox = df["NOx"]
+        for vid, start, stop in zip(index.vehicle_ids, index.starts, index.stops):
+            yield vid, nox.iloc[start:stop]
+    else:
+        for vid, g in df.groupby("vehicle_id", observed=True):
+            yield vid, g["NOx"]
+
+def _compute_vehicle_ranking_loop(df, threshold, index=None):
+    # motor original: um grupo por vez em Python (mantido para comparação)
     stats = []
 
-    for vid, g in grouped:
-        mean_nox = g["NOx"].mean()
-        median_nox = g["NOx"].median()
-        fraction_above = np.mean(g["NOx"] > threshold)
+    for vid, nox in _iter_vehicle_nox(df, index):
+        mean_nox = nox.mean()
+        median_nox = nox.median()
+        fraction_above = np.mean(nox > threshold)
         stats.append({
             "vehicle_id": vid,
             "mean_nox": mean_nox,
@@ -23,10 +52,317 @@ def compute_vehicle_ranking(df, threshold):
             "fraction_time_above_threshold": fraction_above,
         })
 
-    import pandas as pd
-    ranking_df = pd.DataFrame(stats)
+    return pd.DataFrame(stats)
+
+def _vehicle_codes(df, index=None):
+    """
+    Código inteiro do veículo de cada linha e a lista de veículos (ordenada).
+    Com FleetIndex os códigos saem das faixas, sem hash dos ids.
+    """
+    if index is not None:
+        return index.row_codes(), np.asarray(index.vehicle_ids, dtype=object)
+    codes, uniques = pd.factorize(df["vehicle_id"], sort=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+def _compute_vehicle_ranking_vectorized(df, threshold, index=None, extra_stats=()):
+    codes, vehicle_ids = _vehicle_codes(df, index)
+    nox = df["NOx"].to_numpy(dtype="float64")
+    if (codes < 0).any():
+        # vehicle_id ausente: fica fora do ranking, como no groupby
+        valid = codes >= 0
+        codes, nox = codes[valid], nox[valid]
+    n_vehicles = len(vehicle_ids)
+
+    # somas e contagens por veículo numa passada cada (bincount, em C);
+    # a fração usa todos os registros, a média ignora NOx ausente (NaN),
+    # como no motor em loop
+    has_nox = ~np.isnan(nox)
+    n_rows = np.bincount(codes, minlength=n_vehicles)
+    n_nox = np.bincount(codes, weights=has_nox, minlength=n_vehicles)
+    sum_nox = np.bincount(codes, weights=np.where(has_nox, nox, 0.0), minlength=n_vehicles)
+    n_above = np.bincount(codes, weights=nox > threshold, minlength=n_vehicles)
+
+    # mediana e percentis precisam ordenar cada grupo: um único groupby
+    # (uma fatoração) reaproveitado por todas as estatísticas de ordem
+    nox_grouped = pd.Series(nox).groupby(codes, sort=True)
+    present = np.flatnonzero(n_rows > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ranking_df = pd.DataFrame({
+            "vehicle_id": vehicle_ids[present],
+            "mean_nox": (sum_nox / n_nox)[present],
+            "median_nox": nox_grouped.median().to_numpy(),
+            "fraction_time_above_threshold": (n_above / n_rows)[present],
+        })
+
+    for stat in extra_stats:
+        if stat == "p90":
+            values = nox_grouped.quantile(0.90).to_numpy()
+        elif stat == "p95":
+            values = nox_grouped.quantile(0.95).to_numpy()
+        elif stat == "max":
+            values = nox_grouped.max().to_numpy()
+        elif stat == "count":
+            values = n_rows[present]
+        elif stat == "std":
+            values = nox_grouped.std().to_numpy()
+        else:
+            raise ValueError(
+                f"Estatística desconhecida: {stat!r} "
+                f"(use {', '.join(EXTRA_RANKING_STATS)})"
+            )
+        ranking_df[EXTRA_RANKING_STATS[stat]] = values
+
+    return ranking_df
+
+class SortedNOxByVehicle:
+    """
+    NOx de cada veículo ordenado, calculado uma vez por estado de filtro.
+
+    Não depende do threshold: a fração acima de qualquer limiar sai de uma
+    busca binária por veículo (feita para todos os veículos de uma vez, em
+    NumPy), sem varrer as linhas de novo. Média, desvio padrão e percentis
+    também saem daqui, então o ranking inteiro é recalculado na hora quando
+    só o threshold muda.
+    """
+
+    def __init__(self, df, index=None):
+        codes, self.vehicle_ids = _vehicle_codes(df, index)
+        nox = df["NOx"].to_numpy(dtype="float64")
+        if (codes < 0).any():
+            valid = codes >= 0
+            codes, nox = codes[valid], nox[valid]
+        n_vehicles = len(self.vehicle_ids)
+
+        self.n_rows = np.bincount(codes, minlength=n_vehicles)
+        self.n_nox = np.bincount(codes, weights=~np.isnan(nox), minlength=n_vehicles).astype("int64")
+        self.stops = np.cumsum(self.n_rows)
+        self.starts = self.stops - self.n_rows
+
+        # um lexsort só agrupa por veículo e ordena o NOx dentro de cada
+        # faixa; NaN vai para o fim da faixa e fica fora das estatísticas
+        # (só conta no total de registros, como no ranking)
+        self.values = nox[np.lexsort((nox, codes))]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sums = np.bincount(codes, weights=np.nan_to_num(nox), minlength=n_vehicles)
+            self.mean = sums / self.n_nox
+            centered = np.where(np.isnan(nox), 0.0, nox - self.mean[codes])
+            sq = np.bincount(codes, weights=centered**2, minlength=n_vehicles)
+            self.std = np.sqrt(sq / (self.n_nox - 1))
+        self.std[self.n_nox < 2] = np.nan
+
+    def quantile(self, q):
+        """
+        Percentil q (0–1) de cada veículo, interpolação linear como no pandas.
+        """
+        pos = (self.n_nox - 1) * q
+        lo = np.floor(pos).astype("int64")
+        hi = np.minimum(lo + 1, self.n_nox - 1)
+        frac = pos - lo
+        empty = self.n_nox == 0
+        lo_idx = np.where(empty, 0, self.starts + lo)
+        hi_idx = np.where(empty, 0, self.starts + hi)
+        if len(self.values) == 0:
+            return np.full(len(self.n_nox), np.nan)
+        low, high = self.values[lo_idx], self.values[hi_idx]
+        result = low + (high - low) * frac
+        result[empty] = np.nan
+        return result
+
+    def count_above(self, thresholds):
+        """
+        Número de registros com NOx > threshold, para cada veículo (linhas) e
+        cada threshold (colunas). Busca binária vetorizada em todas as faixas.
+        """
+        thresholds = np.atleast_1d(np.asarray(thresholds, dtype="float64"))[None, :]
+        lo = np.broadcast_to(self.starts[:, None], (len(self.starts), thresholds.shape[1])).copy()
+        hi = np.broadcast_to((self.starts + self.n_nox)[:, None], lo.shape).copy()
+        last = max(len(self.values) - 1, 0)
+
+        # ao final, lo aponta para o primeiro valor > threshold da faixa
+        while True:
+            active = lo < hi
+            if not active.any():
+                break
+            mid = (lo + hi) // 2
+            go_right = active & (self.values[np.minimum(mid, last)] <= thresholds)
+            lo = np.where(go_right, mid + 1, lo)
+            hi = np.where(active & ~go_right, mid, hi)
+
+        return (self.starts + self.n_nox)[:, None] - lo
+
+    def fraction_above(self, threshold):
+        """
+        Fração de registros com NOx > threshold por veículo.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.count_above(threshold)[:, 0] / self.n_rows
+
+    def exceedance_curves(self, thresholds):
+        """
+        Curvas de excedência: DataFrame com um veículo por linha, um threshold
+        por coluna e a fração de registros acima de cada threshold.
+        """
+        thresholds = list(thresholds)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fractions = self.count_above(thresholds) / self.n_rows[:, None]
+        return pd.DataFrame(
+            fractions,
+            index=pd.Index(self.vehicle_ids, name="vehicle_id"),
+            columns=thresholds,
+        )
+
+    def ranking(self, threshold, extra_stats=()):
+        """
+        Mesmas colunas do ranking vetorizado, sem voltar às linhas.
+        """
+        present = self.n_rows > 0
+        ranking_df = pd.DataFrame({
+            "vehicle_id": self.vehicle_ids,
+            "mean_nox": self.mean,
+            "median_nox": self.quantile(0.5),
+            "fraction_time_above_threshold": self.fraction_above(threshold),
+        })
+        for stat in extra_stats:
+            if stat == "p90":
+                values = self.quantile(0.90)
+            elif stat == "p95":
+                values = self.quantile(0.95)
+            elif stat == "max":
+                values = self.quantile(1.0)
+            elif stat == "count":
+                values = self.n_rows
+            elif stat == "std":
+                values = self.std
+            else:
+                raise ValueError(
+                    f"Estatística desconhecida: {stat!r} "
+                    f"(use {', '.join(EXTRA_RANKING_STATS)})"
+                )
+            ranking_df[EXTRA_RANKING_STATS[stat]] = values
+        return ranking_df[present].reset_index(drop=True)
+
+def build_sorted_nox(df, index=None):
+    """
+    Atalho para SortedNOxByVehicle(df, index): estrutura independente do
+    threshold, para recalcular ranking e curvas de excedência na hora.
+    """
+    return SortedNOxByVehicle(df, index)
+
+def compute_vehicle_ranking(
+    df,
+    threshold,
+    index=None,
+    extra_stats=(),
+    engine="vectorized",
+    sorted_nox=None,
+):
+    """
+    Ranking de veículos por fração de registros com NOx acima do threshold.
+
+    - engine="vectorized" (padrão) calcula tudo numa agregação agrupada;
+      engine="loop" é o motor antigo, um veículo por vez.
+    - extra_stats: estatísticas adicionais, entre "p90", "p95", "max",
+      "count" e "std" (só no motor vetorizado).
+    - sorted_nox: SortedNOxByVehicle já construído para este df; o ranking
+      sai dele sem reler as linhas (df é ignorado).
+    """
+    if sorted_nox is not None:
+        ranking_df = sorted_nox.ranking(threshold, extra_stats)
+    elif engine == "loop":
+        if extra_stats:
+            raise ValueError("extra_stats só está disponível com engine='vectorized'.")
+        ranking_df = _compute_vehicle_ranking_loop(df, threshold, index)
+    elif engine == "vectorized":
+        ranking_df = _compute_vehicle_ranking_vectorized(df, threshold, index, extra_stats)
+    else:
+        raise ValueError(f"engine deve ser 'vectorized' ou 'loop', não {engine!r}.")
+
     ranking_df = ranking_df.sort_values(
         by="fraction_time_above_threshold",
         ascending=False
     )
     return ranking_df
+
+def compute_time_weighted_metrics(df, threshold, max_gap_seconds=900, index=None):
+    """
+    Métricas por veículo ponderadas pelo tempo entre leituras consecutivas.
+
+    Cada leitura "vale" o intervalo até a próxima leitura do mesmo veículo.
+    Intervalos maiores que max_gap_seconds (veículo parado/sem sinal) e a
+    última leitura de cada veículo não contam tempo nenhum.
+
+    Colunas:
+      - observed_hours: horas cobertas por leituras;
+      - hours_above_threshold: horas com NOx > threshold;
+      - time_weighted_mean_nox: média de NOx ponderada pela duração;
+      - longest_exceedance_hours: maior episódio contínuo acima do threshold.
+
+    Tudo é calculado com diff/cumsum sobre os dados ordenados por
+    (vehicle_id, timestamp); com FleetIndex a ordenação já está feita.
+    """
+    codes, vehicle_ids = _vehicle_codes(df, index)
+    ts = _timestamp_values(df["timestamp"]).astype("datetime64[ns]").view("int64")
+    nox = df["NOx"].to_numpy(dtype="float64")
+
+    if index is None:
+        order = np.lexsort((ts, codes))
+        codes, ts, nox = codes[order], ts[order], nox[order]
+    if (codes < 0).any():
+        valid = codes >= 0
+        codes, ts, nox = codes[valid], ts[valid], nox[valid]
+    n_vehicles = len(vehicle_ids)
+
+    # intervalo até a próxima leitura; só vale dentro do mesmo veículo e
+    # até max_gap_seconds
+    gap = np.zeros(len(ts), dtype="int64")
+    gap[:-1] = np.diff(ts)
+    same_vehicle = np.zeros(len(codes), dtype=bool)
+    same_vehicle[:-1] = codes[1:] == codes[:-1]
+    continuous = same_vehicle & (gap <= int(max_gap_seconds * 1e9))
+    duration = np.where(continuous, gap, 0) / 3.6e12  # horas
+
+    has_nox = ~np.isnan(nox)
+    above = has_nox & (nox > threshold)
+    weight = np.where(has_nox, duration, 0.0)
+
+    observed = np.bincount(codes, weights=duration, minlength=n_vehicles)
+    hours_above = np.bincount(codes, weights=np.where(above, duration, 0.0), minlength=n_vehicles)
+    weighted_sum = np.bincount(codes, weights=weight * np.nan_to_num(nox), minlength=n_vehicles)
+    weight_total = np.bincount(codes, weights=weight, minlength=n_vehicles)
+
+    # episódios: sequências de leituras acima do threshold ligadas por
+    # intervalos contínuos; um novo episódio começa onde a sequência quebra
+    in_run = above & continuous
+    prev_in_run = np.zeros_like(in_run)
+    prev_in_run[1:] = in_run[:-1]
+    run_start = in_run & ~prev_in_run
+    run_id = np.cumsum(run_start) - 1
+    run_hours = np.bincount(run_id[in_run], weights=duration[in_run], minlength=int(run_start.sum()))
+    longest = np.zeros(n_vehicles)
+    np.maximum.at(longest, codes[run_start], run_hours)
+
+    present = np.bincount(codes, minlength=n_vehicles) > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = pd.DataFrame({
+            "vehicle_id": vehicle_ids,
+            "observed_hours": observed,
+            "hours_above_threshold": hours_above,
+            "time_weighted_mean_nox": weighted_sum / weight_total,
+            "longest_exceedance_hours": longest,
+        })
+    return result[present].reset_index(drop=True)
+
+def compute_mean_nox_by_vehicle(df):
+    """
+    NOx médio por veículo (colunas vehicle_id, NOx).
+    """
+    return df.groupby("vehicle_id", as_index=False, observed=True)["NOx"].mean()
+
+def compute_mean_nox_by_hour(df):
+    """
+    NOx médio por hora do dia, 0–23 (colunas hour, NOx).
+    """
+    hours = df["timestamp"].dt.hour.rename("hour")
+    return df["NOx"].groupby(hours).mean().reset_index()
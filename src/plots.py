@@ -1,45 +1,206 @@
+import numpy as np
+import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
+from src.aggregates import NOxHistogram, nox_bin_edges
+from src.downsample import downsample_fleet_series
+from src.metrics import build_sorted_nox, compute_mean_nox_by_hour, compute_mean_nox_by_vehicle
 
-def make_nox_histogram(df):
+# Cor padrão da primeira série no template do plotly (a mesma do px.box)
+_DEFAULT_COLOR = "#636efa"
+
+
+def make_nox_histogram(df, bins=10, edges=None, log_bins=False, log_y=False, by_vehicle=False, histogram=None):
     """
-    Histograma simples dos valores de NOx no período/veículos filtrados.
+    Histograma dos valores de NOx no período/veículos filtrados.
+
+    As contagens por faixa são calculadas no servidor (NOxHistogram); o
+    gráfico recebe só uma barra por faixa (ou por faixa e veículo, com
+    by_vehicle=True). Os limites vêm de `edges` ou de `bins` faixas entre o
+    mínimo e o máximo de NOx (razão constante com log_bins=True). Um
+    histograma já montado, por exemplo bloco a bloco, pode ser passado em
+    `histogram`. log_y usa escala log no eixo das contagens.
     """
-    fig = px.histogram(
-        df,
-        x="NOx",
-        nbins=10,
-        title="Histograma de NOx",
-        labels={"NOx": "NOx (ppm)", "count": "Contagem"},
-    )
+    if histogram is None:
+        if edges is None:
+            nox = df["NOx"].to_numpy(dtype="float64")
+            nox = nox[nox > 0] if log_bins else nox[~np.isnan(nox)]
+            if len(nox) == 0:
+                nox = np.array([1.0])
+            edges = nox_bin_edges(nox.min(), nox.max(), bins=bins, log=log_bins)
+        histogram = NOxHistogram.from_frame(df, edges)
+
+    edges = histogram.edges
+    widths = np.diff(edges)
+    centers = edges[:-1] + widths / 2
+    ranges = np.column_stack([edges[:-1], edges[1:]])
+    hover = "NOx: %{customdata[0]:.4g} – %{customdata[1]:.4g}<br>Contagem: %{y}<extra>%{fullData.name}</extra>"
+
+    if by_vehicle:
+        series = [(str(vid), row.to_numpy()) for vid, row in histogram.counts.iterrows()]
+    else:
+        series = [("NOx", histogram.total())]
+
+    fig = go.Figure()
+    for name, counts in series:
+        fig.add_trace(
+            go.Bar(
+                x=centers,
+                y=counts,
+                width=widths * 0.95,
+                customdata=ranges,
+                hovertemplate=hover,
+                name=name,
+                marker_color=None if by_vehicle else _DEFAULT_COLOR,
+                opacity=0.6 if by_vehicle else None,
+            )
+        )
     fig.update_layout(
-        bargap=0.05,
+        title="Histograma de NOx",
+        xaxis_title="NOx (ppm)",
+        yaxis_title="Contagem",
+        barmode="overlay",
+        showlegend=by_vehicle,
     )
+    if log_y:
+        fig.update_yaxes(type="log")
     return fig
 
 
-def make_nox_boxplot(df):
+def _hazen_quantile(values, q):
+    # mesma regra de plotly.js (quartilemethod="linear"): posição q*n - 0.5
+    n = len(values)
+    pos = min(max(q * n - 0.5, 0.0), n - 1)
+    lo = int(np.floor(pos))
+    hi = min(lo + 1, n - 1)
+    frac = pos - lo
+    return values[lo] * (1 - frac) + values[hi] * frac
+
+
+def compute_nox_box_stats(df, index=None, sorted_nox=None, max_outliers_per_vehicle=200):
+    """
+    Estatísticas do boxplot de NOx por veículo calculadas no servidor.
+
+    Reproduz o que o plotly.js faria no navegador: quartis com interpolação
+    linear, bigodes até o dado mais extremo dentro de 1,5 * IQR e pontos
+    fora disso como outliers. Os outliers de cada veículo são limitados a
+    max_outliers_per_vehicle (amostra espaçada, sempre com os extremos).
+
+    Retorna (stats, outliers): um DataFrame com uma linha por veículo
+    (vehicle_id, q1, median, q3, lowerfence, upperfence) e outro com os
+    outliers amostrados (vehicle_id, NOx).
+    """
+    if sorted_nox is None:
+        sorted_nox = build_sorted_nox(df, index=index)
+
+    rows = []
+    outlier_ids = []
+    outlier_values = []
+    for vid, start, n in zip(sorted_nox.vehicle_ids, sorted_nox.starts, sorted_nox.n_nox):
+        if n == 0:
+            continue
+        values = sorted_nox.values[start:start + n]
+        q1 = _hazen_quantile(values, 0.25)
+        median = _hazen_quantile(values, 0.5)
+        q3 = _hazen_quantile(values, 0.75)
+        iqr = q3 - q1
+
+        lo = np.searchsorted(values, q1 - 1.5 * iqr, side="left")
+        hi = np.searchsorted(values, q3 + 1.5 * iqr, side="right")
+        lowerfence = min(q1, values[min(lo, n - 1)])
+        upperfence = max(q3, values[max(hi - 1, 0)])
+        rows.append((vid, q1, median, q3, lowerfence, upperfence))
+
+        outliers = np.concatenate([values[:lo], values[hi:]])
+        if len(outliers) > max_outliers_per_vehicle:
+            keep = np.unique(np.linspace(0, len(outliers) - 1, max_outliers_per_vehicle).round().astype(int))
+            outliers = outliers[keep]
+        outlier_ids.extend([vid] * len(outliers))
+        outlier_values.append(outliers)
+
+    stats = pd.DataFrame(rows, columns=["vehicle_id", "q1", "median", "q3", "lowerfence", "upperfence"])
+    outliers = pd.DataFrame({
+        "vehicle_id": outlier_ids,
+        "NOx": np.concatenate(outlier_values) if outlier_values else np.array([], dtype="float64"),
+    })
+    return stats, outliers
+
+
+def make_nox_boxplot(df, precomputed=False, index=None, sorted_nox=None, max_outliers_per_vehicle=200):
     """
     Boxplot de NOx por veículo para comparar distribuição entre veículos.
+
+    Com precomputed=True os quartis, bigodes e uma amostra limitada de
+    outliers são calculados no servidor (compute_nox_box_stats) e só esses
+    números vão para o navegador: o tamanho do gráfico não depende mais do
+    número de linhas.
     """
-    fig = px.box(
+    if not precomputed:
+        fig = px.box(
+            df,
+            x="vehicle_id",
+            y="NOx",
+            title="Boxplot de NOx por veículo",
+            labels={"vehicle_id": "Veículo", "NOx": "NOx (ppm)"},
+        )
+        return fig
+
+    stats, outliers = compute_nox_box_stats(
         df,
-        x="vehicle_id",
-        y="NOx",
+        index=index,
+        sorted_nox=sorted_nox,
+        max_outliers_per_vehicle=max_outliers_per_vehicle,
+    )
+
+    fig = go.Figure()
+    fig.add_trace(
+        go.Box(
+            x=stats["vehicle_id"],
+            q1=stats["q1"],
+            median=stats["median"],
+            q3=stats["q3"],
+            lowerfence=stats["lowerfence"],
+            upperfence=stats["upperfence"],
+            marker_color=_DEFAULT_COLOR,
+            name="NOx",
+            showlegend=False,
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=outliers["vehicle_id"],
+            y=outliers["NOx"],
+            mode="markers",
+            marker={"color": _DEFAULT_COLOR},
+            name="outliers",
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
         title="Boxplot de NOx por veículo",
-        labels={"vehicle_id": "Veículo", "NOx": "NOx (ppm)"},
+        xaxis_title="Veículo",
+        yaxis_title="NOx (ppm)",
     )
     return fig
 
 
-def make_nox_timeseries(df):
+def make_nox_timeseries(df, index=None, max_points=2000, method="minmax"):
     """
     Série temporal de NOx, com uma linha por veículo.
+
+    Cada veículo é reduzido antes do gráfico a no máximo ~max_points pontos
+    (downsample_fleet_series, mínimo/máximo por faixa de tempo ou LTTB), então
+    o tamanho do gráfico não depende do número de linhas e os picos ficam.
+    max_points=None desenha todos os pontos.
     """
-    df_sorted = df.sort_values("timestamp")
+    if max_points is None:
+        df_plot = df.sort_values("timestamp")
+    else:
+        df_plot = downsample_fleet_series(df, index=index, max_points=max_points, method=method)
 
     fig = px.line(
-        df_sorted,
+        df_plot,
         x="timestamp",
         y="NOx",
         color="vehicle_id",
@@ -55,12 +216,16 @@ def make_nox_timeseries(df):
     return fig
 
 
-def make_mean_nox_by_vehicle_bar(df):
+def make_mean_nox_by_vehicle_bar(df, grouped=None):
     """
     Gráfico de barras com NOx médio por veículo.
     Útil para comparar rapidamente quais veículos emitem mais NOx em média.
+
+    `grouped` aceita as médias já calculadas (por exemplo, a partir dos
+    rollups, src/rollups.py); senão, saem de df.
     """
-    grouped = df.groupby("vehicle_id", as_index=False)["NOx"].mean()
+    if grouped is None:
+        grouped = compute_mean_nox_by_vehicle(df)
 
     fig = px.bar(
         grouped,
@@ -77,11 +242,7 @@ def make_mean_nox_by_hour_line(df):
     Linha com NOx médio por hora do dia (0–23).
     Útil para ver em que horários a frota tende a emitir mais.
     """
-    # cria coluna de hora (0–23) a partir do timestamp
-    df_hour = df.copy()
-    df_hour["hour"] = df_hour["timestamp"].dt.hour
-
-    grouped = df_hour.groupby("hour", as_index=False)["NOx"].mean()
+    grouped = compute_mean_nox_by_hour(df)
 
     fig = px.line(
         grouped,
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from src.cache import _hash_source, cache_key
+from src.fleet_index import merge_sorted_frames
+from src.rollups import compute_rollups
+
+# Memória máxima (bytes) dos conjuntos guardados no processo. Conjuntos em
+# uso por alguma sessão nunca são descartados, mesmo acima do limite.
+DEFAULT_REGISTRY_MAX_BYTES = int(
+    os.environ.get("FLEET_NOX_REGISTRY_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+)
+
+
+def dataset_key(sources, compact=False, columns=None):
+    """
+    Chave de um conjunto de arquivos pelo conteúdo: a mesma seleção de
+    arquivos (em qualquer ordem, em qualquer sessão) dá a mesma chave.
+
+    Retorna (chave, fontes): as fontes já lidas, ordenadas pelo hash, prontas
+    para load_csv_files (file-likes viram BytesIO com o mesmo .name).
+    """
+    hashed = []
+    for source in sources:
+        digest, readable = _hash_source(source)
+        if readable is not source:
+            readable.name = getattr(source, "name", "upload.csv")
+        hashed.append((digest, readable))
+    hashed.sort(key=lambda item: item[0])
+
+    combined = hashlib.sha256("".join(digest for digest, _ in hashed).encode("ascii")).hexdigest()
+    return cache_key(combined, compact=compact, columns=columns), [readable for _, readable in hashed]
+
+
+def frame_nbytes(df, index=None):
+    """
+    Memória ocupada por um DataFrame (e pelo FleetIndex dele, se houver).
+    """
+    if df is None:
+        return 0
+    total = int(df.memory_usage(deep=True).sum())
+    if index is not None:
+        total += sum(
+            arr.nbytes for arr in (index.vehicle_ids, index.starts, index.stops, index.timestamps)
+        )
+    return total
+
+
+def _freeze_index(index):
+    # compartilhado entre sessões: escrever nos arrays do índice vira erro
+    if index is None:
+        return
+    for arr in (index.vehicle_ids, index.starts, index.stops, index.timestamps):
+        arr.flags.writeable = False
+
+
+def _freeze_frame(df):
+    # compartilhado entre sessões: escrever nas colunas (ou num recorte que
+    # é view delas, ver FleetIndex.take) vira erro. Os arrays dos blocos do
+    # pandas são a única referência que cobre todas as colunas, inclusive
+    # timestamps com fuso e categorias.
+    for values in df._mgr.arrays:
+        values = getattr(values, "_ndarray", getattr(values, "_codes", values))
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+
+
+class Dataset:
+    """
+    Conjunto carregado e compartilhado entre sessões: DataFrame ordenado,
+    FleetIndex, erros de carga e, opcionalmente, os rollups diário/semanal
+    ({"day": NOxRollup, "week": NOxRollup}). É somente leitura: quem precisar alterar
+    as linhas deve trabalhar numa cópia. Num conjunto registrado, as colunas
+    e os arrays do índice ficam marcados como não graváveis (ver
+    DatasetRegistry.open), e os recortes dos filtros herdam a marca.
+    """
+
+    def __init__(self, frame, index=None, errors=(), rollups=None):
+        self.frame = frame
+        self.index = index
+        self.errors = list(errors)
+        self.rollups = rollups
+        self.nbytes = frame_nbytes(frame, index)
+        for rollup in (rollups or {}).values():
+            self.nbytes += int(rollup.stats.memory_usage(deep=True).sum() + rollup.sketch.memory_usage(deep=True))
+
+    def extended(self, frame):
+        """
+        Novo Dataset com as linhas de `frame` acrescentadas (as novas são
+        intercaladas nas faixas dos veículos, sem reordenar o conjunto;
+        rollups somados só com os das linhas novas). Este não muda: outras
+        sessões podem estar usando.
+        """
+        if frame is None or frame.empty:
+            return self
+        combined, index = merge_sorted_frames(self.frame, self.index, frame)
+
+        rollups = None
+        if self.rollups is not None:
+            added = compute_rollups(frame)
+            rollups = {period: self.rollups[period].merge(added[period]) for period in self.rollups}
+        return Dataset(combined, index, self.errors, rollups)
+
+
+class DatasetHandle:
+    """
+    Referência de uma sessão a um conjunto do registro. Enquanto existir, o
+    conjunto não é descartado; release() (ou o coletor de lixo, quando a
+    sessão acaba e o handle some) devolve a referência.
+    """
+
+    def __init__(self, registry, key, dataset):
+        self.key = key
+        self.dataset = dataset
+        if registry is None:
+            self._finalizer = None
+        else:
+            self._finalizer = weakref.finalize(self, registry._release, key)
+
+    def release(self):
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+class DatasetRegistry:
+    """
+    Conjuntos carregados, guardados uma vez por processo e compartilhados por
+    todas as sessões do Streamlit: cinco pessoas abrindo os mesmos arquivos
+    usam um DataFrame só.
+
+    Cada conjunto tem um contador de referências (handles abertos). Acima de
+    max_bytes, os conjuntos sem referência são descartados do usado há mais
+    tempo para o mais recente (LRU); os que estão em uso ficam.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = DEFAULT_REGISTRY_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # chave -> Dataset
+        self._refs = {}  # chave -> número de handles abertos
+
+    def open(self, key, load):
+        """
+        Handle para o conjunto `key`, chamando load() -> Dataset só se ele
+        ainda não estiver no registro. Conjuntos sem linhas (frame None) não
+        são guardados.
+        """
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is not None:
+                return self._acquire(key, dataset)
+
+        # carrega fora do lock para não travar as outras sessões
+        loaded = load()
+        if loaded.frame is None:
+            return DatasetHandle(None, key, loaded)
+        _freeze_frame(loaded.frame)
+        _freeze_index(loaded.index)
+
+        with self._lock:
+            # outra sessão pode ter carregado o mesmo conjunto enquanto isso
+            dataset = self._entries.setdefault(key, loaded)
+            handle = self._acquire(key, dataset)
+            self._evict()
+            return handle
+
+    def _acquire(self, key, dataset):
+        self._entries.move_to_end(key)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        return DatasetHandle(self, key, dataset)
+
+    def _release(self, key):
+        with self._lock:
+            if self._refs.get(key, 0) > 1:
+                self._refs[key] -= 1
+            else:
+                self._refs.pop(key, None)
+            self._evict()
+
+    def _evict(self):
+        total = self.total_bytes()
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if self._refs.get(key, 0) == 0:
+                total -= self._entries.pop(key).nbytes
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(dataset.nbytes for dataset in self._entries.values())
+
+    def stats(self):
+        """
+        Situação do registro: um item por conjunto (chave, bytes, referências),
+        do usado há mais tempo para o mais recente.
+        """
+        with self._lock:
+            return [
+                {"key": key, "nbytes": dataset.nbytes, "refs": self._refs.get(key, 0)}
+                for key, dataset in self._entries.items()
+            ]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
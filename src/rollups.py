@@ -0,0 +1,293 @@
+"""
+Agregados de NOx por (vehicle_id, dia) e (vehicle_id, semana), mantidos na
+carga dos arquivos.
+
+Cada linha guarda contagens, média, m2 (soma dos quadrados dos desvios),
+mín/máx, número de leituras acima de thresholds fixos e um sketch de
+quantis (os mesmos buckets do NOxAggregate). Como tudo isso pode ser
+juntado (média e m2 pela atualização de Chan et al.), um intervalo de
+datas é respondido juntando as linhas dos dias/semanas do intervalo, sem
+voltar às leituras.
+"""
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.aggregates import NOxAggregate, _bucket_ids, _merge_stats, _vehicle_moments
+
+ROLLUP_PERIODS = ("day", "week")
+
+# Thresholds com contagem exata nos agregados; para outros valores a fração
+# acima do threshold sai do sketch (aproximada).
+ROLLUP_THRESHOLDS = (25.0, 50.0, 75.0, 100.0, 150.0, 200.0)
+
+ROLLUP_RELATIVE_ACCURACY = 0.01
+
+_STAT_COLUMNS = ["n_rows", "count", "mean", "m2", "min", "max"]
+# agregação das colunas somáveis; mean e m2 são juntados por _merge_stats
+_STAT_AGG = {"n_rows": "sum", "count": "sum", "min": "min", "max": "max"}
+
+
+def period_start(timestamps, period):
+    """
+    Início do período de cada timestamp (datetime64[D]): o próprio dia ou a
+    segunda-feira da semana. Timestamps com fuso contam pelo dia local, o
+    mesmo dos filtros de data.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_localize(None)
+    days = timestamps.to_numpy().astype("datetime64[D]")
+    if period == "week":
+        # 1970-01-01 foi uma quinta-feira
+        days = days - ((days.astype("int64") + 3) % 7).astype("timedelta64[D]")
+    elif period != "day":
+        raise ValueError(f"period deve ser um de {ROLLUP_PERIODS}, não {period!r}.")
+    return days
+
+
+def _threshold_column(threshold):
+    return f"above_{threshold:g}"
+
+
+class NOxRollup:
+    """
+    Agregados de NOx por (vehicle_id, período), com period = "day" ou "week".
+
+    stats tem uma linha por (vehicle_id, period) com n_rows, count, mean,
+    m2, min, max e uma coluna above_<t> por threshold; sketch conta as
+    leituras por (vehicle_id, period, bucket). merge soma dois rollups (ex.:
+    o que já existia e o de um arquivo novo).
+    """
+
+    def __init__(self, period="day", thresholds=ROLLUP_THRESHOLDS, relative_accuracy=ROLLUP_RELATIVE_ACCURACY):
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"period deve ser um de {ROLLUP_PERIODS}, não {period!r}.")
+        self.period = period
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.relative_accuracy = float(relative_accuracy)
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+
+        columns = _STAT_COLUMNS + [_threshold_column(t) for t in self.thresholds]
+        self.stats = pd.DataFrame(
+            {c: pd.Series(dtype="float64" if c in ("mean", "m2", "min", "max") else "int64") for c in columns},
+            index=pd.MultiIndex.from_arrays(
+                [pd.Index([], dtype=object), pd.DatetimeIndex([])], names=["vehicle_id", "period"]
+            ),
+        )
+        self.sketch = pd.Series(
+            dtype="int64",
+            index=pd.MultiIndex.from_arrays(
+                [pd.Index([], dtype=object), pd.DatetimeIndex([]), pd.Index([], dtype="int64")],
+                names=["vehicle_id", "period", "bucket"],
+            ),
+        )
+
+    @classmethod
+    def from_frame(cls, df, period="day", thresholds=ROLLUP_THRESHOLDS, relative_accuracy=ROLLUP_RELATIVE_ACCURACY):
+        """
+        Rollup das linhas de um DataFrame (arquivo inteiro ou bloco).
+        """
+        rollup = cls(period, thresholds, relative_accuracy)
+        if df.empty:
+            return rollup
+
+        vehicle_codes, vehicles = pd.factorize(df["vehicle_id"], sort=True)
+        period_codes, periods = pd.factorize(period_start(df["timestamp"], period), sort=True)
+        keep = (vehicle_codes >= 0) & (period_codes >= 0)
+        nox = df["NOx"].to_numpy(dtype="float64")[keep]
+        keys = vehicle_codes[keep].astype("int64") * len(periods) + period_codes[keep]
+
+        # só as combinações (veículo, período) que aparecem
+        group, group_keys = pd.factorize(keys, sort=True)
+        n_groups = len(group_keys)
+        has_nox = ~np.isnan(nox)
+        count, mean, m2 = _vehicle_moments(group, nox, n_groups)
+        nox_grouped = pd.Series(nox).groupby(group)
+
+        columns = {
+            "n_rows": np.bincount(group, minlength=n_groups),
+            "count": count,
+            "mean": mean,
+            "m2": m2,
+            "min": nox_grouped.min().reindex(range(n_groups)).to_numpy(),
+            "max": nox_grouped.max().reindex(range(n_groups)).to_numpy(),
+        }
+        for t in rollup.thresholds:
+            columns[_threshold_column(t)] = np.bincount(group, weights=nox > t, minlength=n_groups).astype("int64")
+
+        vehicle_ids = np.asarray(vehicles, dtype=object).astype(str)[group_keys // len(periods)]
+        period_values = pd.DatetimeIndex(periods)[group_keys % len(periods)]
+        rollup.stats = pd.DataFrame(
+            columns,
+            index=pd.MultiIndex.from_arrays([vehicle_ids, period_values], names=["vehicle_id", "period"]),
+        )
+
+        buckets = _bucket_ids(nox[has_nox], np.log(rollup.gamma))
+        counts = pd.DataFrame({"group": group[has_nox], "bucket": buckets}).groupby(["group", "bucket"]).size()
+        sketch_groups = counts.index.get_level_values("group").to_numpy()
+        rollup.sketch = pd.Series(
+            counts.to_numpy(dtype="int64"),
+            index=pd.MultiIndex.from_arrays(
+                [
+                    vehicle_ids[sketch_groups],
+                    period_values[sketch_groups],
+                    counts.index.get_level_values("bucket").to_numpy(),
+                ],
+                names=["vehicle_id", "period", "bucket"],
+            ),
+        )
+        return rollup
+
+    def _check_compatible(self, other):
+        if (self.period, self.thresholds, self.relative_accuracy) != (
+            other.period, other.thresholds, other.relative_accuracy
+        ):
+            raise ValueError("Só é possível juntar rollups com o mesmo período, thresholds e relative_accuracy.")
+
+    def merge(self, *others):
+        """
+        Novo rollup com a soma deste e dos outros (em qualquer ordem).
+        """
+        for other in others:
+            self._check_compatible(other)
+        return _combine(self.period, (self,) + others)
+
+    def select(self, start_date=None, end_date=None, vehicle_ids=None):
+        """
+        Novo rollup só com os períodos que começam entre start_date e
+        end_date (inclusive) e com os veículos pedidos.
+        """
+        selected = NOxRollup(self.period, self.thresholds, self.relative_accuracy)
+        selected.stats = self.stats[_selection_mask(self.stats.index, start_date, end_date, vehicle_ids)]
+        selected.sketch = self.sketch[_selection_mask(self.sketch.index, start_date, end_date, vehicle_ids)]
+        return selected
+
+    def to_aggregate(self):
+        """
+        NOxAggregate por veículo somando todos os períodos do rollup: dá
+        basic_stats, vehicle_ranking, vehicle_stats e percentis.
+        """
+        agg = NOxAggregate(self.thresholds, self.relative_accuracy)
+        by_vehicle = self.stats.groupby(level="vehicle_id", sort=True)
+        agg.per_vehicle = _merge_stats(self.stats[_STAT_COLUMNS], "vehicle_id", _STAT_AGG)
+        agg.exceedances = by_vehicle[[_threshold_column(t) for t in self.thresholds]].sum()
+        agg.exceedances.columns = list(self.thresholds)
+        agg.sketch = self.sketch.groupby(level=["vehicle_id", "bucket"], sort=True).sum()
+        return agg
+
+    def write(self, path_prefix):
+        """
+        Grava o rollup em dois Parquet: <prefixo>-stats e <prefixo>-sketch.
+        """
+        metadata = {
+            b"period": self.period.encode(),
+            b"thresholds": ",".join(repr(t) for t in self.thresholds).encode(),
+            b"relative_accuracy": repr(self.relative_accuracy).encode(),
+        }
+        for name, frame in (("stats", self.stats.reset_index()), ("sketch", self.sketch.rename("count").reset_index())):
+            table = pa.Table.from_pandas(frame, preserve_index=False).replace_schema_metadata(metadata)
+            pq.write_table(table, f"{path_prefix}-{name}.parquet")
+
+    @classmethod
+    def read(cls, path_prefix):
+        stats_table = pq.read_table(f"{path_prefix}-stats.parquet")
+        metadata = stats_table.schema.metadata
+        thresholds = [float(t) for t in metadata[b"thresholds"].decode().split(",") if t]
+        rollup = cls(metadata[b"period"].decode(), thresholds, float(metadata[b"relative_accuracy"]))
+        rollup.stats = stats_table.to_pandas().set_index(["vehicle_id", "period"])
+        sketch = pq.read_table(f"{path_prefix}-sketch.parquet").to_pandas()
+        rollup.sketch = sketch.set_index(["vehicle_id", "period", "bucket"])["count"]
+        return rollup
+
+
+def _combine(period, parts):
+    # soma linha a linha; não confere o período (ver rollup_aggregate)
+    first = parts[0]
+    merged = NOxRollup(period, first.thresholds, first.relative_accuracy)
+    agg = dict(_STAT_AGG, **{_threshold_column(t): "sum" for t in first.thresholds})
+    merged.stats = _merge_stats(pd.concat([p.stats for p in parts]), ["vehicle_id", "period"], agg)
+    merged.sketch = (
+        pd.concat([p.sketch for p in parts])
+        .groupby(level=["vehicle_id", "period", "bucket"], sort=True)
+        .sum()
+    )
+    return merged
+
+
+def _selection_mask(index, start_date, end_date, vehicle_ids):
+    mask = np.ones(len(index), dtype=bool)
+    periods = index.get_level_values("period")
+    if start_date is not None:
+        mask &= periods >= pd.Timestamp(start_date)
+    if end_date is not None:
+        mask &= periods <= pd.Timestamp(end_date)
+    if vehicle_ids:
+        mask &= index.get_level_values("vehicle_id").isin([str(v) for v in vehicle_ids])
+    return mask
+
+
+def compute_rollups(df, thresholds=ROLLUP_THRESHOLDS, relative_accuracy=ROLLUP_RELATIVE_ACCURACY):
+    """
+    Rollups diário e semanal de um DataFrame: {"day": ..., "week": ...}.
+    """
+    return {p: NOxRollup.from_frame(df, p, thresholds, relative_accuracy) for p in ROLLUP_PERIODS}
+
+
+def rollup_aggregate(rollups, start_date=None, end_date=None, vehicle_ids=None):
+    """
+    NOxAggregate do intervalo [start_date, end_date] (inclusive) e dos
+    veículos pedidos, a partir dos rollups: semanas inteiras dentro do
+    intervalo vêm do semanal e as pontas, do diário.
+    """
+    daily, weekly = rollups["day"], rollups["week"]
+    if start_date is None or end_date is None:
+        periods = daily.stats.index.get_level_values("period")
+        if len(periods) == 0:
+            return daily.to_aggregate()
+        start_date = periods.min().date() if start_date is None else start_date
+        end_date = periods.max().date() if end_date is None else end_date
+
+    # primeira segunda-feira >= start_date e última semana que termina <= end_date
+    first_week = start_date + datetime.timedelta(days=(7 - start_date.weekday()) % 7)
+    last_week = end_date - datetime.timedelta(days=(end_date.weekday() + 1) % 7 + 6)
+    if first_week > last_week:
+        return daily.select(start_date, end_date, vehicle_ids).to_aggregate()
+
+    parts = [
+        weekly.select(first_week, last_week, vehicle_ids),
+        daily.select(start_date, first_week - datetime.timedelta(days=1), vehicle_ids),
+        daily.select(last_week + datetime.timedelta(days=7), end_date, vehicle_ids),
+    ]
+    # semanas e dias não se sobrepõem e usam os mesmos buckets: basta somar
+    return _combine("week", parts).to_aggregate()
+
+
+def write_source_rollups(directory, digest, rollups):
+    """
+    Grava os rollups de um arquivo de origem em directory/<period>/<hash>-*.
+    Um par de arquivos por origem e período: gravar de novo a mesma origem
+    só sobrescreve.
+    """
+    for period, rollup in rollups.items():
+        os.makedirs(os.path.join(directory, period), exist_ok=True)
+        rollup.write(os.path.join(directory, period, digest))
+
+
+def read_source_rollups(directory, digests):
+    """
+    Soma dos rollups diário e semanal das origens pedidas, ou None se
+    alguma delas não tem rollups gravados.
+    """
+    rollups = {}
+    for period in ROLLUP_PERIODS:
+        prefixes = [os.path.join(directory, period, digest) for digest in digests]
+        if not prefixes or not all(os.path.exists(f"{prefix}-stats.parquet") for prefix in prefixes):
+            return None
+        parts = [NOxRollup.read(prefix) for prefix in prefixes]
+        rollups[period] = parts[0].merge(*parts[1:])
+    return rollups
@@ -0,0 +1,356 @@
+"""
+Armazenamento da frota em Parquet particionado (estilo Hive) por
+vehicle_id e data:
+
+    raiz/vehicle_id=TRUCK_01/date=2025-01-01/part-<hash>-<bloco>-0.parquet
+
+Cada origem também grava seus agregados por dia e por semana (src/rollups.py)
+em raiz/_rollups/, usados para responder intervalos longos sem ler as
+leituras, e uma entrada no diário raiz/_journal/ com os arquivos gravados,
+para quem acompanha o armazenamento ler só o que chegou (src/watcher.py).
+
+Uso (a partir da raiz do projeto):
+    python -m src.store ingest raiz arquivo1.csv [arquivo2.csv ...]
+    python -m src.store query raiz [--start 2025-03-01] [--end 2025-03-07] [--vehicles T1,T2]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from src.cache import _hash_source
+from src.combine import DEDUP_KEY
+from src.data_loader import DASHBOARD_COLUMNS, iter_csv_chunks
+from src.filters import dataset_filter
+from src.fleet_index import sort_fleet_frame
+from src.rollups import ROLLUP_PERIODS, NOxRollup, compute_rollups, read_source_rollups, write_source_rollups
+
+STORE_PARTITIONING = ds.partitioning(
+    pa.schema([("vehicle_id", pa.string()), ("date", pa.date32())]),
+    flavor="hive",
+)
+
+# Arquivos de origem já gravados: um marcador vazio por hash de conteúdo.
+# Diretórios começando com "_" são ignorados pelo pyarrow.dataset.
+_INGESTED_DIR = "_ingested"
+_ROLLUPS_DIR = "_rollups"
+# Diário das origens gravadas, em ordem: quem já leu o armazenamento (ex.: um
+# dashboard aberto) pega só as linhas das entradas novas.
+_JOURNAL_DIR = "_journal"
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def _chunk_table(df):
+    # vehicle_id vira texto (tipo da partição) e a data sai do timestamp. Os
+    # metadados do pandas ficam de fora: descreveriam colunas que a
+    # partição tira dos arquivos.
+    # Inteiros vão como int64: o modo compacto escolhe o menor tipo por bloco
+    # (int8 num, int16 no outro) e os arquivos precisam do mesmo esquema.
+    df = df.sort_values(["vehicle_id", "timestamp"], kind="stable")
+    df["vehicle_id"] = df["vehicle_id"].astype(str)
+    for col in df.columns:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype("int64")
+    table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+    return table.append_column("date", pc.cast(table["timestamp"], pa.date32()))
+
+
+def _write_batch(root, digest, chunks, source=None):
+    # grava os blocos de uma origem (arquivo ou trecho novo de um arquivo):
+    # leituras, rollups, entrada do diário e, por último, o marcador
+    n_rows = 0
+    files = []
+    rollups = {period: NOxRollup(period) for period in ROLLUP_PERIODS}
+    for chunk_number, chunk in enumerate(chunks):
+        if chunk.empty:
+            continue
+        table = _chunk_table(chunk)
+        ds.write_dataset(
+            table,
+            root,
+            format="parquet",
+            partitioning=STORE_PARTITIONING,
+            basename_template=f"part-{digest[:16]}-{chunk_number}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_partitions=1_000_000,
+            # só o caminho: o WrittenFile (com os metadados do parquet) não
+            # sobrevive à escrita
+            file_visitor=lambda written: files.append(os.path.relpath(written.path, root)),
+        )
+        # libera os buffers do Arrow antes de ler o próximo bloco
+        del table
+        n_rows += len(chunk)
+        chunk_rollups = compute_rollups(chunk)
+        rollups = {period: rollups[period].merge(chunk_rollups[period]) for period in rollups}
+
+    write_source_rollups(os.path.join(root, _ROLLUPS_DIR), digest, rollups)
+    _append_journal(root, digest, source, n_rows, files)
+    marker = os.path.join(root, _INGESTED_DIR, digest)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, "w"):
+        pass
+    return n_rows
+
+
+def ingest_csv(path, root, chunksize=DEFAULT_CHUNKSIZE, compact=True):
+    """
+    Grava um CSV (já normalizado por load_csv, em blocos) no armazenamento.
+
+    Leituras que já estão no armazenamento (ex.: gravadas pelo watcher a
+    partir de outro arquivo) ou repetidas no próprio CSV ficam de fora, como
+    em drop_stored_rows. Se a origem já foi gravada até o fim, nada é feito.
+    Os rollups e a entrada do diário são gravados antes do marcador de
+    "gravada"; uma carga interrompida deixa arquivos sem marcador, que são
+    apagados antes de a origem ser gravada de novo (com qualquer chunksize).
+    Retorna o número de linhas gravadas (0 se a origem já estava lá).
+    """
+    digest, _ = _hash_source(path)
+    if os.path.exists(os.path.join(root, _INGESTED_DIR, digest)):
+        return 0
+    _remove_partial_files(root, digest)
+    chunks = iter_csv_chunks(path, chunksize=chunksize, compact=compact, columns=DASHBOARD_COLUMNS)
+    new_rows = (drop_stored_rows(root, chunk)[0] for chunk in chunks)
+    return _write_batch(root, digest, new_rows, source=os.fspath(path))
+
+
+def _remove_partial_files(root, digest):
+    # arquivos de uma carga da mesma origem que não chegou ao marcador
+    prefix = f"part-{digest[:16]}-"
+    for directory, subdirs, names in os.walk(root):
+        subdirs[:] = [d for d in subdirs if not d.startswith("_")]
+        for name in names:
+            if name.startswith(prefix):
+                os.remove(os.path.join(directory, name))
+
+
+def append_rows(root, df, digest, source=None):
+    """
+    Acrescenta ao armazenamento as linhas de um DataFrame (ex.: o trecho novo
+    de um arquivo que está crescendo) como uma origem de hash `digest`.
+    Não remove duplicatas: use drop_stored_rows antes.
+    Retorna o número de linhas gravadas (0 se `digest` já estava lá).
+    """
+    if os.path.exists(os.path.join(root, _INGESTED_DIR, digest)):
+        return 0
+    return _write_batch(root, digest, [df], source=source)
+
+
+def drop_stored_rows(root, df, key=DEDUP_KEY):
+    """
+    Tira de df as linhas repetidas (dentro de df ou já gravadas no
+    armazenamento) pela chave (vehicle_id, timestamp, order). Sem a coluna
+    order (no arquivo ou no armazenamento), a chave é (vehicle_id,
+    timestamp), como em combine_fleet_frames. Só lê as partições dos
+    veículos e datas de df.
+    Retorna (df sem as repetidas, número de linhas removidas).
+    """
+    if df.empty:
+        return df, 0
+    store = open_store(root) if os.path.isdir(root) else None
+    if store is not None and not store.files:
+        store = None
+    key = [name for name in key if name in df.columns]
+    if store is not None and "order" in key and "order" not in store.schema.names:
+        key.remove("order")
+    keys = _key_frame(df, key)
+    unique = ~keys.duplicated().to_numpy()
+
+    if store is not None:
+        days = df["timestamp"].dt.date
+        stored = store.to_table(
+            columns=key,
+            filter=dataset_filter(days.min(), days.max(), df["vehicle_id"].astype(str).unique().tolist()),
+        ).to_pandas()
+        if len(stored):
+            index = pd.MultiIndex.from_frame(_key_frame(stored, key))
+            unique &= ~pd.MultiIndex.from_frame(keys).isin(index)
+
+    return df[unique], int(len(df) - unique.sum())
+
+
+def _key_frame(df, key):
+    # mesmos tipos dos dois lados (categoria x texto, int16 x int64); inteiros
+    # ficam inteiros (Int64 aceita vazios) para a comparação ser exata
+    columns = {}
+    for name in key:
+        col = df[name]
+        if name == "vehicle_id":
+            col = col.astype(str).to_numpy()
+        elif name == "timestamp":
+            col = col.astype("datetime64[ns]").astype("int64").to_numpy()
+        else:
+            col = col.astype("Int64").array
+        columns[name] = col
+    return pd.DataFrame(columns)
+
+
+def _journal_path(directory, seq):
+    return os.path.join(directory, f"{seq:012d}.json")
+
+
+def _append_journal(root, digest, source, n_rows, files):
+    # uma entrada JSON por origem gravada, numerada em ordem. A mesma origem
+    # gravada de novo (depois de uma carga interrompida) troca a entrada que
+    # já existe, com o mesmo número e a lista de arquivos nova.
+    directory = os.path.join(root, _JOURNAL_DIR)
+    os.makedirs(directory, exist_ok=True)
+    entries = read_journal(root)
+    entry = {
+        "seq": None,
+        "digest": digest,
+        "source": source,
+        "n_rows": n_rows,
+        "files": sorted(files),
+        "written_at": time.time(),
+    }
+    tmp = os.path.join(directory, f"{digest[:16]}-{os.getpid()}.tmp")
+    previous = [e["seq"] for e in entries if e["digest"] == digest]
+    if previous:
+        entry["seq"] = previous[0]
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, _journal_path(directory, entry["seq"]))
+        return
+
+    # outro processo (watcher, ingest pela linha de comando) pode pegar o
+    # mesmo número ao mesmo tempo: o link falha se o nome já existe (como
+    # O_EXCL, mas sem expor uma entrada pela metade) e tenta o seguinte
+    seq = entries[-1]["seq"] + 1 if entries else 1
+    try:
+        while True:
+            entry["seq"] = seq
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            try:
+                os.link(tmp, _journal_path(directory, seq))
+                return
+            except FileExistsError:
+                seq += 1
+    finally:
+        os.remove(tmp)
+
+
+def read_journal(root, after_seq=0):
+    """
+    Entradas do diário (uma por origem gravada) com seq > after_seq, em
+    ordem: seq, digest, source, n_rows, files (relativos à raiz) e
+    written_at (epoch em segundos).
+    """
+    directory = os.path.join(root, _JOURNAL_DIR)
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json") and int(name[:-len(".json")]) > after_seq:
+            with open(os.path.join(directory, name)) as f:
+                entries.append(json.load(f))
+    return entries
+
+
+def read_journal_rows(root, entries, columns=None):
+    """
+    Só as linhas gravadas pelas entradas do diário pedidas, como (df,
+    FleetIndex), no mesmo formato de query_store.
+    """
+    if columns is None:
+        columns = DASHBOARD_COLUMNS
+    paths = [os.path.join(root, f) for entry in entries for f in entry["files"]]
+    if not paths:
+        return None, None
+    dataset = ds.dataset(paths, format="parquet", partitioning=STORE_PARTITIONING, partition_base_dir=os.fspath(root))
+    df = dataset.to_table(columns=list(columns)).to_pandas()
+    df["vehicle_id"] = df["vehicle_id"].astype("category")
+    return sort_fleet_frame(df)
+
+
+def open_store(root):
+    """
+    pyarrow.dataset do armazenamento (só lê os metadados dos diretórios).
+    """
+    return ds.dataset(root, format="parquet", partitioning=STORE_PARTITIONING)
+
+
+def load_store_rollups(root):
+    """
+    Rollups diário e semanal de todo o armazenamento ({"day": ..., "week":
+    ...}), ou None se alguma origem gravada não tem rollups (ex.: gravada
+    antes de existirem) — aí as consultas precisam varrer as leituras.
+    """
+    ingested = os.path.join(root, _INGESTED_DIR)
+    if not os.path.isdir(ingested):
+        return None
+    return read_source_rollups(os.path.join(root, _ROLLUPS_DIR), sorted(os.listdir(ingested)))
+
+
+def store_files(root, start_date=None, end_date=None, vehicle_ids=None):
+    """
+    Arquivos que uma consulta com esses filtros precisa ler.
+    """
+    expression = dataset_filter(start_date, end_date, vehicle_ids)
+    return [fragment.path for fragment in open_store(root).get_fragments(filter=expression)]
+
+
+def query_store(root, start_date=None, end_date=None, vehicle_ids=None, columns=None):
+    """
+    Lê do armazenamento só o recorte pedido (datas inclusive, veículos).
+
+    Os filtros viram poda de partições: arquivos de outros veículos/datas não
+    são abertos. Retorna (df, FleetIndex), como apply_filters, com vehicle_id
+    categórico e as linhas ordenadas por (vehicle_id, timestamp).
+    """
+    if columns is None:
+        columns = DASHBOARD_COLUMNS
+    table = open_store(root).to_table(
+        columns=list(columns),
+        filter=dataset_filter(start_date, end_date, vehicle_ids),
+    )
+    df = table.to_pandas()
+    if "vehicle_id" in df.columns:
+        df["vehicle_id"] = df["vehicle_id"].astype("category")
+    return sort_fleet_frame(df)
+
+
+def _parse_date(text):
+    return datetime.date.fromisoformat(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.store", description="Armazenamento Parquet da frota.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="grava CSVs no armazenamento")
+    ingest.add_argument("root")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+
+    query = commands.add_parser("query", help="resume um recorte do armazenamento")
+    query.add_argument("root")
+    query.add_argument("--start", type=_parse_date)
+    query.add_argument("--end", type=_parse_date)
+    query.add_argument("--vehicles", help="lista separada por vírgulas")
+
+    args = parser.parse_args(argv)
+    if args.command == "ingest":
+        for path in args.paths:
+            n_rows = ingest_csv(path, args.root, chunksize=args.chunksize)
+            status = f"{n_rows:,} linhas gravadas" if n_rows else "já estava no armazenamento"
+            print(f"{path}: {status}")
+        return 0
+
+    vehicle_ids = args.vehicles.split(",") if args.vehicles else None
+    files = store_files(args.root, args.start, args.end, vehicle_ids)
+    df, index = query_store(args.root, args.start, args.end, vehicle_ids)
+    print(f"{len(files)} arquivos lidos, {len(df):,} linhas, {len(index.vehicle_ids)} veículos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Trajetos GPS por veículo para o mapa temporal.
+
+O trajeto de um veículo é montado uma vez por estado de filtro: arrays NumPy
+de timestamp, latitude, longitude e NOx (e dos campos da dica do mapa), só
+com as leituras que têm timestamp e coordenadas, em ordem de tempo. Cada
+passo do mapa (⏪/⏩, slider) vira duas buscas binárias e fatias (views)
+desses arrays, sem copiar o DataFrame do veículo.
+"""
+import numpy as np
+import pandas as pd
+
+from src.fleet_index import _timestamp_values
+
+TRACK_COLUMNS = ("latitude", "longitude", "NOx")
+# Campos extras mostrados na dica do mapa, quando existem no arquivo.
+TRACK_TOOLTIP_COLUMNS = ("order", "NOx_dp")
+
+
+def _utc_bound(value):
+    # limite da janela no mesmo referencial dos timestamps: UTC, sem fuso
+    value = pd.Timestamp(value)
+    if value.tz is not None:
+        value = value.tz_convert("UTC").tz_localize(None)
+    return np.datetime64(value)
+
+
+class VehicleTrack:
+    """
+    Leituras com GPS de um veículo, ordenadas por timestamp.
+
+    timestamps é datetime64 sem fuso (timestamps com fuso ficam em UTC, como
+    no FleetIndex); columns tem um array por coluna (latitude, longitude,
+    NOx e os campos da dica presentes), alinhados com timestamps.
+    """
+
+    def __init__(self, vehicle_id, timestamps, columns):
+        self.vehicle_id = vehicle_id
+        self.timestamps = timestamps
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, df, vehicle_id, start=0, stop=None):
+        """
+        Trajeto das linhas [start, stop) de df (a faixa do veículo no
+        FleetIndex). Linhas sem timestamp, latitude ou longitude ficam de
+        fora.
+        """
+        rows = df.iloc[start:stop]
+        timestamps = _timestamp_values(pd.to_datetime(rows["timestamp"], errors="coerce"))
+        latitude = rows["latitude"].to_numpy(dtype="float64")
+        longitude = rows["longitude"].to_numpy(dtype="float64")
+        valid = ~np.isnat(timestamps) & ~np.isnan(latitude) & ~np.isnan(longitude)
+
+        timestamps = timestamps[valid]
+        columns = {"latitude": latitude[valid], "longitude": longitude[valid]}
+        for name in ("NOx",) + TRACK_TOOLTIP_COLUMNS:
+            if name in rows.columns:
+                columns[name] = rows[name].to_numpy()[valid]
+
+        # a faixa do FleetIndex já vem em ordem de tempo; outras origens não
+        if len(timestamps) > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind="stable")
+            timestamps = timestamps[order]
+            columns = {name: values[order] for name, values in columns.items()}
+        return cls(vehicle_id, timestamps, columns)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def start(self):
+        return pd.Timestamp(self.timestamps[0]) if len(self) else None
+
+    @property
+    def end(self):
+        return pd.Timestamp(self.timestamps[-1]) if len(self) else None
+
+    def window(self, t_start, t_end, max_points=None):
+        """
+        Faixa [lo, hi) das leituras com t_start <= timestamp <= t_end. Com
+        max_points, só as max_points mais recentes da janela. Limites com
+        fuso são convertidos para UTC.
+        """
+        lo = int(np.searchsorted(self.timestamps, _utc_bound(t_start), side="left"))
+        hi = int(np.searchsorted(self.timestamps, _utc_bound(t_end), side="right"))
+        if max_points is not None:
+            lo = max(lo, hi - max_points)
+        return lo, hi
+
+    def slice(self, lo, hi):
+        """
+        Leituras [lo, hi) como dicionário de arrays (views, sem cópia),
+        incluindo "timestamp".
+        """
+        data = {"timestamp": self.timestamps[lo:hi]}
+        data.update((name, values[lo:hi]) for name, values in self.columns.items())
+        return data
@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+
+
+def filter_fingerprint(upload_key, start_date, end_date, vehicle_ids):
+    """
+    Chave do estado de filtro: arquivos carregados, intervalo de datas e o
+    conjunto de veículos (a ordem da seleção não importa).
+    """
+    return (upload_key, start_date, end_date, tuple(sorted(str(v) for v in vehicle_ids)))
+
+
+class ViewCache:
+    """
+    Resultados das visualizações do dashboard (figuras, tabelas), guardados
+    por (visualização, estado de filtro, parâmetros da visualização).
+
+    Cada visualização só é calculada quando é aberta e, enquanto a chave
+    não muda, os reruns do Streamlit reaproveitam o resultado; voltar a uma
+    combinação de filtros já vista também não recalcula. Guarda no máximo
+    max_entries resultados (descarta o usado há mais tempo).
+
+    Não usamos st.cache_data porque ele teria de fazer o hash do DataFrame
+    filtrado a cada rerun; aqui a chave já vem pronta do estado de filtro.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, view, fingerprint, compute, params=()):
+        """
+        Resultado de compute() para essa chave, calculando só se ainda não
+        estiver guardado. Devolve (resultado, segundos gastos no cálculo,
+        True se veio do cache).
+        """
+        key = (view, fingerprint, params)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result, elapsed = self._entries[key]
+            return result, elapsed, True
+
+        self.misses += 1
+        t0 = time.perf_counter()
+        result = compute()
+        elapsed = time.perf_counter() - t0
+
+        self._entries[key] = (result, elapsed)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result, elapsed, False
+
+    def clear(self):
+        self._entries.clear()
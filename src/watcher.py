@@ -0,0 +1,276 @@
+"""
+Ingestão contínua: acompanha um diretório onde chegam CSVs de telemetria e
+grava no armazenamento (src/store.py) só as linhas novas de cada arquivo.
+
+Arquivos novos são lidos inteiros; arquivos que crescem (linhas acrescentadas
+no fim) são lidos a partir do ponto em que paramos, até a última linha
+completa. As linhas passam por load_csv, perdem as repetidas pela chave
+(vehicle_id, timestamp, order) e entram no armazenamento com seus rollups e
+uma entrada no diário, que os dashboards abertos acompanham.
+
+Uso (a partir da raiz do projeto):
+    python -m src.watcher diretorio_dos_csvs raiz_do_armazenamento
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from src.data_loader import DASHBOARD_COLUMNS, load_csv
+from src.store import append_rows, drop_stored_rows
+
+# Posição já lida de cada arquivo, guardada no armazenamento para continuar
+# de onde parou depois de reiniciar o watcher, com o inode e o hash do começo
+# do arquivo para reconhecer um arquivo reescrito no lugar do anterior.
+_OFFSETS_FILE = os.path.join("_watch", "offsets.json")
+_HEAD_BYTES = 4096
+
+
+def _head_digest(f, offset):
+    # hash dos primeiros bytes (até _HEAD_BYTES, sem passar do já lido)
+    f.seek(0)
+    return hashlib.sha256(f.read(min(offset, _HEAD_BYTES))).hexdigest()
+
+
+class IngestReport:
+    """
+    Resultado da leitura de um arquivo (ou do trecho novo dele): linhas
+    lidas, gravadas e descartadas por já existirem, tempo de processamento
+    e latência (do último acréscimo no arquivo até as linhas estarem no
+    armazenamento), em segundos, e o diagnóstico dos timestamps de
+    load_csv.
+    """
+
+    def __init__(self, path, n_read=0, n_new=0, n_duplicates=0, elapsed=0.0, latency=0.0, error=None,
+                 timestamp_diagnostics=None):
+        self.path = path
+        self.n_read = n_read
+        self.n_new = n_new
+        self.n_duplicates = n_duplicates
+        self.elapsed = elapsed
+        self.latency = latency
+        self.error = error
+        self.timestamp_diagnostics = timestamp_diagnostics
+
+    def __repr__(self):
+        if self.error:
+            return f"{self.path}: erro: {self.error}"
+        text = (
+            f"{self.path}: {self.n_new:,} linhas novas, {self.n_duplicates:,} repetidas, "
+            f"processado em {self.elapsed * 1e3:.0f} ms, latência {self.latency:.2f} s"
+        )
+        if self.timestamp_diagnostics and self.timestamp_diagnostics["collapsed"]:
+            text += " (atenção: timestamps colapsados, provável notação científica)"
+        return text
+
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+
+class DirectoryWatcher:
+    """
+    Acompanha `directory` e grava as linhas novas dos CSVs em `root`.
+
+    Eventos do watchdog só marcam o arquivo como pendente; uma thread grava
+    o arquivo quando ele fica `settle_seconds` sem mudar (quem escreve em
+    várias etapas não gera várias cargas). on_report, se dado, recebe um
+    IngestReport por carga. process() e scan() também podem ser chamados
+    diretamente, sem start().
+    """
+
+    def __init__(self, directory, root, settle_seconds=1.0, on_report=None):
+        self.directory = os.fspath(directory)
+        self.root = os.fspath(root)
+        self.settle_seconds = settle_seconds
+        self.on_report = on_report
+        self._offsets = self._load_offsets()
+        self._pending = {}  # caminho -> instante do último evento
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._observer = None
+        self._worker = None
+
+    def _load_offsets(self):
+        path = os.path.join(self.root, _OFFSETS_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_offsets(self):
+        path = os.path.join(self.root, _OFFSETS_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._offsets, f)
+        os.replace(path + ".tmp", path)
+
+    def notify(self, path):
+        if path.endswith(".csv"):
+            self._events.put((os.path.abspath(path), time.monotonic()))
+
+    def process(self, path):
+        """
+        Grava as linhas novas de um CSV. Retorna um IngestReport, ou None se
+        não havia nada novo (nenhuma linha completa depois da última leitura).
+        """
+        path = os.path.abspath(path)
+        t0 = time.perf_counter()
+        try:
+            stat = os.stat(path)
+            state = self._offsets.get(path)
+            if not isinstance(state, dict):
+                # sem posição (ou no formato antigo, só o número): lê do começo
+                state = {}
+            offset = state.get("offset", 0)
+            with open(path, "rb") as f:
+                if offset and (
+                    stat.st_size < offset
+                    or state.get("inode") != stat.st_ino
+                    or state.get("head") != _head_digest(f, offset)
+                ):
+                    # arquivo truncado/substituído (menor, outro inode ou
+                    # começo diferente): relê tudo (as repetidas caem no dedup)
+                    offset = 0
+                f.seek(0)
+                header = f.readline()
+                f.seek(max(offset, len(header)))
+                data = f.read(stat.st_size - max(offset, len(header)))
+                # só até a última linha completa; o resto fica para a próxima
+                data = data[: data.rfind(b"\n") + 1]
+                end = max(offset, len(header)) + len(data)
+                head = _head_digest(f, end)
+            if not data:
+                return None
+
+            df = load_csv(io.BytesIO(header + data), compact=True, columns=DASHBOARD_COLUMNS)
+            n_read = len(df)
+            diagnostics = df.attrs.get("timestamp_diagnostics")
+            df, n_duplicates = drop_stored_rows(self.root, df)
+            digest = hashlib.sha256(header + data).hexdigest()
+            n_new = append_rows(self.root, df, digest, source=path) if len(df) else 0
+
+            self._offsets[path] = {"offset": end, "inode": stat.st_ino, "head": head}
+            self._save_offsets()
+            report = IngestReport(
+                path,
+                n_read=n_read,
+                n_new=n_new,
+                n_duplicates=n_duplicates,
+                elapsed=time.perf_counter() - t0,
+                latency=max(0.0, time.time() - stat.st_mtime),
+                timestamp_diagnostics=diagnostics,
+            )
+        except Exception as exc:
+            report = IngestReport(path, elapsed=time.perf_counter() - t0, error=str(exc))
+
+        if self.on_report is not None:
+            self.on_report(report)
+        return report
+
+    def scan(self):
+        """
+        Processa todos os CSVs que já estão no diretório (ex.: ao iniciar).
+        """
+        reports = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".csv"):
+                report = self.process(os.path.join(self.directory, name))
+                if report is not None:
+                    reports.append(report)
+        return reports
+
+    def _run(self):
+        while not self._stop.is_set():
+            # esvazia a fila a cada volta: com escritas contínuas (mesmo em
+            # outro arquivo) os arquivos já estáveis não ficam esperando
+            try:
+                path, seen = self._events.get(timeout=0.1)
+                self._pending[path] = seen
+                while True:
+                    path, seen = self._events.get_nowait()
+                    self._pending[path] = seen
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            for path, seen in list(self._pending.items()):
+                if now - seen >= self.settle_seconds:
+                    del self._pending[path]
+                    if os.path.exists(path):
+                        self.process(path)
+
+    def start(self):
+        """
+        Processa o que já está no diretório e passa a acompanhar as mudanças
+        (em threads; stop() encerra).
+        """
+        self.scan()
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="fleet-nox-watcher", daemon=True)
+        self._worker.start()
+        self._observer = Observer()
+        self._observer.schedule(_Handler(self), self.directory, recursive=False)
+        self._observer.start()
+        return self
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m src.watcher",
+        description="Grava no armazenamento as linhas novas dos CSVs de um diretório.",
+    )
+    parser.add_argument("directory")
+    parser.add_argument("root")
+    parser.add_argument("--settle", type=float, default=1.0, help="segundos sem mudança antes de ler um arquivo")
+    args = parser.parse_args(argv)
+
+    watcher = DirectoryWatcher(args.directory, args.root, settle_seconds=args.settle, on_report=print)
+    with watcher:
+        print(f"Acompanhando {args.directory} (Ctrl+C para sair)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from src.aggregates import NOxAggregate, aggregate_frames, histogram_frames, nox_bin_edges
+from src.metrics import compute_basic_stats, compute_vehicle_ranking
+
+
+def make_fleet(n_rows=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "vehicle_id": rng.choice(["A", "B", "C", "D", "E"], n_rows),
+        "NOx": rng.gamma(2.0, 20.0, n_rows).round(1),
+    })
+    df.loc[::50, "NOx"] = 0.0
+    df.loc[::97, "NOx"] = np.nan
+    return df
+
+
+def split_rows(df, n_parts):
+    return [df.iloc[rows] for rows in np.array_split(np.arange(len(df)), n_parts)]
+
+
+def test_merged_chunks_match_whole_frame_in_any_order():
+    df = make_fleet()
+    chunks = split_rows(df, 7)
+    rng = np.random.default_rng(1)
+
+    whole = NOxAggregate.from_frame(df, thresholds=[50])
+    merged = aggregate_frames([chunks[i] for i in rng.permutation(len(chunks))], thresholds=[50])
+
+    pd.testing.assert_frame_equal(merged.per_vehicle, whole.per_vehicle, check_dtype=False)
+    pd.testing.assert_frame_equal(merged.exceedances, whole.exceedances, check_dtype=False)
+    pd.testing.assert_series_equal(merged.sketch, whole.sketch, check_dtype=False)
+
+
+def test_aggregate_metrics_match_exact_within_error_bound():
+    df = make_fleet()
+    agg = aggregate_frames(split_rows(df, 5), thresholds=[50], relative_accuracy=0.01)
+
+    exact = compute_basic_stats(df)
+    approx = agg.basic_stats()
+    assert approx["n_records"] == exact["n_records"]
+    assert approx["n_vehicles"] == exact["n_vehicles"]
+    assert np.isclose(approx["global_mean_nox"], exact["global_mean_nox"])
+    assert abs(approx["global_median_nox"] - exact["global_median_nox"]) <= 0.01 * exact["global_median_nox"] + 0.1
+
+    expected = compute_vehicle_ranking(df, threshold=50)
+    ranking = agg.vehicle_ranking(threshold=50)
+    assert list(ranking["vehicle_id"]) == list(expected["vehicle_id"])
+    assert np.allclose(ranking["fraction_time_above_threshold"], expected["fraction_time_above_threshold"])
+    assert np.allclose(ranking["mean_nox"], expected["mean_nox"])
+    assert np.allclose(ranking["median_nox"], expected["median_nox"], rtol=0.011, atol=0.1)
+
+    p95 = df.dropna().groupby("vehicle_id")["NOx"].quantile(0.95)
+    assert np.allclose(agg.vehicle_quantile(0.95), p95, rtol=0.011, atol=0.1)
+
+
+def test_vehicle_std_keeps_precision_with_large_mean():
+    # desvio pequeno perto da média: soma dos quadrados - soma²/n perderia
+    # todos os dígitos
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({
+        "vehicle_id": rng.choice(["A", "B"], 10_000),
+        "NOx": 1e9 + rng.normal(0, 1.0, 10_000),
+    })
+    agg = aggregate_frames(split_rows(df, 9))
+
+    expected = df.groupby("vehicle_id")["NOx"].agg(["mean", "std"])
+    stats = agg.vehicle_stats()
+    np.testing.assert_allclose(stats["mean_nox"], expected["mean"], rtol=1e-15)
+    np.testing.assert_allclose(stats["std_nox"], expected["std"], rtol=1e-6)
+
+
+def test_histogram_merged_from_chunks_matches_numpy():
+    df = make_fleet(3_000)
+    edges = nox_bin_edges(df["NOx"].min(), df["NOx"].max(), bins=12)
+
+    merged = histogram_frames(split_rows(df, 4), edges)
+    expected, _ = np.histogram(df["NOx"].dropna(), bins=edges)
+
+    np.testing.assert_array_equal(merged.total(), expected)
+    for vid, row in merged.counts.iterrows():
+        vehicle_nox = df.loc[df["vehicle_id"] == vid, "NOx"].dropna()
+        np.testing.assert_array_equal(row.to_numpy(), np.histogram(vehicle_nox, bins=edges)[0])
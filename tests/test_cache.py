@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+
+import src.cache as cache
+from src.cache import invalidate_cache, load_csv_cached
+from src.data_loader import load_csv
+
+
+SAMPLE_PATH = Path(__file__).resolve().parents[1] / "sample_data" / "demo_fleet.csv"
+
+
+def test_load_csv_cached_reuses_parquet(tmp_path, monkeypatch):
+    calls = []
+
+    def counting_load_csv(source, **kwargs):
+        calls.append(source)
+        return load_csv(source, **kwargs)
+
+    monkeypatch.setattr(cache, "load_csv", counting_load_csv)
+
+    first = load_csv_cached(SAMPLE_PATH, cache_dir=tmp_path)
+    with open(SAMPLE_PATH, "rb") as f:
+        # mesmo conteúdo vindo de um file-like também acerta o cache
+        second = load_csv_cached(f, cache_dir=tmp_path)
+
+    assert len(calls) == 1, "O CSV deveria ter sido processado uma única vez."
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(second, load_csv(SAMPLE_PATH))
+
+
+def test_load_csv_cached_evicts_least_recently_used(tmp_path):
+    cache_dir = tmp_path / "cache"
+    old_csv = tmp_path / "old.csv"
+    new_csv = tmp_path / "new.csv"
+    content = SAMPLE_PATH.read_text()
+    old_csv.write_text(content)
+    # conteúdo diferente -> outra entrada no cache
+    new_csv.write_text(content.replace("TRUCK_01", "TRUCK_99"))
+
+    load_csv_cached(old_csv, cache_dir=cache_dir)
+    (old_entry,) = os.listdir(cache_dir)
+    os.utime(cache_dir / old_entry, (0, 0))
+
+    # limite de 1 byte: só a entrada recém escrita sobrevive
+    load_csv_cached(new_csv, cache_dir=cache_dir, max_bytes=1)
+
+    remaining = os.listdir(cache_dir)
+    assert len(remaining) == 1
+    assert remaining[0] != old_entry
+
+
+def test_invalidate_cache_drops_old_schema_versions(tmp_path, monkeypatch):
+    load_csv_cached(SAMPLE_PATH, cache_dir=tmp_path)
+    assert invalidate_cache(tmp_path) == 0
+
+    monkeypatch.setattr(cache, "LOADER_SCHEMA_VERSION", cache.LOADER_SCHEMA_VERSION + 1)
+    assert invalidate_cache(tmp_path) == 1
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from src.combine import combine_fleet_frames
+from src.fleet_index import FleetIndex
+from src.ingest import load_csv_files
+
+
+def make_frame(vehicles, n, seed, start="2025-01-01"):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(start, periods=n, freq="min")
+    return pd.DataFrame({
+        "vehicle_id": rng.choice(vehicles, n),
+        "timestamp": ts[rng.integers(0, n, n)],
+        "order": rng.integers(0, 3, n),
+        "NOx": rng.gamma(2.0, 20.0, n),
+    })
+
+
+def reference(frames):
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates(["vehicle_id", "timestamp", "order"])
+    return df.sort_values(["vehicle_id", "timestamp", "order"], kind="stable").reset_index(drop=True)
+
+
+def test_combine_matches_concat_drop_duplicates():
+    first = make_frame(["T2", "T1"], 500, 0)
+    # segundo arquivo repete parte do primeiro e traz um veículo novo
+    second = pd.concat([first.sample(200, random_state=1), make_frame(["T3", "T1"], 300, 2)], ignore_index=True)
+    third = reference([make_frame(["T1"], 100, 3)])  # já ordenado
+
+    df, report = combine_fleet_frames([first, second, third])
+
+    expected = reference([first, second, third])
+    pd.testing.assert_frame_equal(df, expected)
+    n_input = len(first) + len(second) + len(third)
+    assert report["n_input_rows"] == n_input
+    assert report["n_duplicates"] == n_input - len(expected)
+    assert report["presorted"] == [False, False, True]
+    FleetIndex.from_sorted_frame(df)  # pronto para o índice, sem reordenar
+
+
+def test_combine_keeps_categorical_vehicle_ids():
+    first = make_frame(["B", "A"], 50, 4)
+    second = make_frame(["C", "A"], 50, 5)
+    first["vehicle_id"] = first["vehicle_id"].astype("category")
+    second["vehicle_id"] = second["vehicle_id"].astype("category")
+
+    df, _ = combine_fleet_frames([first, second])
+
+    assert list(df["vehicle_id"].cat.categories) == ["A", "B", "C"]
+    expected = reference([first.astype({"vehicle_id": str}), second.astype({"vehicle_id": str})])
+    assert list(df["vehicle_id"].astype(str)) == list(expected["vehicle_id"])
+    np.testing.assert_array_equal(df["NOx"], expected["NOx"])
+
+
+def test_load_csv_files_drops_rows_repeated_across_files(tmp_path):
+    rows = "vehicle_name,timestamp,order,NOx,O2\n"
+    a = tmp_path / "a.csv"
+    b = tmp_path / "b.csv"
+    a.write_text(rows + "T1,1735689600000,1,10,20\nT1,1735689660000,2,11,20\n")
+    b.write_text(rows + "T1,1735689660000,2,11,20\nT2,1735689600000,1,30,20\n")
+
+    df, errors = load_csv_files([a, b], max_workers=1, compact=True, deduplicate=True)
+
+    assert errors == []
+    assert list(df["vehicle_id"].astype(str)) == ["T1", "T1", "T2"]
+    assert df.attrs["combine"]["n_duplicates"] == 1
@@ -1,9 +1,18 @@
 import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-from src.data_loader import load_csv
+from src.data_loader import (
+    DASHBOARD_COLUMNS,
+    _parse_position_to_lat_lon,
+    concat_fleet_frames,
+    iter_csv_chunks,
+    load_csv,
+    parse_position_column,
+    parse_timestamp_column,
+)
 
 
 def test_load_csv_with_real_sample():
@@ -27,3 +36,137 @@ def test_load_csv_with_real_sample():
 
     # vehicle_id não deve estar todo vazio
     assert df["vehicle_id"].notna().any(), "Todas as entradas de vehicle_id são NaN, algo está errado."
+
+
+def test_parse_position_column_matches_row_parser():
+    positions = pd.Series([
+        "POINT(-43.2786382 -22.8701468)",
+        "POINT(-43.2785190 -22.8700807)",
+        "POINT ( -43.1 -22.9 )",
+        "POINT(1e1 2)",
+        "POINT(1)",
+        "POINT(a b)",
+        "POINT(1-2 3)",
+        "LINESTRING(1 2, 3 4)",
+        "",
+        None,
+        float("nan"),
+    ])
+
+    lats, lons = parse_position_column(positions)
+
+    for pos, lat, lon in zip(positions, lats, lons):
+        exp_lat, exp_lon = _parse_position_to_lat_lon(pos)
+        if exp_lat is None:
+            assert np.isnan(lat) and np.isnan(lon), f"Esperava NaN para {pos!r}"
+        else:
+            assert (lat, lon) == (exp_lat, exp_lon), f"Diferença em {pos!r}"
+
+
+def test_parse_position_column_field_variants():
+    positions = pd.Series([
+        "point(-43.2786 -22.8701)",
+        "  POINT(  -43.2786    -22.8701 )  ",
+        "SRID=4326;POINT(-43.2786 -22.8701)",
+    ])
+
+    lats, lons = parse_position_column(positions)
+
+    assert np.allclose(lats, -22.8701)
+    assert np.allclose(lons, -43.2786)
+
+
+def test_load_csv_compact_mode():
+    base_dir = Path(__file__).resolve().parents[1]
+    sample_path = base_dir / "sample_data" / "demo_fleet.csv"
+
+    full = load_csv(sample_path)
+    compact = load_csv(sample_path, compact=True, columns=DASHBOARD_COLUMNS)
+
+    assert list(compact.columns) == [c for c in DASHBOARD_COLUMNS if c in full.columns]
+    assert "position" not in compact.columns
+    assert isinstance(compact["vehicle_id"].dtype, pd.CategoricalDtype)
+    assert compact["latitude"].dtype == np.float32
+    assert compact["order"].dtype.itemsize < full["order"].dtype.itemsize
+
+    # NOx fica exato (float64); coordenadas, a menos da precisão de float32
+    assert compact["NOx"].dtype == np.float64
+    assert np.array_equal(compact["NOx"], full["NOx"].astype("float64"))
+    assert np.allclose(compact["longitude"], full["longitude"])
+    assert compact.memory_usage(deep=True).sum() < full.memory_usage(deep=True).sum()
+
+
+def test_iter_csv_chunks_matches_load_csv():
+    base_dir = Path(__file__).resolve().parents[1]
+    sample_path = base_dir / "sample_data" / "demo_fleet.csv"
+
+    chunks = list(iter_csv_chunks(sample_path, chunksize=4))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), load_csv(sample_path))
+
+
+
+def test_compact_chunks_concatenate_to_the_whole_file_types():
+    base_dir = Path(__file__).resolve().parents[1]
+    sample_path = base_dir / "sample_data" / "demo_fleet.csv"
+
+    chunks = list(iter_csv_chunks(sample_path, chunksize=4, compact=True, columns=DASHBOARD_COLUMNS))
+    # blocos com veículos diferentes têm categorias diferentes
+    assert len({tuple(c["vehicle_id"].cat.categories) for c in chunks}) > 1
+
+    pd.testing.assert_frame_equal(
+        concat_fleet_frames(chunks),
+        load_csv(sample_path, compact=True, columns=DASHBOARD_COLUMNS),
+    )
+
+def test_parse_timestamp_column_detects_epoch_units():
+    expected = pd.Timestamp("2025-01-01 12:34:56.789012345")
+    ns = expected.value
+    cases = {
+        "epoch_s": ns // 10**9,
+        "epoch_ms": ns // 10**6,
+        "epoch_us": ns // 10**3,
+        "epoch_ns": ns,
+    }
+    for fmt, value in cases.items():
+        parsed, diagnostics = parse_timestamp_column(pd.Series([value, value + 1]))
+        assert diagnostics["format"] == fmt
+        # inteiros sem passar por float: precisão total da unidade
+        assert parsed.iloc[0] == expected.floor({"epoch_s": "s", "epoch_ms": "ms", "epoch_us": "us"}.get(fmt, "ns"))
+
+    # células vazias deixam a coluna float; valores inteiros continuam exatos
+    parsed, _ = parse_timestamp_column(pd.Series([1735689600123.0, np.nan]))
+    assert parsed.iloc[0] == pd.Timestamp("2025-01-01 00:00:00.123") and pd.isna(parsed.iloc[1])
+
+
+def test_parse_timestamp_column_detects_text_formats():
+    parsed, diagnostics = parse_timestamp_column(pd.Series(["25/12/2024 08:00:00", "01/02/2025 09:30:15"]))
+    assert diagnostics["format"] == "%d/%m/%Y %H:%M:%S"
+    assert list(parsed) == [pd.Timestamp("2024-12-25 08:00:00"), pd.Timestamp("2025-02-01 09:30:15")]
+
+    _, diagnostics = parse_timestamp_column(pd.Series(["2025-01-01 00:00:00", "2025-01-01T00:00:01.5"]))
+    assert diagnostics["format"] == "ISO8601"
+
+
+def test_parse_timestamp_column_keeps_utc_suffix():
+    # "Z" é UTC: mesmo resultado (com fuso) que o offset +00:00 e que o pandas sem formato
+    values = ["2025-01-01T00:00:00Z", "2025-01-01T03:00:00Z"]
+    parsed, diagnostics = parse_timestamp_column(pd.Series(values))
+    offset, _ = parse_timestamp_column(pd.Series([v.replace("Z", "+00:00") for v in values]))
+    assert diagnostics["format"] == "ISO8601"
+    assert str(parsed.dtype) == "datetime64[ns, UTC]"
+    pd.testing.assert_series_equal(parsed, offset)
+    pd.testing.assert_series_equal(parsed, pd.to_datetime(pd.Series(values)))
+
+def test_load_csv_flags_collapsed_scientific_timestamps():
+    base_dir = Path(__file__).resolve().parents[1]
+
+    collapsed = load_csv(base_dir / "sample_data" / "demo_fleet2.csv").attrs["timestamp_diagnostics"]
+    assert collapsed["collapsed"]
+    assert collapsed["resolution_seconds"] >= 3600
+
+    fine = load_csv(base_dir / "sample_data" / "demo_fleet.csv").attrs["timestamp_diagnostics"]
+    assert fine["format"] == "epoch_ms" and not fine["collapsed"]
+    assert fine["rows_per_second"] > 0
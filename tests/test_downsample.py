@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.downsample import downsample_fleet_series, lttb_indices, minmax_indices
+from src.fleet_index import sort_fleet_frame
+
+
+def make_series(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_rows, dtype="int64") * 1_000_000_000
+    y = 30 + rng.normal(0, 3, n_rows)
+    spikes = rng.choice(n_rows, 5, replace=False)
+    y[spikes] = 400 + np.arange(5)
+    return t, y, spikes
+
+
+@pytest.mark.parametrize("reduce", [
+    lambda t, y: minmax_indices(t, y, 250),
+    lambda t, y: lttb_indices(t, y, 500),
+])
+def test_downsampling_keeps_exceedance_spikes(reduce):
+    t, y, spikes = make_series(100_000)
+
+    kept = reduce(t, y)
+
+    assert len(kept) <= 502
+    assert np.all(np.diff(kept) > 0)
+    assert set(spikes) <= set(kept)
+    assert kept[0] == 0 and kept[-1] == len(t) - 1
+
+
+def test_fleet_downsampling_is_bounded_and_adapts_to_range():
+    t, y, _ = make_series(20_000)
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(np.concatenate([t, t]), unit="ns"),
+        "vehicle_id": ["A"] * len(t) + ["B"] * len(t),
+        "NOx": np.concatenate([y, y[::-1]]),
+    })
+    df_sorted, index = sort_fleet_frame(df)
+
+    reduced = downsample_fleet_series(df_sorted, index=index, max_points=1000)
+    assert len(reduced) <= 2 * 1002
+    assert reduced["NOx"].max() == df["NOx"].max()
+
+    # período curto: menos pontos que o limite, nada é descartado
+    short = df_sorted[df_sorted["timestamp"] < df_sorted["timestamp"].min() + pd.Timedelta(seconds=300)]
+    assert len(downsample_fleet_series(short, max_points=1000)) == len(short)
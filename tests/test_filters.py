@@ -0,0 +1,125 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.filters import apply_date_filter, apply_filters, apply_vehicle_filter
+from src.fleet_index import sort_fleet_frame
+
+
+def make_fleet(n_rows=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2025-01-01").value
+    span = pd.Timedelta(days=10).value
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(rng.integers(start, start + span, n_rows)),
+        "vehicle_id": rng.choice(["A", "B", "C", "D"], n_rows),
+        "NOx": rng.uniform(0, 100, n_rows),
+    })
+
+
+def test_sort_fleet_frame_orders_by_vehicle_and_time():
+    df, index = sort_fleet_frame(make_fleet())
+
+    assert list(index.vehicle_ids) == ["A", "B", "C", "D"]
+    for vid, start, stop in zip(index.vehicle_ids, index.starts, index.stops):
+        segment = df.iloc[start:stop]
+        assert (segment["vehicle_id"] == vid).all()
+        assert segment["timestamp"].is_monotonic_increasing
+
+
+def test_apply_date_filter_with_index_matches_mask():
+    df, index = sort_fleet_frame(make_fleet())
+
+    for start, end in [
+        (datetime.date(2025, 1, 3), datetime.date(2025, 1, 5)),
+        (datetime.date(2025, 1, 4), datetime.date(2025, 1, 4)),
+        (datetime.date(2024, 12, 1), datetime.date(2025, 2, 1)),
+        (datetime.date(2025, 3, 1), datetime.date(2025, 3, 2)),
+    ]:
+        expected = apply_date_filter(df, start, end)
+        result = apply_date_filter(df, start, end, index=index)
+        pd.testing.assert_frame_equal(result, expected)
+
+
+def test_vehicle_filter_with_index_matches_isin():
+    df, index = sort_fleet_frame(make_fleet())
+
+    for vehicles in [["B"], ["D", "A"], ["C", "X"], []]:
+        expected = apply_vehicle_filter(df, vehicles)
+        result = apply_vehicle_filter(df, vehicles, index=index)
+        pd.testing.assert_frame_equal(result, expected)
+
+    start, stop = index.vehicle_range("C")
+    assert (df.iloc[start:stop]["vehicle_id"] == "C").all()
+    assert stop - start == (df["vehicle_id"] == "C").sum()
+    assert index.vehicle_range("X") == (0, 0)
+
+
+def test_apply_filters_returns_index_for_filtered_frame():
+    df, index = sort_fleet_frame(make_fleet())
+    start, end = datetime.date(2025, 1, 2), datetime.date(2025, 1, 6)
+
+    result, result_index = apply_filters(df, index, start, end, ["D", "B"])
+
+    expected = apply_date_filter(apply_vehicle_filter(df, ["D", "B"]), start, end)
+    pd.testing.assert_frame_equal(result, expected)
+    assert list(result_index.vehicle_ids) == ["B", "D"]
+    b_start, b_stop = result_index.vehicle_range("B")
+    pd.testing.assert_frame_equal(
+        result.iloc[b_start:b_stop], expected[expected["vehicle_id"] == "B"]
+    )
+
+
+def test_take_joins_adjacent_vehicle_ranges_into_one_slice():
+    df, index = sort_fleet_frame(make_fleet())
+
+    # B e C são vizinhos no DataFrame ordenado: o recorte é um slice só
+    result, result_index = index.take(df, *index.vehicle_ranges(["C", "B"]))
+    assert np.shares_memory(result["NOx"].to_numpy(), df["NOx"].to_numpy())
+    assert list(result_index.vehicle_ids) == ["B", "C"]
+    for vid in ("B", "C"):
+        start, stop = result_index.vehicle_range(vid)
+        pd.testing.assert_frame_equal(result.iloc[start:stop], df[df["vehicle_id"] == vid])
+
+    # A e C não encostam: volta a ser uma cópia com as duas faixas
+    result, result_index = index.take(df, *index.vehicle_ranges(["A", "C"]))
+    pd.testing.assert_frame_equal(result, df[df["vehicle_id"].isin(["A", "C"])])
+    assert result_index.vehicle_range("C") == (
+        (df["vehicle_id"] == "A").sum(), len(result)
+    )
+
+
+def test_date_ranges_matches_searchsorted_per_vehicle():
+    rng = np.random.default_rng(3)
+    start = pd.Timestamp("2025-01-01").value
+    df, index = sort_fleet_frame(pd.DataFrame({
+        # muitos veículos, de 1 a ~60 leituras cada
+        "timestamp": pd.to_datetime(rng.integers(start, start + pd.Timedelta(days=20).value, 5_000)),
+        "vehicle_id": rng.choice([f"V{i:03d}" for i in range(300)], 5_000, p=rng.dirichlet(np.ones(300))),
+    }))
+
+    for first, last in [(datetime.date(2025, 1, 5), datetime.date(2025, 1, 9)), (datetime.date(2026, 1, 1),) * 2]:
+        starts, stops = index.date_ranges(first, last)
+        lo, hi = pd.Timestamp(first).value, pd.Timestamp(last + datetime.timedelta(days=1)).value
+        for i, (begin, end) in enumerate(zip(index.starts, index.stops)):
+            segment = index.timestamps[begin:end]
+            assert starts[i] == begin + np.searchsorted(segment, lo)
+            assert stops[i] == begin + np.searchsorted(segment, hi)
+
+
+def test_index_of_tz_aware_timestamps_filters_local_dates():
+    df = make_fleet()
+    # 2025-01-03 00:00 UTC ainda é dia 2 em São Paulo: as datas locais e as
+    # de UTC não coincidem
+    df["timestamp"] = df["timestamp"].dt.tz_localize("UTC").dt.tz_convert("America/Sao_Paulo")
+    df, index = sort_fleet_frame(df)
+    assert index.timestamps.dtype == "int64"
+
+    for start, end in [
+        (datetime.date(2025, 1, 3), datetime.date(2025, 1, 5)),
+        (datetime.date(2025, 1, 4), datetime.date(2025, 1, 4)),
+        (datetime.date(2024, 12, 31), datetime.date(2025, 1, 1)),
+    ]:
+        expected = apply_date_filter(df, start, end)
+        pd.testing.assert_frame_equal(apply_date_filter(df, start, end, index=index), expected)
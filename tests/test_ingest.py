@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pandas as pd
+
+from src.data_loader import load_csv
+from src.ingest import load_csv_files
+
+
+SAMPLE_DIR = Path(__file__).resolve().parents[1] / "sample_data"
+
+
+def test_load_csv_files_parallel_matches_serial_concat():
+    paths = [SAMPLE_DIR / "demo_fleet.csv", SAMPLE_DIR / "demo_fleet2.csv"]
+
+    df, errors = load_csv_files(paths, max_workers=2)
+
+    expected = pd.concat([load_csv(p) for p in paths], ignore_index=True)
+    assert errors == []
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_load_csv_files_reports_one_error_per_file(tmp_path):
+    bad = tmp_path / "sem_veiculo.csv"
+    bad.write_text("timestamp,NOx,O2\n1735689600000,10,20\n")
+
+    with open(SAMPLE_DIR / "demo_fleet.csv", "rb") as good:
+        df, errors = load_csv_files([good, bad, tmp_path / "nao_existe.csv"], max_workers=2)
+
+    assert len(df) == len(load_csv(SAMPLE_DIR / "demo_fleet.csv"))
+    assert [name for name, _ in errors] == ["sem_veiculo.csv", "nao_existe.csv"]
+    assert "vehicle_id" in errors[0][1]
@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from src.maps import CompactDeck, grid_points, grid_reference_latitude, layer_records, map_points, nox_grid
+
+
+def make_window():
+    return {
+        "timestamp": pd.date_range("2025-01-01 08:00", periods=3, freq="30s").to_numpy(),
+        "latitude": np.array([-22.870123456, -22.87, -22.869]),
+        "longitude": np.array([-43.278654321, -43.278, -43.277]),
+        "NOx": np.array([30.04, 31.0, 32.5], dtype="float32"),
+        "order": np.array([1, 2, 3]),
+    }
+
+
+def test_map_points_keeps_only_layer_fields():
+    points = map_points(make_window())
+
+    assert list(points.columns) == ["lon", "lat", "NOx", "t", "hora", "order"]
+    assert points["lat"].iloc[0] == -22.87012
+    assert list(points["NOx"]) == [30.0, 31.0, 32.5]
+    assert list(points["t"]) == [0, 30, 60]
+    assert points["hora"].iloc[-1] == "2025-01-01 08:01:00"
+
+
+def test_compact_deck_serializes_same_spec():
+    points = map_points(make_window())
+    layer = pdk.Layer("ScatterplotLayer", data=layer_records(points), get_position="[lon, lat]", id="trilha")
+    expected = pdk.Layer("ScatterplotLayer", data=points, get_position="[lon, lat]", id="trilha")
+
+    compact = CompactDeck(layers=[layer]).to_json()
+
+    assert json.loads(compact) == json.loads(pdk.Deck(layers=[expected]).to_json())
+    assert "\n" not in compact
+
+
+def test_nox_grid_matches_groupby():
+    rng = np.random.default_rng(0)
+    latitude = -22.9 + rng.normal(0, 0.02, 5_000)
+    longitude = -43.2 + rng.normal(0, 0.02, 5_000)
+    nox = rng.gamma(2.0, 20.0, 5_000)
+    nox[:10] = np.nan
+
+    grid = nox_grid(latitude, longitude, nox, 500, reference_latitude=-22.9)
+
+    dlat = 500 / 111_320
+    dlon = dlat / np.cos(np.radians(-22.9))
+    readings = pd.DataFrame({
+        "row": np.floor(latitude / dlat),
+        "col": np.floor(longitude / dlon),
+        "nox": nox,
+    }).dropna()
+    expected = readings.groupby(["row", "col"])["nox"].agg(
+        n="size", mean_nox="mean", p95_nox=lambda v: np.quantile(v, 0.95)
+    ).reset_index()
+    grid = grid.assign(row=np.round(grid["lat"] / dlat), col=np.round(grid["lon"] / dlon))
+    merged = grid.merge(expected, on=["row", "col"], suffixes=("", "_expected"))
+
+    assert len(merged) == len(grid) == len(expected)
+    np.testing.assert_array_equal(merged["n"], merged["n_expected"])
+    np.testing.assert_allclose(merged["mean_nox"], merged["mean_nox_expected"])
+    np.testing.assert_allclose(merged["p95_nox"], merged["p95_nox_expected"])
+
+
+def test_grid_levels_nest_and_points_have_colors():
+    rng = np.random.default_rng(1)
+    latitude = -22.9 + rng.normal(0, 0.05, 2_000)
+    longitude = -43.2 + rng.normal(0, 0.05, 2_000)
+    nox = rng.gamma(2.0, 20.0, 2_000)
+
+    coarse = nox_grid(latitude, longitude, nox, 2000, reference_latitude=-22.9)
+    fine = nox_grid(latitude, longitude, nox, 500, reference_latitude=-22.9)
+    assert coarse["n"].sum() == fine["n"].sum() == 2_000
+    assert len(fine) >= len(coarse)
+
+    cells = grid_points(coarse, "p95_nox")
+    assert list(cells.columns) == ["lon", "lat", "n", "media", "p95", "c"]
+    assert cells["c"].between(0, 255).all() and cells["c"].max() == 255
+
+
+def test_filtered_grid_cells_align_with_full_grid():
+    rng = np.random.default_rng(2)
+    latitude = -22.9 + rng.normal(0, 0.5, 4_000)
+    longitude = -43.2 + rng.normal(0, 0.5, 4_000)
+    nox = rng.gamma(2.0, 20.0, 4_000)
+    reference = grid_reference_latitude(latitude)
+    assert reference == -23.0
+
+    full = nox_grid(latitude, longitude, nox, 2000, reference)
+    # recorte só com as leituras mais ao sul: a média dele é outra, a grade não
+    south = latitude < -23.3
+    part = nox_grid(latitude[south], longitude[south], nox[south], 2000, reference)
+
+    corners = set(zip(full["lon"].round(9), full["lat"].round(9)))
+    assert set(zip(part["lon"].round(9), part["lat"].round(9))) <= corners
+    assert grid_reference_latitude([np.nan]) == 0.0
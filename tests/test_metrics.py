@@ -1,5 +1,12 @@
+import numpy as np
 import pandas as pd
-from src.metrics import compute_basic_stats, compute_vehicle_ranking
+from src.fleet_index import sort_fleet_frame
+from src.metrics import (
+    build_sorted_nox,
+    compute_basic_stats,
+    compute_time_weighted_metrics,
+    compute_vehicle_ranking,
+)
 
 def test_compute_basic_stats_simple():
     df = pd.DataFrame({
@@ -30,3 +37,90 @@ def test_compute_vehicle_ranking_threshold():
         "median_nox",
         "fraction_time_above_threshold"
     }
+
+def test_compute_vehicle_ranking_with_index_matches_groupby():
+    df = pd.DataFrame({
+        "timestamp": pd.date_range("2025-01-01", periods=6, freq="h"),
+        "vehicle_id": ["B", "A", "B", "C", "A", "B"],
+        "NOx": [10, 60, 70, 40, 55, 80],
+    })
+    df_sorted, index = sort_fleet_frame(df)
+
+    expected = compute_vehicle_ranking(df, threshold=50)
+    result = compute_vehicle_ranking(df_sorted, threshold=50, index=index)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert compute_basic_stats(df_sorted, index=index) == compute_basic_stats(df)
+
+def test_vectorized_ranking_matches_loop_engine():
+    rng = np.random.default_rng(0)
+    n_rows = 5_000
+    df = pd.DataFrame({
+        "timestamp": pd.date_range("2025-01-01", periods=n_rows, freq="min"),
+        "vehicle_id": rng.choice([f"T{i:02d}" for i in range(40)], n_rows),
+        "NOx": rng.gamma(2.0, 20.0, n_rows).round(),
+    })
+
+    loop = compute_vehicle_ranking(df, threshold=50, engine="loop")
+    vectorized = compute_vehicle_ranking(df, threshold=50, extra_stats=["p90", "p95", "max", "count", "std"])
+
+    pd.testing.assert_frame_equal(vectorized[loop.columns], loop)
+
+    by_vehicle = df.groupby("vehicle_id")["NOx"]
+    extra = vectorized.set_index("vehicle_id")
+    assert np.allclose(extra["p95_nox"], by_vehicle.quantile(0.95)[extra.index])
+    assert np.allclose(extra["std_nox"], by_vehicle.std()[extra.index])
+    assert (extra["n_records"] == by_vehicle.size()[extra.index]).all()
+
+def test_sorted_nox_ranking_matches_for_any_threshold():
+    rng = np.random.default_rng(1)
+    n_rows = 3_000
+    df = pd.DataFrame({
+        "vehicle_id": rng.choice(["A", "B", "C"], n_rows),
+        "NOx": rng.gamma(2.0, 20.0, n_rows).round(),
+    })
+    df.loc[::17, "NOx"] = np.nan
+    df_sorted, index = sort_fleet_frame(df.assign(timestamp=pd.Timestamp("2025-01-01")))
+    sorted_nox = build_sorted_nox(df_sorted, index=index)
+    extra = ["p90", "p95", "max", "count", "std"]
+    # sem o índice (linhas fora de ordem), as faixas ordenadas são as mesmas
+    np.testing.assert_array_equal(build_sorted_nox(df).values, sorted_nox.values)
+
+    for threshold in [0, 12.5, 50, 1e9]:
+        expected = compute_vehicle_ranking(df, threshold, extra_stats=extra)
+        result = compute_vehicle_ranking(None, threshold, extra_stats=extra, sorted_nox=sorted_nox)
+        pd.testing.assert_frame_equal(result, expected)
+
+    curves = sorted_nox.exceedance_curves([0, 50, 100])
+    for vid, g in df.groupby("vehicle_id"):
+        assert np.isclose(curves.loc[vid, 50], np.mean(g["NOx"] > 50))
+
+def test_time_weighted_metrics_skip_gaps_and_find_longest_episode():
+    t0 = pd.Timestamp("2025-01-01")
+    minutes = [0, 10, 20, 30, 120, 130, 0, 1, 2]
+    df = pd.DataFrame({
+        "vehicle_id": ["A"] * 6 + ["B"] * 3,
+        "timestamp": [t0 + pd.Timedelta(minutes=m) for m in minutes],
+        "NOx": [60, 70, 10, 80, 90, 20, 100, 100, 100],
+    })
+
+    # ordem embaralhada: a função ordena por (vehicle_id, timestamp)
+    result = compute_time_weighted_metrics(
+        df.sample(frac=1, random_state=0), threshold=50, max_gap_seconds=900
+    ).set_index("vehicle_id")
+
+    # A: o intervalo de 90 min (30 -> 120) passa do max_gap e não conta
+    assert np.isclose(result.loc["A", "observed_hours"], 40 / 60)
+    assert np.isclose(result.loc["A", "hours_above_threshold"], 30 / 60)
+    assert np.isclose(result.loc["A", "time_weighted_mean_nox"], (60 + 70 + 10 + 90) / 4)
+    assert np.isclose(result.loc["A", "longest_exceedance_hours"], 20 / 60)
+    assert np.isclose(result.loc["B", "longest_exceedance_hours"], 2 / 60)
+
+    df_sorted, index = sort_fleet_frame(df)
+    with_index = compute_time_weighted_metrics(df_sorted, 50, max_gap_seconds=900, index=index)
+    pd.testing.assert_frame_equal(with_index.set_index("vehicle_id"), result)
+
+    # timestamps com fuso: mesmas durações
+    df_tz = df.assign(timestamp=df["timestamp"].dt.tz_localize("America/Sao_Paulo"))
+    tz_result = compute_time_weighted_metrics(df_tz, 50, max_gap_seconds=900).set_index("vehicle_id")
+    pd.testing.assert_frame_equal(tz_result, result)
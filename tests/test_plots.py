@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from src.plots import compute_nox_box_stats, make_nox_boxplot, make_nox_histogram
+
+
+def make_fleet(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "vehicle_id": rng.choice(["A", "B", "C"], n_rows),
+        "NOx": rng.gamma(2.0, 20.0, n_rows),
+    })
+
+
+def test_box_stats_match_plotly_rules():
+    df = make_fleet(2_000)
+    stats, outliers = compute_nox_box_stats(df, max_outliers_per_vehicle=10_000)
+
+    for row in stats.itertuples():
+        values = np.sort(df.loc[df["vehicle_id"] == row.vehicle_id, "NOx"].to_numpy())
+        q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75], method="hazen")
+        assert np.isclose(row.q1, q1)
+        assert np.isclose(row.median, median)
+        assert np.isclose(row.q3, q3)
+
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        assert np.isclose(row.lowerfence, min(q1, inside.min()))
+        assert np.isclose(row.upperfence, max(q3, inside.max()))
+
+        expected = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+        got = np.sort(outliers.loc[outliers["vehicle_id"] == row.vehicle_id, "NOx"].to_numpy())
+        np.testing.assert_allclose(got, expected)
+
+
+def test_precomputed_boxplot_size_does_not_grow_with_rows():
+    small = make_nox_boxplot(make_fleet(5_000), precomputed=True, max_outliers_per_vehicle=20)
+    large = make_nox_boxplot(make_fleet(50_000), precomputed=True, max_outliers_per_vehicle=20)
+
+    assert len(large.data[1].y) <= 3 * 20
+    assert len(large.to_json()) < 1.2 * len(small.to_json())
+
+
+def test_histogram_sends_only_bin_counts():
+    df = make_fleet(50_000)
+    fig = make_nox_histogram(df, bins=15, by_vehicle=True)
+
+    assert len(fig.data) == 3
+    assert all(len(trace.y) == 15 for trace in fig.data)
+    assert sum(trace.y.sum() for trace in fig.data) == len(df)
@@ -0,0 +1,88 @@
+import datetime
+import gc
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.filters import apply_filters
+from src.fleet_index import sort_fleet_frame
+from src.registry import Dataset, DatasetRegistry, dataset_key
+
+
+def make_dataset(n_rows):
+    return Dataset(pd.DataFrame({"vehicle_id": ["A"] * n_rows, "NOx": [1.0] * n_rows}))
+
+
+def test_identical_uploads_share_one_frame():
+    registry = DatasetRegistry()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return make_dataset(10)
+
+    key_1, _ = dataset_key([io.BytesIO(b"a,b\n1,2\n"), io.BytesIO(b"c\n3\n")])
+    key_2, _ = dataset_key([io.BytesIO(b"c\n3\n"), io.BytesIO(b"a,b\n1,2\n")])
+    assert key_1 == key_2
+
+    first = registry.open(key_1, load)
+    second = registry.open(key_2, load)
+    assert first.dataset.frame is second.dataset.frame
+    assert len(loads) == 1
+    assert registry.stats()[0]["refs"] == 2
+
+
+def test_budget_evicts_only_unreferenced_datasets():
+    one = make_dataset(1_000)
+    registry = DatasetRegistry(max_bytes=int(one.nbytes * 2.5))
+
+    in_use = registry.open("a", lambda: make_dataset(1_000))
+    released = registry.open("b", lambda: make_dataset(1_000))
+    released.release()
+    dropped = registry.open("c", lambda: make_dataset(1_000))
+    del dropped
+    gc.collect()
+
+    # acima do limite: "b" (sem referência, usado há mais tempo) sai, "a" fica
+    registry.open("d", lambda: make_dataset(1_000))
+    assert "a" in registry and "b" not in registry
+    assert registry.total_bytes() <= registry.max_bytes
+    assert in_use.dataset.frame is not None
+
+
+def test_registered_dataset_is_not_changed_through_filters():
+    frame, index = sort_fleet_frame(pd.DataFrame({
+        "vehicle_id": ["A", "B", "A", "B"],
+        "timestamp": pd.to_datetime(
+            ["2025-01-01", "2025-01-01", "2025-01-02", "2025-01-02"]
+        ).tz_localize("America/Sao_Paulo"),
+        "NOx": [1.0, 2.0, 3.0, 4.0],
+    }))
+    registry = DatasetRegistry()
+    dataset = registry.open("k", lambda: Dataset(frame, index)).dataset
+    original = dataset.frame.copy()
+
+    # todos os veículos: faixas encostadas viram um slice, sem cópia
+    df_all, _ = apply_filters(
+        dataset.frame, dataset.index, datetime.date(2025, 1, 1), datetime.date(2025, 1, 2), ["A", "B"]
+    )
+    assert np.shares_memory(df_all["NOx"].to_numpy(), dataset.frame["NOx"].to_numpy())
+
+    # um dia só: uma faixa por veículo, separadas, então o recorte é cópia
+    df_day, _ = apply_filters(
+        dataset.frame, dataset.index, datetime.date(2025, 1, 1), datetime.date(2025, 1, 1), []
+    )
+    df_day.loc[:, "NOx"] = -1.0
+
+    for df in (dataset.frame, df_all):
+        for column, value in (("NOx", -1.0), ("timestamp", df["timestamp"].iloc[1])):
+            with pytest.raises((ValueError, AssertionError)):
+                df.loc[df.index[0], column] = value
+    pd.testing.assert_frame_equal(dataset.frame, original)
+
+    with pytest.raises(ValueError):
+        dataset.index.starts[0] = 1
+    with pytest.raises(ValueError):
+        dataset.index.timestamps[0] = 0
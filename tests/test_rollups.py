@@ -0,0 +1,104 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.aggregates import NOxAggregate
+from src.data_loader import DASHBOARD_COLUMNS, load_csv
+from src.rollups import ROLLUP_THRESHOLDS, compute_rollups, period_start, rollup_aggregate
+from src.store import ingest_csv, load_store_rollups
+
+
+def make_frame(n=20_000, days=90, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "vehicle_id": pd.Categorical(rng.choice(["T1", "T2", "T3"], n)),
+        "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, days * 86400, n), unit="s"),
+        "NOx": np.where(rng.random(n) < 0.05, np.nan, rng.gamma(2.0, 50.0, n)),
+    })
+
+
+def test_period_start_uses_monday_weeks():
+    ts = pd.to_datetime(["2025-01-05 23:00", "2025-01-06 00:00", "2025-01-12 12:00"])
+    weeks = period_start(ts, "week")
+    assert list(pd.DatetimeIndex(weeks).date) == [
+        datetime.date(2024, 12, 30), datetime.date(2025, 1, 6), datetime.date(2025, 1, 6),
+    ]
+
+    # com fuso, vale o dia local: 23h de domingo em São Paulo já é segunda em UTC
+    local = ts.tz_localize("America/Sao_Paulo")
+    assert list(pd.DatetimeIndex(period_start(local, "day")).date) == [
+        datetime.date(2025, 1, 5), datetime.date(2025, 1, 6), datetime.date(2025, 1, 12),
+    ]
+    assert list(pd.DatetimeIndex(period_start(local, "week")).date) == list(pd.DatetimeIndex(weeks).date)
+
+
+@pytest.mark.parametrize("start, end", [
+    (datetime.date(2025, 1, 9), datetime.date(2025, 3, 2)),   # semanas inteiras + pontas
+    (datetime.date(2025, 1, 8), datetime.date(2025, 1, 10)),  # menos de uma semana
+    (None, None),
+])
+def test_rollup_aggregate_matches_raw_rows(start, end):
+    df = make_frame()
+    half = len(df) // 2
+    first, second = compute_rollups(df.iloc[:half]), compute_rollups(df.iloc[half:])
+    rollups = {period: first[period].merge(second[period]) for period in first}
+
+    result = rollup_aggregate(rollups, start, end, ["T1", "T3"])
+
+    days = df["timestamp"].dt.date
+    mask = df["vehicle_id"].isin(["T1", "T3"])
+    if start is not None:
+        mask &= (days >= start) & (days <= end)
+    expected = NOxAggregate.from_frame(df[mask], ROLLUP_THRESHOLDS)
+
+    stats, exact = result.basic_stats(), expected.basic_stats()
+    assert stats["n_records"] == exact["n_records"]
+    assert stats["global_mean_nox"] == pytest.approx(exact["global_mean_nox"])
+    assert stats["global_median_nox"] == exact["global_median_nox"]
+    pd.testing.assert_frame_equal(result.vehicle_ranking(50), expected.vehicle_ranking(50))
+    pd.testing.assert_frame_equal(result.vehicle_stats(), expected.vehicle_stats())
+
+
+def write_month_csv(path, month):
+    ts = pd.date_range(f"2025-{month:02d}-01", periods=28 * 24, freq="h")
+    rng = np.random.default_rng(month)
+    pd.DataFrame({
+        "vehicle_name": np.repeat(["TRUCK_A", "TRUCK_B"], len(ts)),
+        "timestamp": np.tile(ts.values.astype("datetime64[ms]").astype("int64"), 2),
+        "order": np.arange(2 * len(ts)),
+        "NOx": rng.gamma(2.0, 30.0, 2 * len(ts)).round(1),
+        "NOx_dp": 1.0,
+        "O2": 20.0,
+        "position": "POINT(-43.2 -22.8)",
+    }).to_csv(path, index=False)
+
+
+def test_store_rollups_follow_ingest(tmp_path):
+    root = tmp_path / "store"
+    january, february = tmp_path / "jan.csv", tmp_path / "feb.csv"
+    write_month_csv(january, 1)
+    write_month_csv(february, 2)
+
+    ingest_csv(january, root, chunksize=500)
+    assert load_store_rollups(root)["day"].stats["n_rows"].sum() == 2 * 28 * 24
+
+    # arquivo novo soma; arquivo repetido não conta duas vezes
+    ingest_csv(february, root, chunksize=500)
+    ingest_csv(january, root, chunksize=500)
+    rollups = load_store_rollups(root)
+    both = pd.concat([
+        load_csv(path, compact=True, columns=DASHBOARD_COLUMNS) for path in (january, february)
+    ])
+    expected = NOxAggregate.from_frame(both, ROLLUP_THRESHOLDS).basic_stats()
+    stats = rollup_aggregate(rollups).basic_stats()
+    assert stats["n_records"] == expected["n_records"]
+    assert stats["global_mean_nox"] == pytest.approx(expected["global_mean_nox"])
+
+    # origem gravada sem rollups: não dá para responder por eles
+    for name in os.listdir(root / "_rollups" / "day"):
+        os.remove(root / "_rollups" / "day" / name)
+        break
+    assert load_store_rollups(root) is None
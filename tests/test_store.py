@@ -0,0 +1,91 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data_loader import DASHBOARD_COLUMNS, load_csv
+from src.filters import apply_filters
+from src.fleet_index import sort_fleet_frame
+from src.store import ingest_csv, query_store, store_files
+
+
+def write_year_csv(path, n_vehicles=12, readings_per_day=2):
+    # um ano de leituras para cada caminhão, no formato do CSV de origem
+    days = pd.date_range("2025-01-01", periods=365, freq="D")
+    offsets = pd.to_timedelta(np.arange(readings_per_day) * (24 // readings_per_day), unit="h")
+    ts = (days.values[:, None] + offsets.values[None, :]).ravel()
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(n_vehicles):
+        frames.append(pd.DataFrame({
+            "vehicle_name": f"TRUCK_{i:02d}",
+            "timestamp": ts.astype("datetime64[ms]").astype("int64"),
+            "order": np.arange(len(ts)),
+            "NOx": rng.gamma(2.0, 20.0, len(ts)).round(1),
+            "NOx_dp": 1.0,
+            "O2": 20.0,
+            "position": "POINT(-43.2 -22.8)",
+        }))
+    pd.concat(frames).to_csv(path, index=False)
+
+
+def test_week_query_reads_only_matching_partitions(tmp_path):
+    source = tmp_path / "year.csv"
+    write_year_csv(source)
+    root = tmp_path / "store"
+    ingest_csv(source, root, chunksize=20_000)
+
+    vehicles = [f"TRUCK_{i:02d}" for i in range(10)]
+    start, end = datetime.date(2025, 3, 3), datetime.date(2025, 3, 9)
+
+    files = store_files(root, start, end, vehicles)
+    assert len(files) == 10 * 7
+    assert all("date=2025-03-0" in f for f in files)
+
+    df, index = query_store(root, start, end, vehicles)
+    full, full_index = sort_fleet_frame(load_csv(source, compact=True, columns=DASHBOARD_COLUMNS))
+    expected, _ = apply_filters(full, full_index, start, end, vehicles)
+    pd.testing.assert_frame_equal(
+        df, expected.reset_index(drop=True), check_dtype=False, check_categorical=False
+    )
+    assert list(index.vehicle_ids) == vehicles
+
+
+def test_ingest_is_idempotent(tmp_path):
+    source = tmp_path / "year.csv"
+    write_year_csv(source, n_vehicles=2)
+    root = tmp_path / "store"
+
+    assert ingest_csv(source, root) > 0
+    files = sorted(store_files(root))
+    assert ingest_csv(source, root) == 0
+
+    # mesmo sem o marcador (ex.: carga interrompida), reescreve os mesmos arquivos
+    marker_dir = root / "_ingested"
+    for name in os.listdir(marker_dir):
+        os.remove(marker_dir / name)
+    ingest_csv(source, root)
+
+    assert sorted(store_files(root)) == files
+    assert len(query_store(root)[0]) == 2 * 365 * 2
+
+    # carga interrompida refeita com outro chunksize: nenhuma linha em dobro
+    for name in os.listdir(marker_dir):
+        os.remove(marker_dir / name)
+    ingest_csv(source, root, chunksize=500)
+    assert len(query_store(root)[0]) == 2 * 365 * 2
+
+
+def test_ingest_skips_rows_already_in_store(tmp_path):
+    source, overlap = tmp_path / "year.csv", tmp_path / "overlap.csv"
+    write_year_csv(source, n_vehicles=2)
+    # segundo arquivo com os 100 primeiros dias repetidos e mais um caminhão
+    rows = pd.read_csv(source)
+    extra = rows[rows["vehicle_name"] == "TRUCK_00"].assign(vehicle_name="TRUCK_99")
+    pd.concat([rows.head(100), extra]).to_csv(overlap, index=False)
+    root = tmp_path / "store"
+
+    ingest_csv(source, root)
+    assert ingest_csv(overlap, root) == len(extra)
+    assert len(query_store(root)[0]) == 3 * 365 * 2
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from src.fleet_index import sort_fleet_frame
+from src.tracks import VehicleTrack
+
+
+def make_fleet():
+    ts = pd.date_range("2025-01-01", periods=6, freq="min")
+    return pd.DataFrame({
+        "vehicle_id": ["T2"] * 6 + ["T1"] * 6,
+        "timestamp": list(ts) * 2,
+        "latitude": [-22.8, np.nan, -22.7, -22.6, -22.5, -22.4] * 2,
+        "longitude": [-43.2] * 12,
+        "NOx": np.arange(12.0),
+        "order": np.arange(12),
+    })
+
+
+def test_track_keeps_readings_with_gps_in_time_order():
+    df, index = sort_fleet_frame(make_fleet())
+    start, stop = index.vehicle_range("T2")
+
+    track = VehicleTrack.from_frame(df, "T2", start, stop)
+
+    assert len(track) == 5
+    assert list(track.columns["NOx"]) == [0.0, 2.0, 3.0, 4.0, 5.0]
+    assert track.start == pd.Timestamp("2025-01-01 00:00")
+    assert track.end == pd.Timestamp("2025-01-01 00:05")
+
+
+def test_window_matches_mask_and_returns_views():
+    df, index = sort_fleet_frame(make_fleet())
+    track = VehicleTrack.from_frame(df, "T1", *index.vehicle_range("T1"))
+
+    lo, hi = track.window("2025-01-01 00:01", "2025-01-01 00:04")
+    window = track.slice(lo, hi)
+    assert list(window["NOx"]) == [8.0, 9.0, 10.0]
+    assert np.shares_memory(window["latitude"], track.columns["latitude"])
+
+    lo, hi = track.window("2025-01-01 00:00", "2025-01-01 00:05", max_points=2)
+    assert list(track.slice(lo, hi)["order"]) == [10, 11]
+    assert track.window("2025-01-02", "2025-01-03") == (5, 5)
+
+
+def test_track_of_tz_aware_timestamps_is_indexed_in_utc():
+    fleet = make_fleet()
+    fleet["timestamp"] = pd.DatetimeIndex(fleet["timestamp"]).tz_localize("UTC").tz_convert("America/Sao_Paulo")
+    df, index = sort_fleet_frame(fleet)
+
+    track = VehicleTrack.from_frame(df, "T1", *index.vehicle_range("T1"))
+
+    assert len(track) == 5
+    assert track.start == pd.Timestamp("2025-01-01 00:00")
+    # limites com fuso: 21:01 em São Paulo é 00:01 em UTC
+    lo, hi = track.window(
+        pd.Timestamp("2024-12-31 21:01", tz="America/Sao_Paulo"), pd.Timestamp("2025-01-01 00:04", tz="UTC")
+    )
+    assert list(track.slice(lo, hi)["NOx"]) == [8.0, 9.0, 10.0]
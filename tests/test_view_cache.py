@@ -0,0 +1,27 @@
+import datetime
+
+from src.view_cache import ViewCache, filter_fingerprint
+
+
+def test_view_cache_computes_once_per_key_and_evicts_oldest():
+    cache = ViewCache(max_entries=2)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    key_a = filter_fingerprint(("f",), datetime.date(2025, 1, 1), datetime.date(2025, 1, 7), ["B", "A"])
+    key_b = filter_fingerprint(("f",), datetime.date(2025, 1, 1), datetime.date(2025, 1, 7), ["A"])
+
+    assert cache.get_or_compute("Ranking", key_a, lambda: compute(1), params=(50.0,))[2] is False
+    # mesma seleção de veículos em outra ordem: mesma chave
+    same_set = filter_fingerprint(("f",), datetime.date(2025, 1, 1), datetime.date(2025, 1, 7), ["A", "B"])
+    result, _, cached = cache.get_or_compute("Ranking", same_set, lambda: compute(2), params=(50.0,))
+    assert (result, cached) == (1, True)
+
+    cache.get_or_compute("Ranking", key_a, lambda: compute(3), params=(60.0,))
+    cache.get_or_compute("Ranking", key_b, lambda: compute(4), params=(50.0,))
+    assert len(cache) == 2
+    assert cache.get_or_compute("Ranking", key_a, lambda: compute(5), params=(50.0,))[0] == 5
+    assert calls == [1, 3, 4, 5]
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import store
+from src.data_loader import DASHBOARD_COLUMNS, load_csv
+from src.fleet_index import sort_fleet_frame
+from src.registry import Dataset
+from src.rollups import compute_rollups
+from src.store import load_store_rollups, query_store, read_journal, read_journal_rows
+from src.watcher import DirectoryWatcher
+
+
+def source_rows(start, n, vehicle="TRUCK_A"):
+    ts = pd.date_range("2025-01-01", periods=start + n, freq="min")[start:]
+    return pd.DataFrame({
+        "vehicle_name": vehicle,
+        "timestamp": ts.values.astype("datetime64[ms]").astype("int64"),
+        "order": np.arange(start, start + n),
+        "NOx": np.arange(start, start + n) * 1.0,
+        "NOx_dp": 1.0,
+        "O2": 20.0,
+        "position": "POINT(-43.2 -22.8)",
+    })
+
+
+def test_appended_and_overlapping_files_add_only_new_rows(tmp_path):
+    incoming, root = tmp_path / "in", tmp_path / "store"
+    incoming.mkdir()
+    watcher = DirectoryWatcher(incoming, root)
+    path = incoming / "a.csv"
+
+    source_rows(0, 100).to_csv(path, index=False)
+    assert watcher.scan()[0].n_new == 100
+
+    # linhas acrescentadas; a última ainda incompleta fica para depois
+    with open(path, "a") as f:
+        f.write(source_rows(100, 50).to_csv(index=False, header=False))
+        f.write("TRUCK_A,1735")
+    report = watcher.process(path)
+    assert (report.n_read, report.n_new) == (50, 50)
+
+    # outro arquivo repetindo parte das leituras
+    source_rows(120, 60).to_csv(incoming / "b.csv", index=False)
+    report = watcher.process(incoming / "b.csv")
+    assert (report.n_new, report.n_duplicates) == (30, 30)
+    assert watcher.process(incoming / "b.csv") is None
+
+    df, _ = query_store(root)
+    assert len(df) == 180 and not df.duplicated(["timestamp", "order"]).any()
+    assert load_store_rollups(root)["day"].stats["n_rows"].sum() == 180
+
+    entries = read_journal(root)
+    assert [e["n_rows"] for e in entries] == [100, 50, 30]
+    new_rows, _ = read_journal_rows(root, read_journal(root, after_seq=entries[0]["seq"]))
+    assert list(new_rows["order"]) == list(range(100, 180))
+
+
+def test_journal_replaces_reingested_source_and_skips_taken_numbers(tmp_path, monkeypatch):
+    store._append_journal(tmp_path, "a" * 64, "a.csv", 10, ["old.parquet"])
+    store._append_journal(tmp_path, "b" * 64, "b.csv", 5, ["b.parquet"])
+    # a mesma origem de novo: mesma entrada, arquivos novos
+    store._append_journal(tmp_path, "a" * 64, "a.csv", 10, ["new.parquet"])
+    entries = read_journal(tmp_path)
+    assert [(e["seq"], e["files"]) for e in entries] == [(1, ["new.parquet"]), (2, ["b.parquet"])]
+
+    # outro processo gravou 1 e 2 depois desta listagem: o número seguinte livre
+    monkeypatch.setattr(store, "read_journal", lambda root, after_seq=0: [])
+    store._append_journal(tmp_path, "c" * 64, "c.csv", 1, ["c.parquet"])
+    assert [e["seq"] for e in read_journal(tmp_path)] == [1, 2, 3]
+    assert sorted(os.listdir(tmp_path / "_journal")) == [f"{seq:012d}.json" for seq in (1, 2, 3)]
+
+
+def test_watcher_picks_up_new_files(tmp_path):
+    incoming, root = tmp_path / "in", tmp_path / "store"
+    incoming.mkdir()
+    reports = []
+    with DirectoryWatcher(incoming, root, settle_seconds=0.1, on_report=reports.append):
+        source_rows(0, 20).to_csv(incoming / "a.csv", index=False)
+        deadline = time.monotonic() + 10
+        while not reports and time.monotonic() < deadline:
+            time.sleep(0.05)
+    assert reports and reports[0].n_new == 20 and reports[0].latency >= 0
+
+
+def test_dataset_extended_matches_full_load(tmp_path):
+    first, second = tmp_path / "a.csv", tmp_path / "b.csv"
+    source_rows(0, 50, "TRUCK_B").to_csv(first, index=False)
+    pd.concat([source_rows(50, 30, "TRUCK_B"), source_rows(0, 20, "TRUCK_A")]).to_csv(second, index=False)
+    old = load_csv(first, compact=True, columns=DASHBOARD_COLUMNS)
+    new = load_csv(second, compact=True, columns=DASHBOARD_COLUMNS)
+
+    df, index = sort_fleet_frame(old)
+    extended = Dataset(df, index, rollups=compute_rollups(df)).extended(new)
+
+    expected, _ = sort_fleet_frame(pd.concat([old, new]).astype({"vehicle_id": str}))
+    assert list(extended.index.vehicle_ids) == ["TRUCK_A", "TRUCK_B"]
+    assert list(extended.frame["order"]) == list(expected["order"])
+    assert extended.rollups["day"].stats["n_rows"].sum() == 100
+
+
+def test_dataset_extended_merges_like_a_full_sort():
+    rng = np.random.default_rng(5)
+
+    def rows(n, vehicles, first):
+        return pd.DataFrame({
+            "vehicle_id": pd.Categorical(rng.choice(vehicles, n)),
+            # minutos inteiros: muitos empates entre linhas antigas e novas
+            "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 300, n), unit="min"),
+            "order": np.arange(first, first + n),
+        })
+
+    old, new = rows(2_000, ["A", "C", "E"], 0), rows(500, ["B", "C", "F", "A"], 2_000)
+    df, index = sort_fleet_frame(old)
+    extended = Dataset(df, index).extended(new)
+
+    expected, expected_index = sort_fleet_frame(pd.concat([old, new], ignore_index=True))
+    assert list(extended.frame["order"]) == list(expected["order"])
+    assert list(extended.index.vehicle_ids) == ["A", "B", "C", "E", "F"]
+    np.testing.assert_array_equal(extended.index.starts, expected_index.starts)
+    np.testing.assert_array_equal(extended.index.timestamps, expected_index.timestamps)
+
+
+def test_files_without_order_are_deduplicated_by_vehicle_and_timestamp(tmp_path):
+    incoming, root = tmp_path / "in", tmp_path / "store"
+    incoming.mkdir()
+    watcher = DirectoryWatcher(incoming, root)
+
+    source_rows(0, 40).drop(columns="order").to_csv(incoming / "a.csv", index=False)
+    source_rows(20, 40).drop(columns="order").to_csv(incoming / "b.csv", index=False)
+    reports = watcher.scan()
+
+    assert [r.error for r in reports] == [None, None]
+    assert [(r.n_new, r.n_duplicates) for r in reports] == [(40, 0), (20, 20)]
+
+
+def test_rewritten_file_of_same_size_is_read_again(tmp_path):
+    incoming, root = tmp_path / "in", tmp_path / "store"
+    incoming.mkdir()
+    watcher = DirectoryWatcher(incoming, root)
+    path = incoming / "a.csv"
+
+    source_rows(0, 30).to_csv(path, index=False)
+    assert watcher.process(path).n_new == 30
+
+    # reescrito com outras leituras e o mesmo tamanho: não é continuação
+    rewritten = source_rows(0, 30, "TRUCK_B")
+    rewritten.to_csv(path, index=False)
+    assert path.stat().st_size == len(source_rows(0, 30).to_csv(index=False))
+    report = watcher.process(path)
+    assert (report.n_read, report.n_new) == (30, 30)
+
+
+def test_settled_files_are_processed_while_other_files_keep_changing(tmp_path):
+    incoming, root = tmp_path / "in", tmp_path / "store"
+    incoming.mkdir()
+    processed = []
+    watcher = DirectoryWatcher(incoming, root, settle_seconds=0.2)
+    watcher.process = processed.append
+    worker = threading.Thread(target=watcher._run)
+    worker.start()
+    try:
+        watcher.notify(str(incoming / "a.csv"))
+        deadline = time.monotonic() + 3
+        # outro arquivo recebendo eventos sem parar
+        while not processed and time.monotonic() < deadline:
+            watcher.notify(str(incoming / "busy.csv"))
+            (incoming / "a.csv").touch()
+            time.sleep(0.01)
+    finally:
+        watcher._stop.set()
+        worker.join()
+    assert processed == [str(incoming / "a.csv")]